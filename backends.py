@@ -0,0 +1,35 @@
+"""Pluggable stand-ins for the external services.
+
+`clients` and `media` ask this registry before building a real Drive service,
+Supabase client, Gemini model / file API, OpenAI client or frame extractor.
+Nothing is registered by default; `fakes.install()` (or `SOUL_BACKEND=fake`
+in the environment / secrets) swaps in the local fakes used for load tests.
+"""
+from settings import get_setting
+
+NAMES = ("drive", "supabase", "gemini", "gemini_files", "openai", "frames")
+
+_registry = {}
+_configured = False
+
+
+def install(name, backend):
+    """Registers the object returned in place of the real service `name`."""
+    if name not in NAMES:
+        raise ValueError(f"Backend desconhecido: {name}")
+    _registry[name] = backend
+
+
+def clear():
+    _registry.clear()
+
+
+def get(name):
+    """Registered backend for `name`, or None to use the real service."""
+    global _configured
+    if not _configured:
+        _configured = True
+        if get_setting("SOUL_BACKEND") == "fake" and not _registry:
+            import fakes
+            fakes.install()
+    return _registry.get(name)
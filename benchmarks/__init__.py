@@ -0,0 +1,4 @@
+"""Micro-benchmarks for the CPU hot paths. Run from the repo root:
+
+    python -m benchmarks.bench_scorers
+"""
@@ -0,0 +1,135 @@
+"""Times the storyboard matcher and the search scorers on synthetic libraries.
+
+    python -m benchmarks.bench_scorers                       # 1k/10k/100k
+    python -m benchmarks.bench_scorers --sizes 1000 --repeat 5
+    python -m benchmarks.bench_scorers --save baseline.json  # record results
+    python -m benchmarks.bench_scorers --compare baseline.json
+
+Each case reports best wall time, throughput (clip scorings per second), peak
+traced memory and a digest of the returned ids. `--compare` fails when a digest
+differs, so an optimized scorer can be checked against the current results.
+The matcher and keyword cases score a `catalog.Catalog` built once per library,
+as the app does per snapshot; the `catalog` case times that build.
+"""
+import argparse
+import gc
+import hashlib
+import json
+import sys
+import time
+import tracemalloc
+
+import catalog
+import matching
+from benchmarks.synthetic import make_library, make_storyboard, make_queries
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def _digest(ids):
+    return hashlib.sha1("\n".join(ids).encode()).hexdigest()[:16]
+
+
+def case_catalog(library, _):
+    def run():
+        return catalog.Catalog(library).file_ids[:24]
+    return run, len(library)
+
+
+def case_matcher(library, blocks):
+    storyboard = make_storyboard(blocks)
+    recent_ids = matching.recent_clip_ids(library)
+    clips = catalog.Catalog(library)
+
+    def run():
+        plan = matching.match_storyboard(storyboard, clips, recent_ids)
+        return [row['file_id'] for row in plan]
+    return run, blocks * len(library)
+
+
+def case_keyword(library, queries):
+    qs = make_queries(queries)
+    clips = catalog.Catalog(library)
+
+    def run():
+        ids = []
+        for q in qs:
+            ids += [v['file_id'] for v, _ in matching.keyword_search(clips, q)[:24]]
+        return ids
+    return run, queries * len(library)
+
+
+def case_semantic(library, queries):
+    keyword_sets = [make_queries(5, seed=i) for i in range(queries)]
+
+    def run():
+        ids = []
+        for kws in keyword_sets:
+            ids += [v['file_id'] for v, _ in matching.semantic_search(library, kws)[:24]]
+        return ids
+    return run, queries * len(library)
+
+
+CASES = {"catalog": case_catalog, "matcher": case_matcher, "keyword": case_keyword, "semantic": case_semantic}
+
+
+def measure(run, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        ids = run()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak, _digest(ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="tamanhos da biblioteca")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=sorted(CASES))
+    parser.add_argument("--blocks", type=int, default=40, help="blocos por storyboard")
+    parser.add_argument("--queries", type=int, default=20, help="consultas por rodada de busca")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="grava os resultados em JSON")
+    parser.add_argument("--compare", help="compara digests com um JSON salvo")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'caso':<10} {'clipes':>8} {'melhor (s)':>11} {'scorings/s':>12} {'pico (MB)':>10}  digest")
+    for size in args.sizes:
+        library = make_library(size)
+        for name in args.cases:
+            run, work = CASES[name](library, args.blocks if name == "matcher" else args.queries)
+            best, peak, digest = measure(run, args.repeat)
+            row = {"case": name, "size": size, "best_s": round(best, 4), "throughput": round(work / best),
+                   "peak_mb": round(peak / 1024**2, 2), "digest": digest}
+            results.append(row)
+            print(f"{name:<10} {size:>8} {best:>11.4f} {row['throughput']:>12,} {row['peak_mb']:>10.2f}  {digest}", flush=True)
+        del library
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = {(r['case'], r['size']): r for r in json.load(fh)}
+        mismatches = 0
+        for r in results:
+            base = baseline.get((r['case'], r['size']))
+            if not base:
+                continue
+            same = base['digest'] == r['digest']
+            mismatches += not same
+            print(f"{r['case']:<10} {r['size']:>8}  {base['best_s'] / r['best_s']:>6.2f}x  {'ok' if same else 'RESULTADO DIFERENTE'}")
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""End-to-end load test against the local fakes (no credentials needed).
+
+    python -m benchmarks.loadtest --clips 200 --storyboards 10
+    python -m benchmarks.loadtest --clips 500 --rate-429 0.05 --failure-rate 0.01 --latency-scale 0.2
+    python -m benchmarks.loadtest --clips 400 --subfolders 8 --sync-workers 4 --storyboards 0
+
+Replays a full library sync of N clips through `library_sync.run_sync`, then
+generates M storyboards through `engines.get_semantic_storyboard` plus the
+matcher. Reports wall time, throughput, errors and the per-stage metrics.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import clients
+import engines
+import fakes
+import library_sync
+import matching
+import metrics
+
+SCRIPT = ("A vida às vezes parece uma estrada longa. Mas cada passo tem um propósito. "
+          "Quando olhamos para trás, vemos a mão de Deus. E seguimos em frente com esperança. ") * 3
+
+
+def run_sync_phase(args):
+    service, supabase = clients.get_drive_service(), clients.get_supabase_client()
+    lines = []
+
+    def worker(i):
+        # One shard per worker, as separate `sync_cli.py --shard i/N` processes would run
+        shard = (i, args.sync_workers) if args.sync_workers > 1 else None
+        return library_sync.run_sync(service, supabase, folder_id=fakes.FAKE_ROOT, vision_engine=args.engine,
+                                     log=lines.append if args.quiet else print, concurrency=args.sync_concurrency,
+                                     recursive=args.subfolders > 0, shard=shard, worker=f"loadtest-{i}",
+                                     max_failures=args.max_failures, pause_scale=args.pause_scale)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sync_workers) as pool:
+        failed = [item for items in pool.map(worker, range(args.sync_workers)) for item in items]
+    wall = time.perf_counter() - start
+    indexed = sum(1 for r in supabase.table("video_library").select("*").execute().data if matching.is_indexed(r))
+    return {"wall_s": round(wall, 2), "clips": args.clips, "indexed": indexed, "failed": len(failed),
+            "clips_per_s": round(args.clips / wall, 2) if wall else None,
+            "errors": sorted({f["error"] for f in failed})[:10]}
+
+
+def run_storyboard_phase(args):
+    supabase = clients.get_supabase_client()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
+        tmp.write(os.urandom(args.audio_kb * 1024))
+        audio_path = tmp.name
+
+    # The fake marks uploads ready after its own (scaled) latency
+    poll_s = max(0.05, engines.PROCESSING_POLL_S * args.latency_scale)
+
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            storyboard = engines.get_semantic_storyboard(audio_path, SCRIPT, engine=args.engine, poll_s=poll_s)
+            videos = [v for v in supabase.table("video_library").select("*").execute().data if matching.is_indexed(v)]
+            with metrics.span("matcher"):
+                plan = matching.match_storyboard(storyboard or [], videos, matching.recent_clip_ids(videos))
+            return time.perf_counter() - t0, len(plan), None
+        except Exception as e:
+            return time.perf_counter() - t0, 0, str(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(one, range(args.storyboards)))
+    wall = time.perf_counter() - start
+    os.unlink(audio_path)
+    latencies = sorted(o[0] for o in outcomes)
+    errors = [o[2] for o in outcomes if o[2]]
+    return {"wall_s": round(wall, 2), "storyboards": args.storyboards, "ok": len(outcomes) - len(errors),
+            "failed": len(errors), "per_min": round(60 * args.storyboards / wall, 1) if wall else None,
+            "p50_s": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "max_s": round(latencies[-1], 2) if latencies else None,
+            "blocks_matched": sum(o[1] for o in outcomes), "errors": sorted(set(errors))[:10]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga ponta a ponta com serviços simulados.")
+    parser.add_argument("--clips", type=int, default=100, help="clipes no Drive simulado (N)")
+    parser.add_argument("--storyboards", type=int, default=5, help="storyboards a gerar (M)")
+    parser.add_argument("--engine", choices=["Gemini", "OpenAI"], default="Gemini")
+    parser.add_argument("--concurrency", type=int, default=4, help="storyboards simultâneos")
+    parser.add_argument("--sync-concurrency", type=int, default=1, help="clipes analisados ao mesmo tempo na sincronização")
+    parser.add_argument("--sync-workers", type=int, default=1, help="workers de sincronização, cada um com uma parte (shard)")
+    parser.add_argument("--subfolders", type=int, default=0, help="subpastas no Drive simulado (sincronização recursiva)")
+    parser.add_argument("--indexed-fraction", type=float, default=0.0, help="fração já indexada no banco")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplica as latências simuladas")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--block-rate", type=float, default=0.0, help="bloqueios de segurança do Gemini")
+    parser.add_argument("--max-failures", type=int, default=library_sync.MAX_FAILURES,
+                        help="limite de falhas da sincronização (padrão igual ao do app)")
+    parser.add_argument("--pause-scale", type=float, default=0.0,
+                        help="multiplica as pausas entre chamadas de IA e a espera após 429 (0 = sem pausas)")
+    parser.add_argument("--audio-kb", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--quiet", action="store_true", help="não imprime o log da sincronização")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    config = fakes.FakeConfig(clips=args.clips, rate_429=args.rate_429, failure_rate=args.failure_rate,
+                              block_rate=args.block_rate, indexed_fraction=args.indexed_fraction,
+                              subfolders=args.subfolders, seed=args.seed)
+    config.latency_s = {k: v * args.latency_scale for k, v in config.latency_s.items()}
+    fakes.install(config)
+    metrics.reset()
+
+    report = {"config": vars(args), "sync": run_sync_phase(args), "storyboards": run_storyboard_phase(args),
+              "metrics": metrics.snapshot()}
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0
+    print("\n== Sincronização ==")
+    print(json.dumps(report["sync"], indent=2, ensure_ascii=False))
+    print("\n== Storyboards ==")
+    print(json.dumps(report["storyboards"], indent=2, ensure_ascii=False))
+    print("\n== Etapas ==")
+    print(f"{'etapa':<28} {'n':>6} {'p50 (s)':>9} {'p95 (s)':>9} {'máx (s)':>9} {'MB':>8}")
+    for stage, v in sorted(report["metrics"]["stages"].items()):
+        print(f"{stage:<28} {v['count']:>6} {v['p50_s']:>9.3f} {v['p95_s']:>9.3f} {v['max_s']:>9.3f} {v['bytes'] / 1024**2:>8.1f}")
+    for name, value in sorted(report["metrics"]["counters"].items()):
+        print(f"{name:<28} {value:>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
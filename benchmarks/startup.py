@@ -0,0 +1,60 @@
+"""Import-time budget for the app's cold start.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --budget-ms 150 --repeat 5
+
+Imports the modules `streamlit_app.py` loads before the first paint in a fresh
+interpreter, reports the median time and fails (exit 1) when it exceeds the
+budget or when a heavy SDK is pulled in eagerly.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+APP_MODULES = ["catalog", "clients", "drive_http", "engine_router", "engines", "llm_costs", "matching", "media", "metrics", "phash", "preview", "search_cache", "sync_queue", "settings", "timeline", "usage"]
+# Must only be imported by the tab or action that needs them
+HEAVY_MODULES = ["pandas", "googleapiclient", "google.generativeai", "supabase", "PIL", "openai"]
+
+PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import streamlit
+streamlit_s = time.perf_counter() - t
+t = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+app_s = time.perf_counter() - t
+print(json.dumps({{"streamlit_s": streamlit_s, "app_s": app_s,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure():
+    code = PROBE.format(modules=APP_MODULES, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o tempo de importação da inicialização do app.")
+    parser.add_argument("--budget-ms", type=float, default=200, help="orçamento para os módulos do app (sem o Streamlit)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    runs = [measure() for _ in range(args.repeat)]
+    app_ms = statistics.median(r["app_s"] for r in runs) * 1000
+    streamlit_ms = statistics.median(r["streamlit_s"] for r in runs) * 1000
+    heavy = sorted({m for r in runs for m in r["heavy"]})
+    print(f"streamlit:      {streamlit_ms:8.1f} ms")
+    print(f"módulos do app: {app_ms:8.1f} ms (orçamento {args.budget_ms:.0f} ms)")
+    if heavy:
+        print(f"❌ SDKs carregados na inicialização: {', '.join(heavy)}")
+    if app_ms > args.budget_ms:
+        print("❌ Orçamento de importação excedido.")
+    return 1 if heavy or app_ms > args.budget_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
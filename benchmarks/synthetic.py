@@ -0,0 +1,58 @@
+"""Synthetic `video_library` rows and storyboards with realistic Portuguese text."""
+import random
+
+SUJEITOS = ["mulher", "homem", "criança", "idosa", "casal", "família", "jovem", "grupo de amigos", "mãe", "pai"]
+ACOES = ["caminhando", "sentando", "sorrindo", "tomando café", "digitando", "olhando pela janela", "abraçando",
+         "correndo", "lendo um livro", "rezando", "cozinhando", "dirigindo", "chorando", "conversando", "dançando"]
+LUGARES = ["na praia", "no parque", "na cozinha", "em um escritório", "na igreja", "em uma rua movimentada",
+           "no campo", "à beira do lago", "na sala de estar", "em uma cafeteria", "na montanha", "no jardim"]
+EMOCOES = ["paz", "esperança", "alegria", "melancolia", "mistério", "gratidão", "tensão", "serenidade",
+           "nostalgia", "fé", "solidão", "euforia"]
+ELEMENTOS = ["luz do sol", "árvores", "xícara", "janela", "céu nublado", "velas", "mar", "flores", "carro",
+             "livro", "mãos", "pôr do sol", "chuva", "cidade", "bíblia", "montanhas", "cachorro", "mesa"]
+DETALHES = ["câmera lenta", "plano aberto", "close no rosto", "luz dourada", "tons frios", "desfoque ao fundo",
+            "movimento de câmera suave", "contraluz", "enquadramento centralizado"]
+
+
+def random_sentence(rng):
+    return f"{rng.choice(SUJEITOS)} {rng.choice(ACOES)} {rng.choice(LUGARES)}"
+
+
+def make_library(n, seed=42, desc_sentences=3, used_fraction=0.3):
+    """`n` indexed clips shaped like Supabase rows."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        acao = random_sentence(rng)
+        emocao = rng.choice(EMOCOES)
+        descricao = ". ".join(
+            [f"{random_sentence(rng)}, {', '.join(rng.sample(ELEMENTOS, 3))}" for _ in range(desc_sentences)]
+            + [rng.choice(DETALHES)])
+        last_used = f"2026-{rng.randint(1, 9):02d}-{rng.randint(1, 28):02d}T10:00:00" if rng.random() < used_fraction else None
+        rows.append({
+            "file_id": f"synthetic-{i:07d}", "file_name": f"{i + 1:04d}.mp4",
+            "drive_link": f"https://drive.google.com/file/d/synthetic-{i:07d}/view",
+            "acao": acao, "emocao": emocao, "descricao": descricao,
+            "tags": [acao, emocao] + rng.sample(ELEMENTOS, 2),
+            "thumbnail_link": None, "last_used_at": last_used,
+        })
+    return rows
+
+
+def make_storyboard(blocks, seed=7):
+    """Storyboard blocks in the format returned by `get_semantic_storyboard`."""
+    rng = random.Random(seed)
+    return [{
+        "timestamp": f"{(i * 9) // 60:02d}:{(i * 9) % 60:02d}",
+        "script_fragment": f"Bloco {i + 1} do roteiro sobre {rng.choice(EMOCOES)}.",
+        "sugestao_visual_literal": rng.choice([random_sentence(rng), rng.choice(ACOES)]),
+        "elementos_chave": rng.sample(ELEMENTOS, 3),
+        "emocao_alvo": rng.choice(EMOCOES),
+    } for i in range(blocks)]
+
+
+def make_queries(count, seed=3):
+    """Search-box queries: single words, short phrases and emotions."""
+    rng = random.Random(seed)
+    pool = ACOES + EMOCOES + ELEMENTOS + [f"{rng.choice(SUJEITOS)} {rng.choice(ACOES)}" for _ in range(10)]
+    return [rng.choice(pool) for _ in range(count)]
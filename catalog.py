@@ -0,0 +1,40 @@
+"""Compact, pre-normalized view of `video_library` rows for the scorers.
+
+Built once per library snapshot (or per candidate set) instead of lowercasing
+every field and rebuilding the tag list on each comparison. Columns are
+parallel lists indexed like `rows`; repeated strings (emotions, tag sets) are
+stored once. `rows` keeps the original dicts, which is what the scorers return.
+`phash_by_id` holds the parsed perceptual hashes of the clips that have one.
+"""
+import phash
+
+# Tags are joined with a character no query or keyword contains,
+# so `word in tags[i]` is the same test as `any(word in tag for tag in row_tags)`
+TAG_SEP = "\x00"
+
+
+def _tags_text(tags):
+    if isinstance(tags, str): tags = [tags]
+    return TAG_SEP.join(str(t).lower() for t in tags) if tags else None
+
+
+class Catalog:
+    __slots__ = ("rows", "file_ids", "acao", "descricao", "emocao", "tags", "phash_by_id")
+
+    def __init__(self, rows):
+        shared = {}
+        self.rows = list(rows)
+        self.file_ids = [r['file_id'] for r in self.rows]
+        self.acao = [(r.get('acao') or '').lower() for r in self.rows]
+        self.descricao = [(r.get('descricao') or '').lower() for r in self.rows]
+        self.emocao = [shared.setdefault(e, e) for e in ((r.get('emocao') or '').lower() for r in self.rows)]
+        self.tags = [t if t is None else shared.setdefault(t, t) for t in (_tags_text(r.get('tags')) for r in self.rows)]
+        self.phash_by_id = {r['file_id']: h for r in self.rows if (h := phash.parse(r.get('phash'))) is not None}
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def of(videos):
+    """`videos` as a Catalog (built once here when given plain rows)."""
+    return videos if isinstance(videos, Catalog) else Catalog(videos)
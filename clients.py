@@ -0,0 +1,123 @@
+"""Connections to Google Drive, Supabase, Gemini and OpenAI.
+
+Nothing here touches Streamlit, so the same clients are used by the app and by
+the background sync worker. SDK imports happen inside the getters so importing
+this module stays cheap on app startup.
+"""
+import json
+import os
+import re
+
+import backends
+from settings import get_setting
+
+PREFERRED_GEMINI_MODELS = ["models/gemini-1.5-flash", "models/gemini-2.0-flash", "models/gemini-1.5-pro"]
+
+_gemini_model = None
+_openai_client = None
+_drive = {"key": None, "service": None}
+
+
+# PostgREST / Postgres codes for objects a migration adds
+MISSING_FUNCTION, MISSING_TABLE, MISSING_COLUMN = "PGRST202", "PGRST205", "PGRST204"
+
+
+def error_code(e):
+    """Code of a Supabase error (`postgrest.APIError.code`, else read from its text form), or None."""
+    if getattr(e, "code", None):
+        return str(e.code)
+    match = re.search(r"""['"]code['"]:\s*['"]([0-9A-Z]+)['"]""", str(e))
+    return match.group(1) if match else None
+
+
+def not_deployed(e):
+    """PostgREST errors for a missing function (PGRST202) or table (PGRST205, 42P01)."""
+    return error_code(e) in (MISSING_FUNCTION, MISSING_TABLE, "42P01")
+
+
+def get_supabase_client():
+    if (fake := backends.get("supabase")) is not None:
+        return fake
+    from supabase import create_client
+    # Not cached so fresh secrets are used after the user updates them
+    return create_client(get_setting("SUPABASE_URL"), get_setting("SUPABASE_KEY"))
+
+
+def get_drive_service():
+    """The Drive v3 service, or None when no token is configured.
+
+    One service per token is shared by every thread: it runs on
+    `drive_http.PooledHttp`, so parallel downloads reuse pooled connections
+    and one credential refresh.
+    """
+    if (fake := backends.get("drive")) is not None:
+        return fake
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+    from drive_http import PooledHttp
+    token_info = get_setting("GOOGLE_TOKEN")
+    if token_info is None:
+        # Fallback for local testing
+        token_path = 'token.json'
+        if not os.path.exists(token_path):
+            return None
+        key = ("file", token_path, os.path.getmtime(token_path))
+        load = lambda: Credentials.from_authorized_user_file(token_path)
+    else:
+        if isinstance(token_info, str): token_info = json.loads(token_info)
+        key = ("secret", json.dumps(token_info, sort_keys=True))
+        load = lambda: Credentials.from_authorized_user_info(dict(token_info))
+
+    # Rebuilt only when the token changes, so fresh secrets are still picked up
+    if _drive["key"] != key:
+        service = build('drive', 'v3', http=PooledHttp(load()), cache_discovery=False)
+        _drive.update(key=key, service=service)
+    return _drive["service"]
+
+
+def get_gemini_model():
+    """Configures Gemini once and returns the preferred available model (or None)."""
+    global _gemini_model
+    if (fake := backends.get("gemini")) is not None:
+        return fake
+    if _gemini_model is None:
+        api_key = get_setting("GOOGLE_API_KEY")
+        if not api_key:
+            return None
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        available_models = [m.name for m in genai.list_models() if "generateContent" in m.supported_generation_methods]
+        selected_model = next((p for p in PREFERRED_GEMINI_MODELS if p in available_models), available_models[0] if available_models else None)
+        if selected_model:
+            _gemini_model = genai.GenerativeModel(selected_model)
+    return _gemini_model
+
+
+def gemini_configured():
+    """True when a Gemini key is set; no network call, unlike `get_gemini_model`."""
+    return backends.get("gemini") is not None or bool(get_setting("GOOGLE_API_KEY"))
+
+
+def openai_configured():
+    return backends.get("openai") is not None or bool(get_setting("OPENAI_API_KEY"))
+
+
+def get_openai_client():
+    global _openai_client
+    if (fake := backends.get("openai")) is not None:
+        return fake
+    if _openai_client is None:
+        api_key = get_setting("OPENAI_API_KEY")
+        if not api_key:
+            return None
+        from openai import OpenAI
+        _openai_client = OpenAI(api_key=api_key)
+    return _openai_client
+
+
+def get_gemini_files():
+    """Gemini file API (`upload_file`, `get_file`, `delete_file`)."""
+    if (fake := backends.get("gemini_files")) is not None:
+        return fake
+    import google.generativeai as genai
+    return genai
@@ -0,0 +1,56 @@
+"""Grouped Drive metadata operations over the Drive batch HTTP endpoint.
+
+Each batch request carries up to 100 calls; per-call failures come back keyed
+by file id so they can be merged into the sync report.
+"""
+import metrics
+
+BATCH_LIMIT = 100
+# One mask for listing and metadata fetches so a single pass gives everything sync needs
+FILE_FIELDS = "id, name, webViewLink, thumbnailLink, md5Checksum, size, modifiedTime, videoMediaMetadata"
+
+
+def _error_message(exception):
+    from googleapiclient.errors import HttpError
+    if isinstance(exception, HttpError):
+        return f"Drive {exception.resp.status}: {exception.reason}"
+    return str(exception)
+
+
+def execute_batch(service, requests):
+    """Runs `{key: HttpRequest}` in batches; returns `(results, errors)` keyed the same way."""
+    results, errors = {}, {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = _error_message(exception)
+        else:
+            results[request_id] = response
+
+    items = list(requests.items())
+    for start in range(0, len(items), BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=callback)
+        for key, request in items[start:start + BATCH_LIMIT]:
+            batch.add(request, request_id=key)
+        try:
+            with metrics.span("drive.batch"):
+                batch.execute()
+        except Exception as e:
+            # The whole HTTP call failed: every item in this chunk failed with it
+            for key, _ in items[start:start + BATCH_LIMIT]:
+                if key not in results: errors[key] = _error_message(e)
+    return results, errors
+
+
+def rename_files(service, new_names):
+    """Renames `{file_id: new_name}`; returns `(renamed_ids, errors)`."""
+    requests = {fid: service.files().update(fileId=fid, body={'name': name}, fields="id, name", supportsAllDrives=True)
+                for fid, name in new_names.items()}
+    results, errors = execute_batch(service, requests)
+    return set(results), errors
+
+
+def get_files_metadata(service, file_ids):
+    """Fetches checksum, size, timestamps, video metadata and thumbnail for each id."""
+    requests = {fid: service.files().get(fileId=fid, fields=FILE_FIELDS, supportsAllDrives=True) for fid in file_ids}
+    return execute_batch(service, requests)
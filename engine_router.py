@@ -0,0 +1,244 @@
+"""Automatic failover between Gemini and OpenAI, with a circuit breaker per engine.
+
+The engine picked in the UI or CLI is the primary one. Each call goes to the
+first engine whose circuit is closed. Quota errors (429), safety blocks and a
+missing key move that call to the other engine right away, without the 60s
+rate-limit sleep. Repeated ones open the engine's circuit:
+
+    closed  ->  open       after OPEN_AFTER consecutive quota/block errors,
+                           or ERROR_RATE of the last WINDOW calls failing
+    open    ->  half-open  after the cooldown (doubled on each failed probe, up to MAX_COOLDOWN_S)
+    half-open: one probe call goes to the engine; success closes the circuit
+
+A storyboard stream that ends without a single block counts as a failure.
+
+Circuits live in process memory and are shared by every thread (sync workers,
+batch storyboards). When no engine is available the primary is tried anyway,
+with its own retries.
+"""
+import threading
+import time
+from collections import deque
+from enum import Enum
+
+import engines
+import metrics
+from settings import get_setting
+
+ENGINES = ("Gemini", "OpenAI")
+OPEN_AFTER = 3
+WINDOW = 20
+ERROR_RATE = 0.5
+COOLDOWN_S = 120
+MAX_COOLDOWN_S = 1800
+FAILOVER = str(get_setting("ENGINE_FAILOVER", "1")).lower() not in ("0", "false", "no")
+
+
+class State(Enum):
+    # Values are shown in the UI
+    CLOSED = "fechado"
+    OPEN = "aberto"
+    HALF_OPEN = "em teste"
+
+
+def classify(error):
+    """"quota", "blocked", "unavailable" (no key) or "error"."""
+    if isinstance(error, engines.EngineUnavailable):
+        return "unavailable"
+    if isinstance(error, engines.BlockedError):
+        return "blocked"
+    # Provider SDK errors: HTTP status when they carry one, else their (English) message
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    lower = str(error).lower()
+    if status == 429 or "429" in lower or "quota" in lower or "resource has been exhausted" in lower or "rate limit" in lower:
+        return "quota"
+    if "safety" in lower:
+        return "blocked"
+    return "error"
+
+
+class Circuit:
+    """Error tracking and open/half-open state for one engine (thread-safe)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.state = State.CLOSED
+        self.streak = 0
+        self.results = deque(maxlen=WINDOW)
+        self.cooldown_s = COOLDOWN_S
+        self.open_until = 0.0
+        self.last_error = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def available(self):
+        with self._lock:
+            return self.state == State.CLOSED or (not self._probing and time.monotonic() >= self.open_until)
+
+    def allow(self):
+        """True when a call may go to this engine (claims the probe when half-open)."""
+        with self._lock:
+            if self.state == State.CLOSED:
+                return True
+            if self.state == State.OPEN and time.monotonic() >= self.open_until:
+                self.state = State.HALF_OPEN
+            if self.state == State.HALF_OPEN and not self._probing:
+                self._probing = True
+                metrics.incr(f"router.{self.engine.lower()}.probes")
+                return True
+            return False
+
+    def release(self):
+        """Gives the probe back when the call was abandoned without a result."""
+        with self._lock:
+            self._probing = False
+
+    def success(self):
+        with self._lock:
+            if self.state != State.CLOSED:
+                metrics.incr(f"router.{self.engine.lower()}.closed")
+            self.state, self.streak, self._probing = State.CLOSED, 0, False
+            self.cooldown_s = COOLDOWN_S
+            self.results.append(True)
+
+    def failure(self, kind, error):
+        with self._lock:
+            self.results.append(False)
+            self.last_error = str(error)[:200]
+            if kind != "error": self.streak += 1
+            failing = self.results.count(False)
+            if self.state == State.HALF_OPEN:
+                self._probing = False
+                self.cooldown_s = min(self.cooldown_s * 2, MAX_COOLDOWN_S)
+                self._open()
+            elif self.state == State.CLOSED and (kind == "unavailable" or self.streak >= OPEN_AFTER
+                                           or (len(self.results) == WINDOW and failing / WINDOW >= ERROR_RATE)):
+                self._open()
+
+    def _open(self):
+        self.state = State.OPEN
+        self.open_until = time.monotonic() + self.cooldown_s
+        metrics.incr(f"router.{self.engine.lower()}.opened")
+
+    def status(self):
+        with self._lock:
+            wait = max(0.0, self.open_until - time.monotonic()) if self.state == State.OPEN else 0.0
+            return {"engine": self.engine, "state": self.state, "reopens_in_s": round(wait),
+                    "recent_errors": self.results.count(False), "recent_calls": len(self.results),
+                    "last_error": self.last_error}
+
+
+_circuits = {engine: Circuit(engine) for engine in ENGINES}
+
+
+def reset():
+    for engine in ENGINES:
+        _circuits[engine] = Circuit(engine)
+
+
+def status():
+    """Circuit state per engine, for the UI and the worker logs."""
+    return [_circuits[engine].status() for engine in ENGINES]
+
+
+def _candidates(primary):
+    """Engines to try, primary first; the primary alone when failover is off or nothing is available."""
+    if not FAILOVER:
+        return [primary]
+    order = [primary] + [e for e in ENGINES if e != primary]
+    return [e for e in order if _circuits[e].available()] or [primary]
+
+
+def _attempts(primary):
+    """Yields `(engine, is_last)`, claiming each engine's circuit just before its call."""
+    candidates = _candidates(primary)
+    for i, name in enumerate(candidates):
+        is_last = i == len(candidates) - 1
+        # The last one goes out even when another thread holds its probe
+        if _circuits[name].allow() or is_last:
+            yield name, is_last
+
+
+FAILOVER_REASONS = {"quota": "cota esgotada", "blocked": "bloqueio de segurança", "unavailable": "sem chave"}
+
+
+def _fail(engine, error, is_last, log):
+    """Records the failure; re-raises unless the next engine should take the call."""
+    kind = classify(error)
+    _circuits[engine].failure(kind, error)
+    if kind == "error" or is_last:
+        raise error
+    metrics.incr(f"router.failover.{engine.lower()}")
+    _log(log, f"🔀 {engine} indisponível ({FAILOVER_REASONS[kind]}). Tentando o outro motor...")
+
+
+def _log(log, message):
+    if log: log(message)
+
+
+def analyze_vision(image_paths, engine="Gemini", retries=1, log=None, pause_scale=1.0):
+    """`engines.analyze_vision` with failover: `(meta, engine_used)`."""
+    for name, is_last in _attempts(engine):
+        try:
+            # A fallback exists: move on at once instead of sleeping through the rate limit
+            meta = engines.analyze_vision(image_paths, engine=name, retries=retries if is_last else 0, log=log,
+                                          pause_scale=pause_scale)
+            if not meta:
+                raise engines.BlockedError(f"{name} recusou ou enviou resposta vazia")
+        except Exception as e:
+            _fail(name, e, is_last, log)
+            continue
+        _circuits[name].success()
+        return meta, name
+
+
+def regenerate_block(block, previous=None, following=None, engine="Gemini", hint="", log=None):
+    """`engines.regenerate_block` with failover: `(block, engine_used)`."""
+    for name, is_last in _attempts(engine):
+        try:
+            new_block = engines.regenerate_block(block, previous, following, engine=name, hint=hint, log=log)
+        except Exception as e:
+            _fail(name, e, is_last, log)
+            continue
+        _circuits[name].success()
+        return new_block, name
+
+
+def stream_semantic_storyboard(audio_path, script_text, engine="Gemini", log=None):
+    """`engines.stream_semantic_storyboard` with failover.
+
+    The call moves to the other engine only while no block was yielded yet;
+    a stream that breaks midway raises, as before. A stream without blocks
+    fails over too; on the last engine it ends empty.
+    """
+    for name, is_last in _attempts(engine):
+        started = False
+        try:
+            for block in engines.stream_semantic_storyboard(audio_path, script_text, engine=name, log=log):
+                started = True
+                yield block
+        except GeneratorExit:
+            _circuits[name].release()
+            raise
+        except Exception as e:
+            if started:
+                _circuits[name].failure(classify(e), e)
+                raise
+            _fail(name, e, is_last, log)
+            continue
+        if not started:
+            error = engines.BlockedError(f"{name} não enviou nenhum bloco.")
+            if is_last:
+                # Not a success for the circuit, but the caller still handles an empty storyboard itself
+                _circuits[name].failure(classify(error), error)
+                return
+            _fail(name, error, is_last, log)
+            continue
+        _circuits[name].success()
+        return
+
+
+def get_semantic_storyboard(audio_path, script_text, engine="Gemini", log=None):
+    """Returns the list of storyboard blocks, or None. Raises on provider errors."""
+    blocks = list(stream_semantic_storyboard(audio_path, script_text, engine=engine, log=log))
+    return blocks or None
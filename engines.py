@@ -0,0 +1,392 @@
+"""Gemini / OpenAI calls for frame analysis and storyboard generation.
+
+`log` callbacks receive short user-facing messages; the app passes `st.write`
+or `st.warning`, the worker writes them to the job's status records.
+"""
+import json
+import os
+import re
+import time
+
+import llm_costs
+import metrics
+from clients import get_gemini_model, get_gemini_files, get_openai_client
+from media import encode_image, get_audio_duration, prepare_narration
+
+VISION_PROMPT = """
+        Analise estas imagens que representam uma sequência de um vídeo de 5 segundos.
+        IMAGE 1 é o início, IMAGE 2 é o fim.
+
+        Descreva a AÇÃO LITERAL e o MOVIMENTO (ex: 'alguém sentando', 'carro passando', 'pessoa sorrindo').
+        Identifique ELEMENTOS VISUAIS CONCRETOS.
+
+        Retorne APENAS JSON:
+        {"acao": "descrição do movimento/ação detectada entre os frames",
+         "emocao": "vibe ou sentimento predominante",
+         "descricao": "resumo detalhado dos elementos visuais",
+         "elementos_visuais": ["lista de objetos/cenário"]}
+        """
+
+
+# Waits between provider calls; callers scale them with `pause_scale` (the load test shortens them)
+RATE_LIMIT_WAIT_S = 60
+OPENAI_CALL_PAUSE_S = 1
+PROCESSING_POLL_S = 2
+
+
+class BlockedError(Exception):
+    """The model refused the input (safety block) or sent nothing usable."""
+
+
+class EngineUnavailable(Exception):
+    """The engine has no client configured (missing key)."""
+
+
+def _log(log, message):
+    if log: log(message)
+
+
+def analyze_vision(image_paths, engine="Gemini", retries=1, log=None, pause_scale=1.0):
+    """Analyzes a sequence of images to describe action and emotion.
+
+    `pause_scale` multiplies the pause before OpenAI calls and the wait after a 429.
+    """
+    client_openai = get_openai_client() if engine == "OpenAI" else None
+    gemini_model = get_gemini_model() if engine == "Gemini" else None
+
+    for attempt in range(retries + 1):
+        try:
+            if engine == "OpenAI" and client_openai:
+                time.sleep(OPENAI_CALL_PAUSE_S * pause_scale)
+                content_list = [{"type": "text", "text": VISION_PROMPT}]
+                for path in image_paths:
+                    base64_img = encode_image(path)
+                    content_list.append({
+                        "type": "image_url",
+                        "image_url": {"url": f"data:image/jpeg;base64,{base64_img}"}
+                    })
+
+                start = time.perf_counter()
+                with metrics.span("vision.openai"):
+                    response = client_openai.chat.completions.create(
+                        model="gpt-4o",
+                        messages=[{"role": "user", "content": content_list}],
+                        response_format={ "type": "json_object" }
+                    )
+                llm_costs.record("vision", "OpenAI", response.model, *llm_costs.usage_counts(response),
+                                 time.perf_counter() - start, images=len(image_paths), prompt=VISION_PROMPT)
+                content = response.choices[0].message.content
+                return json.loads(content)
+
+            elif engine == "Gemini" and gemini_model:
+                from PIL import Image
+                input_list = [VISION_PROMPT]
+                for path in image_paths:
+                    input_list.append(Image.open(path))
+
+                start = time.perf_counter()
+                with metrics.span("vision.gemini"):
+                    response = gemini_model.generate_content(input_list)
+                # Blocked images are billed too
+                llm_costs.record("vision", "Gemini", gemini_model.model_name, *llm_costs.usage_counts(response),
+                                 time.perf_counter() - start, images=len(image_paths), prompt=VISION_PROMPT)
+
+                if not response.candidates or not response.candidates[0].content.parts:
+                    raise BlockedError("Gemini bloqueou a imagem por motivos de segurança.")
+
+                json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
+                if not json_match:
+                    try:
+                        return json.loads(response.text.strip())
+                    except:
+                        raise Exception(f"Gemini enviou formato inválido.")
+                return json.loads(json_match.group())
+
+            else:
+                raise EngineUnavailable(f"Motor {engine} não configurado ou chave ausente.")
+
+        except Exception as e:
+            if "429" in str(e):
+                metrics.incr(f"vision.{engine.lower()}.rate_limited")
+                if attempt < retries:
+                    wait_s = RATE_LIMIT_WAIT_S * pause_scale
+                    _log(log, f"⏳ Limite atingido no {engine}. Aguardando {wait_s:g}s...")
+                    metrics.incr(f"vision.{engine.lower()}.retries")
+                    with metrics.span("rate_limit.sleep"):
+                        time.sleep(wait_s)
+                    continue
+            if attempt == retries:
+                raise e
+    return {}
+
+
+def build_storyboard_prompt(script_text, audio_duration):
+    duration_fmt = f"{int(audio_duration // 60):02d}:{int(audio_duration % 60):02d}" if audio_duration else "Desconhecida"
+    prompt_base = f"""
+                Você é um Diretor de Montagem de Elite.
+
+                OBJETIVO: Alinhar o ROTEIRO ao ÁUDIO com precisão técnica.
+                DURAÇÃO TOTAL DO ÁUDIO: {duration_fmt} ({audio_duration} segundos).
+
+                INSTRUÇÕES CRÍTICAS:
+                1. NÃO use blocos fixos de tempo. Divida o roteiro em frases ou parágrafos lógicos.
+                2. Para cada bloco, IDENTIFIQUE o timestamp (MM:SS) exato em que a narração começa a dizer aquelas palavras.
+                3. Descreva a IMAGEM LITERAL (visual_theme) que deve aparecer. Evite abstrações.
+                4. O último bloco DEVE estar próximo ao final da duração total ({duration_fmt}).
+
+                ROTEIRO: {script_text}
+
+                Retorne APENAS JSON:
+                {{ "storyboard": [
+                    {{"timestamp": "00:00", "script_fragment": "...", "sugestao_visual_literal": "...", "elementos_chave": ["...", "..."], "emocao_alvo": "..."}},
+                    ...
+                ]}}
+                """
+    return prompt_base, duration_fmt
+
+
+# Template identity for cost tracking (the script and duration are left out)
+STORYBOARD_PROMPT = build_storyboard_prompt("", 0)[0]
+
+
+class StoryboardStreamParser:
+    """Incremental JSON parser: `feed(text)` returns the storyboard blocks completed so far.
+
+    The payload is the first top-level JSON value that yields blocks, wherever
+    it starts ("Aqui está: [{...}]", after a ```json fence...). Bracketed prose
+    before it ("[nota]", an unclosed "[1)") is skipped. Blocks are the objects
+    of its top-level array: both `{"storyboard": [{...}, ...]}` and a bare
+    `[{...}]` work. Text after the payload is ignored.
+    """
+
+    # Stacks under which an object is a block: a bare array, or an array in the top-level object
+    BLOCK_PARENTS = (['['], ['{', '['])
+    # Everything JSON allows outside strings and brackets (numbers, true/false/null, separators)
+    JSON_CHARS = frozenset(' \t\r\n,:-+.0123456789eEtrufalsn')
+
+    def __init__(self):
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._buf = None
+        self._found = False
+        self._done = False
+
+    def feed(self, text):
+        blocks = []
+        for ch in text:
+            if self._done:
+                break
+            if not self._stack:
+                if ch in '{[':
+                    self._stack.append(ch)
+                continue
+            if self._buf is not None:
+                self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                if ch == '{' and self._buf is None and self._stack in self.BLOCK_PARENTS:
+                    self._buf = [ch]
+                self._stack.append(ch)
+            elif ch in '}]':
+                if self._stack.pop() != ('{' if ch == '}' else '['):
+                    self._not_json()
+                    continue
+                if self._buf is not None and self._stack in self.BLOCK_PARENTS:
+                    try:
+                        block = json.loads("".join(self._buf))
+                    except ValueError:
+                        block = None
+                    if isinstance(block, dict):
+                        blocks.append(block)
+                        self._found = True
+                    self._buf = None
+                if not self._stack:
+                    # A value without blocks ("[nota]") doesn't end the search
+                    self._done = self._found
+            elif ch not in self.JSON_CHARS:
+                self._not_json()
+        return blocks
+
+    def _not_json(self):
+        # Prose after all ("[revisado]", "[1)"): drop it and keep looking, or stop once blocks came out
+        self._stack, self._buf, self._done = [], None, self._found
+
+
+def _stream_blocks(open_stream, stage):
+    """Yields blocks parsed from `open_stream()`'s text chunks; times the stream and its first block."""
+    parser = StoryboardStreamParser()
+    start = time.perf_counter()
+    first = True
+    stream = open_stream()
+    try:
+        for text in stream:
+            for block in parser.feed(text or ""):
+                if first:
+                    metrics.observe(f"{stage}.first_block", time.perf_counter() - start)
+                    first = False
+                yield block
+    except Exception:
+        metrics.incr(f"{stage}.errors")
+        raise
+    finally:
+        # Runs the stream's own cleanup (its cost record) at once when the consumer stops early
+        stream.close()
+        metrics.observe(stage, time.perf_counter() - start)
+
+
+def stream_semantic_storyboard(audio_path, script_text, engine="Gemini", log=None, poll_s=PROCESSING_POLL_S):
+    """Yields storyboard blocks as the model writes them. Raises on provider errors.
+
+    Closing the generator early (the editor stopped a bad generation) stops
+    reading the response; the uploaded Gemini file is still deleted. `poll_s`
+    is the wait between checks of the uploaded audio's processing state.
+    """
+    if engine == "Gemini":
+        # Gemini listens to the audio: upload a compressed copy (its duration comes from the same pass)
+        audio_path, audio_duration = prepare_narration(audio_path)
+    else:
+        audio_duration = get_audio_duration(audio_path)
+    prompt_base, duration_fmt = build_storyboard_prompt(script_text, audio_duration)
+
+    if engine == "Gemini" and (gemini_model := get_gemini_model()):
+        _log(log, "📤 Enviando narração para o Gemini (Sincronia por Áudio)...")
+        files = get_gemini_files()
+        with metrics.span("storyboard.upload"):
+            audio_file = files.upload_file(path=audio_path)
+        metrics.add_bytes("storyboard.upload", os.path.getsize(audio_path))
+        try:
+            with metrics.span("storyboard.processing_wait"):
+                while audio_file.state.name == "PROCESSING":
+                    time.sleep(poll_s)
+                    audio_file = files.get_file(audio_file.name)
+
+            _log(log, "⚡ Sincronizando conteúdo no Gemini (Escuta Ativa)...")
+            # For Gemini, we add the audio to the prompt
+            prompt = f"Escute o áudio e alinhe o roteiro com precisão milimétrica. A duração total é {duration_fmt}. {prompt_base}"
+            def open_stream():
+                start = time.perf_counter()
+                response = gemini_model.generate_content([audio_file, prompt], stream=True)
+                try:
+                    for chunk in response:
+                        yield chunk.text
+                finally:
+                    # Usage (audio included in the prompt tokens) comes with the chunks read so far;
+                    # recorded also when the stream is stopped early or breaks, since it was billed
+                    llm_costs.record("storyboard", "Gemini", gemini_model.model_name, *llm_costs.usage_counts(response),
+                                     time.perf_counter() - start, prompt=STORYBOARD_PROMPT)
+            yield from _stream_blocks(open_stream, "storyboard.gemini")
+        finally:
+            files.delete_file(audio_file.name)
+        return
+
+    elif engine == "OpenAI" and (client_openai := get_openai_client()):
+        _log(log, f"⚡ Gerando Storyboard no OpenAI (Distribuição Proporcional para {duration_fmt})...")
+
+        def open_stream():
+            start = time.perf_counter()
+            response = client_openai.chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": prompt_base}],
+                response_format={ "type": "json_object" },
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            last, text = None, []
+            try:
+                for chunk in response:
+                    if chunk.choices:
+                        text.append(chunk.choices[0].delta.content or "")
+                        yield chunk.choices[0].delta.content
+                    # The usage arrives in a final chunk without choices
+                    if getattr(chunk, "usage", None) is not None:
+                        last = chunk
+            finally:
+                # Stopped before that chunk: estimated at ~4 characters per token
+                usage = llm_costs.usage_counts(last) if last else (len(prompt_base) // 4, len("".join(text)) // 4)
+                llm_costs.record("storyboard", "OpenAI", getattr(last, "model", "gpt-4o"), *usage,
+                                 time.perf_counter() - start, prompt=STORYBOARD_PROMPT)
+        yield from _stream_blocks(open_stream, "storyboard.openai")
+        return
+
+    raise EngineUnavailable(f"Motor {engine} não configurado.")
+
+
+def build_block_prompt(block, previous=None, following=None, hint=""):
+    """Prompt to rewrite one block's visual, with its neighbours as context (no audio)."""
+    context = "\n".join(f"- {label} [{b.get('timestamp', '')}]: {b.get('script_fragment', '')} "
+                        f"(visual: {b.get('sugestao_visual_literal', b.get('visual_theme', ''))})"
+                        for label, b in (("ANTERIOR", previous), ("SEGUINTE", following)) if b)
+    return f"""
+                Você é um Diretor de Montagem de Elite.
+
+                OBJETIVO: Propor uma NOVA IMAGEM LITERAL para um único bloco de um storyboard já montado.
+                O editor rejeitou a sugestão atual: "{block.get('sugestao_visual_literal', block.get('visual_theme', ''))}".
+                {f'PEDIDO DO EDITOR: {hint}' if hint else ''}
+
+                CONTEXTO (blocos vizinhos, não altere):
+                {context or '- (nenhum)'}
+
+                INSTRUÇÕES CRÍTICAS:
+                1. Mantenha o timestamp "{block.get('timestamp', '')}" e o texto do bloco exatamente como estão.
+                2. Descreva uma IMAGEM LITERAL diferente da atual, coerente com os vizinhos. Evite abstrações.
+
+                ROTEIRO: {block.get('script_fragment', '')}
+
+                Retorne APENAS JSON:
+                {{ "storyboard": [
+                    {{"timestamp": "{block.get('timestamp', '')}", "script_fragment": "...", "sugestao_visual_literal": "...", "elementos_chave": ["...", "..."], "emocao_alvo": "..."}}
+                ]}}
+                """
+
+
+BLOCK_PROMPT = build_block_prompt({})
+
+
+def regenerate_block(block, previous=None, following=None, engine="Gemini", hint="", log=None):
+    """New visual for one block: only its text and its neighbours go to the model (no audio upload).
+
+    The timestamp and script fragment are kept; raises on provider errors.
+    """
+    prompt = build_block_prompt(block, previous, following, hint)
+    start = time.perf_counter()
+    if engine == "Gemini" and (gemini_model := get_gemini_model()):
+        _log(log, "⚡ Regenerando bloco no Gemini...")
+        with metrics.span("storyboard_block.gemini"):
+            response = gemini_model.generate_content(prompt)
+        llm_costs.record("storyboard_block", "Gemini", gemini_model.model_name, *llm_costs.usage_counts(response),
+                         time.perf_counter() - start, prompt=BLOCK_PROMPT)
+        if not response.candidates or not response.candidates[0].content.parts:
+            raise BlockedError("Gemini bloqueou o bloco por motivos de segurança.")
+        text = response.text
+    elif engine == "OpenAI" and (client_openai := get_openai_client()):
+        _log(log, "⚡ Regenerando bloco no OpenAI...")
+        with metrics.span("storyboard_block.openai"):
+            response = client_openai.chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": prompt}],
+                response_format={ "type": "json_object" }
+            )
+        llm_costs.record("storyboard_block", "OpenAI", response.model, *llm_costs.usage_counts(response),
+                         time.perf_counter() - start, prompt=BLOCK_PROMPT)
+        text = response.choices[0].message.content
+    else:
+        raise EngineUnavailable(f"Motor {engine} não configurado.")
+    blocks = StoryboardStreamParser().feed(text or "")
+    if not blocks:
+        raise Exception(f"{engine} enviou formato inválido.")
+    return {**blocks[0], "timestamp": block.get('timestamp'), "script_fragment": block.get('script_fragment')}
+
+
+def get_semantic_storyboard(audio_path, script_text, engine="Gemini", log=None, poll_s=PROCESSING_POLL_S):
+    """Returns the list of storyboard blocks, or None. Raises on provider errors."""
+    blocks = list(stream_semantic_storyboard(audio_path, script_text, engine=engine, log=log, poll_s=poll_s))
+    return blocks or None
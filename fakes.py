@@ -0,0 +1,583 @@
+"""Local stand-ins for Google Drive, Supabase, Gemini and OpenAI.
+
+They implement just the client surface the app uses, with configurable
+latency, 429 rates, safety blocks and failure injection. `install()` registers
+them in `backends`, so `clients.get_*` and `media.extract_frames` return them.
+"""
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest, MediaIoBaseDownload
+from postgrest.exceptions import APIError
+from PIL import Image
+
+import backends
+import matching
+import metrics
+import usage
+from media import SPEC_COLUMNS, clip_specs
+from benchmarks.synthetic import make_library, EMOCOES, ELEMENTOS, ACOES, random_sentence
+
+
+@dataclass
+class FakeConfig:
+    # Mean latency per call (seconds); each call is jittered by +/- `jitter`
+    latency_s: dict = field(default_factory=lambda: {
+        "drive": 0.05, "drive_media": 0.2, "supabase": 0.03,
+        "gemini": 0.8, "gemini_upload": 0.5, "gemini_processing": 0.5, "openai": 1.2,
+    })
+    jitter: float = 0.3
+    rate_429: float = 0.0
+    failure_rate: float = 0.0
+    block_rate: float = 0.0
+    clips: int = 100
+    clip_bytes: int = 2_000_000
+    indexed_fraction: float = 0.0
+    # Clips are spread over this many subfolders of FAKE_ROOT (0: all in the root)
+    subfolders: int = 0
+    seed: int = 1
+
+
+class Faults:
+    """Shared latency/failure injector (thread-safe)."""
+
+    def __init__(self, config):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+
+    def _roll(self):
+        with self._lock:
+            return self._rng.random(), self._rng.uniform(-1, 1)
+
+    def wait(self, kind, scale=1.0):
+        mean = self.config.latency_s.get(kind, 0.0) * scale
+        _, j = self._roll()
+        time.sleep(max(0.0, mean * (1 + self.config.jitter * j)))
+
+    def check(self, kind, sleep=True):
+        """Sleeps for `kind` latency and returns "429", "fail" or None."""
+        if sleep:
+            self.wait(kind)
+        roll, _ = self._roll()
+        if roll < self.config.rate_429:
+            metrics.incr(f"fake.{kind}.429")
+            return "429"
+        if roll < self.config.rate_429 + self.config.failure_rate:
+            metrics.incr(f"fake.{kind}.failures")
+            return "fail"
+        return None
+
+    def blocked(self):
+        roll, _ = self._roll()
+        return roll < self.config.block_rate
+
+
+# --- Google Drive -----------------------------------------------------------
+
+def _http_error(status, message):
+    return HttpError(httplib2.Response({"status": status}), json.dumps({"error": {"message": message}}).encode())
+
+
+class _Call:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self, num_retries=0):
+        return self._fn()
+
+    def execute_in_batch(self):
+        return self._fn(sleep=False)
+
+
+class _MediaHttp:
+    """httplib2-like transport serving ranged media downloads."""
+
+    def __init__(self, drive, file_id):
+        self.drive, self.file_id = drive, file_id
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        outcome = self.drive.faults.check("drive_media")
+        if outcome:
+            status = 429 if outcome == "429" else 500
+            return httplib2.Response({"status": status}), b'{"error": {"message": "fake"}}'
+        payload = self.drive.payload
+        start, end = 0, len(payload) - 1
+        m = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        if m:
+            start, end = int(m.group(1)), min(int(m.group(2)), len(payload) - 1)
+        chunk = payload[start:end + 1]
+        metrics.add_bytes("fake.drive_media", len(chunk))
+        return httplib2.Response({"status": 206, "content-range": f"bytes {start}-{end}/{len(payload)}"}), chunk
+
+
+class _DriveFiles:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def _guarded(self, fn):
+        def run(sleep=True):
+            outcome = self.drive.faults.check("drive", sleep=sleep)
+            if outcome == "429":
+                raise _http_error(429, "User rate limit exceeded.")
+            if outcome == "fail":
+                raise _http_error(500, "Backend Error")
+            return fn()
+        return _Call(run)
+
+    def list(self, q=None, fields=None, pageToken=None, pageSize=100, **kwargs):
+        def run():
+            # `'<id>' in parents` clauses; ids that aren't fake folders stand for the root
+            parents = {p if p in self.drive.folders else FAKE_ROOT for p in re.findall(r"'([^']+)' in parents", q or "")}
+            items = list(self.drive.files_by_id.values())
+            if FOLDER_MIME in (q or ""):
+                items = list(self.drive.folders.values()) + items
+            files = [f for f in items if not parents or parents & set(f['parents'])]
+            start = int(pageToken or 0)
+            page = [dict(f) for f in files[start:start + pageSize]]
+            res = {"files": page}
+            if start + pageSize < len(files):
+                res["nextPageToken"] = str(start + pageSize)
+            return res
+        return self._guarded(run)
+
+    def get(self, fileId=None, fields=None, **kwargs):
+        def run():
+            if fileId not in self.drive.files_by_id:
+                raise _http_error(404, f"File not found: {fileId}.")
+            return dict(self.drive.files_by_id[fileId])
+        return self._guarded(run)
+
+    def update(self, fileId=None, body=None, fields=None, **kwargs):
+        def run():
+            if fileId not in self.drive.files_by_id:
+                raise _http_error(404, f"File not found: {fileId}.")
+            self.drive.files_by_id[fileId].update(body or {})
+            return {"id": fileId, "name": self.drive.files_by_id[fileId]["name"]}
+        return self._guarded(run)
+
+    def get_media(self, fileId=None, **kwargs):
+        return HttpRequest(_MediaHttp(self.drive, fileId), None, f"https://fake.drive/{fileId}?alt=media", headers={})
+
+
+class _DriveBatch:
+    def __init__(self, drive, callback):
+        self.drive, self.callback, self.calls = drive, callback, []
+
+    def add(self, request, request_id=None, callback=None):
+        self.calls.append((request_id or str(len(self.calls)), request))
+
+    def execute(self):
+        self.drive.faults.wait("drive")
+        for request_id, request in self.calls:
+            try:
+                self.callback(request_id, request.execute_in_batch(), None)
+            except HttpError as e:
+                self.callback(request_id, None, e)
+
+
+FAKE_ROOT = "fake-folder"
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+
+class FakeDrive:
+    def __init__(self, config, faults):
+        self.faults = faults
+        rng = random.Random(config.seed)
+        self.folders = {f"{FAKE_ROOT}-{k}": {"id": f"{FAKE_ROOT}-{k}", "name": f"Pasta {k}", "mimeType": FOLDER_MIME,
+                                             "parents": [FAKE_ROOT]} for k in range(config.subfolders)}
+        folder_ids = list(self.folders) or [FAKE_ROOT]
+        self.files_by_id = {}
+        for i in range(config.clips):
+            fid = f"fake-{i:07d}"
+            self.files_by_id[fid] = {
+                "mimeType": "video/mp4", "parents": [folder_ids[i % len(folder_ids)]],
+                "id": fid, "name": f"IMG_{rng.randint(1000, 9999)}_{i}.mp4",
+                "webViewLink": f"https://drive.google.com/file/d/{fid}/view",
+                "thumbnailLink": f"https://lh3.googleusercontent.com/fake/{fid}=s220",
+                "md5Checksum": f"{rng.getrandbits(128):032x}", "size": str(config.clip_bytes),
+                "modifiedTime": "2026-01-01T00:00:00.000Z",
+                "videoMediaMetadata": {**rng.choice([{"width": 1920, "height": 1080}, {"width": 1080, "height": 1920}]),
+                                       "durationMillis": str(rng.randint(3000, 20000))},
+            }
+        self.payload = _sample_video(config.clip_bytes)
+
+    def files(self):
+        return _DriveFiles(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _DriveBatch(self, callback)
+
+
+def _sample_video(size):
+    """A real 5s clip when ffmpeg exists (so frame extraction works), else random bytes."""
+    if shutil.which("ffmpeg"):
+        path = os.path.join(tempfile.gettempdir(), "soul_fake_clip.mp4")
+        if not os.path.exists(path):
+            subprocess.run(['ffmpeg', '-y', '-f', 'lavfi', '-i', 'testsrc=duration=5:size=320x180:rate=24',
+                            '-pix_fmt', 'yuv420p', path], capture_output=True)
+        if os.path.exists(path):
+            with open(path, "rb") as fh:
+                return fh.read()
+    return os.urandom(min(size, 256 * 1024))
+
+
+def stub_frames(service, file_id, timestamps):
+    """ffmpeg-free frame extractor: downloads the clip, then writes placeholder JPEGs."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_video, metrics.span("drive.download"):
+        downloader = MediaIoBaseDownload(tmp_video, service.files().get_media(fileId=file_id))
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+        metrics.add_bytes("drive.download", tmp_video.tell())
+    paths = []
+    # A pattern per clip, so each one gets its own perceptual hash
+    rng = random.Random(file_id)
+    for i, _ in enumerate(timestamps):
+        path = f"{tmp_video.name}_frame_{i}.jpg"
+        img = Image.new("RGB", (9, 8))
+        img.putdata([(rng.randrange(256), 90, 160) for _ in range(72)])
+        img.resize((64, 36)).save(path)
+        paths.append(path)
+    os.unlink(tmp_video.name)
+    return paths
+
+
+# --- Supabase ---------------------------------------------------------------
+
+class _Query:
+    def __init__(self, db, table):
+        self.db, self.table = db, table
+        self.op, self.payload, self.filters = "select", None, []
+        self.order_by, self.limit_n, self.count_mode = None, None, None
+
+    def select(self, columns="*", count=None):
+        self.count_mode = count
+        return self
+
+    def order(self, column, desc=False, nullsfirst=False):
+        self.order_by = (column, desc, nullsfirst)
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def upsert(self, rows):
+        self.op, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, data):
+        self.op, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def execute(self):
+        outcome = self.db.faults.check("supabase")
+        if outcome:
+            raise Exception("429 Too Many Requests" if outcome == "429" else "500 Internal Server Error (fake)")
+        with self.db.lock:
+            table = self.db.tables.setdefault(self.table, {})
+            key = self.db.keys.get(self.table, "id")
+            stamp = {"updated_at": datetime.now(timezone.utc).isoformat()} if self.table in self.db.touched else {}
+            if self.op in ("upsert", "insert"):
+                for row in self.payload:
+                    row_key = row.get(key) if key in row else len(table) + 1
+                    table[row_key] = {**table.get(row_key, {}), **row, **stamp}
+                return SimpleNamespace(data=self.payload, count=None)
+            rows = [r for r in table.values() if all(f(r) for f in self.filters)]
+            if self.op == "update":
+                for r in rows: r.update(self.payload, **stamp)
+                return SimpleNamespace(data=[dict(r) for r in rows], count=None)
+            if self.op == "delete":
+                for r in rows: table.pop(r.get(key), None)
+                return SimpleNamespace(data=rows, count=None)
+            count = len(rows)
+            if self.order_by:
+                col, desc, nullsfirst = self.order_by
+                present = sorted([r for r in rows if r.get(col) is not None], key=lambda r: r[col], reverse=desc)
+                nulls = [r for r in rows if r.get(col) is None]
+                rows = nulls + present if nullsfirst else present + nulls
+            if self.limit_n is not None:
+                rows = rows[:self.limit_n]
+            return SimpleNamespace(data=[dict(r) for r in rows], count=count if self.count_mode else None)
+
+
+def _search_rpc(db, params):
+    """`search_video_library` stand-in, ranked by the Python keyword scorer."""
+    with db.lock:
+        rows = list(db.tables["video_library"].values())
+    rows = matching.filter_specs(rows, params.get("orientation"), params.get("min_duration"))
+    hits = matching.keyword_search(rows, params.get("query", ""))
+    return [{"file_id": r['file_id'], "score": float(s), "total_count": len(hits)}
+            for r, s in hits[:params.get("match_count", 24)]]
+
+
+def _usage_penalties_rpc(db, params):
+    with db.lock:
+        events = list(db.tables.get("clip_usage", {}).values())
+    by_clip = {}
+    for e in events:
+        by_clip.setdefault(e['file_id'], []).append(e['used_at'])
+    half_life = params.get("half_life_days", usage.HALF_LIFE_DAYS)
+    rows = [{"file_id": fid, "penalty": usage.decay_penalty(ts, half_life_days=half_life), "uses": len(ts),
+             "last_used_at": max(ts)} for fid, ts in by_clip.items()]
+    rows.sort(key=lambda r: -r['penalty'])
+    return rows[:params.get("match_count")]
+
+
+def _fresh_candidates_rpc(db, params):
+    penalties = {r['file_id']: r['penalty'] for r in _usage_penalties_rpc(db, {**params, "match_count": None})}
+    with db.lock:
+        rows = [dict(r) for r in db.tables["video_library"].values() if matching.is_indexed(r)]
+    rows.sort(key=lambda r: (penalties.get(r['file_id'], 0), r.get('file_name') or ''))
+    return rows[:params.get("match_count")]
+
+
+def _claim_leases_rpc(db, params):
+    now = time.time()
+    claimed = []
+    with db.lock:
+        leases = db.tables.setdefault("sync_leases", {})
+        library = db.tables["video_library"]
+        for fid in params["file_ids"]:
+            lease = leases.get(fid)
+            if fid in library and matching.is_indexed(library[fid]):
+                continue
+            if lease and lease['expires_at'] >= now and lease['worker'] != params["worker_id"]:
+                continue
+            leases[fid] = {"file_id": fid, "worker": params["worker_id"], "expires_at": now + params.get("ttl_s", 900)}
+            claimed.append({"file_id": fid})
+    return claimed
+
+
+def _release_leases_rpc(db, params):
+    with db.lock:
+        leases = db.tables.setdefault("sync_leases", {})
+        for fid in params["file_ids"]:
+            if (leases.get(fid) or {}).get('worker') == params["worker_id"]:
+                del leases[fid]
+    return None
+
+
+def _reserve_numbers_rpc(db, params):
+    with db.lock:
+        if db.next_clip_number is None:
+            db.next_clip_number = max((int(n) for n in ((r.get('file_name') or '').split('.')[0]
+                                                        for r in db.tables["video_library"].values()) if n.isdigit()), default=0) + 1
+        start = db.next_clip_number
+        db.next_clip_number += params["n"]
+    return [{"clip_number": n} for n in range(start, start + params["n"])]
+
+
+class FakeSupabase:
+    def __init__(self, config, faults, rows=()):
+        self.faults = faults
+        self.lock = threading.Lock()
+        self.keys = {"video_library": "file_id"}
+        self.tables = {"video_library": {r['file_id']: dict(r) for r in rows}}
+        self.rpcs = {"search_video_library": _search_rpc, "clip_usage_penalties": _usage_penalties_rpc,
+                     "fresh_clip_candidates": _fresh_candidates_rpc, "claim_sync_leases": _claim_leases_rpc,
+                     "release_sync_leases": _release_leases_rpc, "reserve_clip_numbers": _reserve_numbers_rpc}
+        self.next_clip_number = None
+        # Tables with the `updated_at` trigger of the migrations
+        self.touched = {"video_library"}
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params=None):
+        def run():
+            outcome = self.faults.check("supabase")
+            if outcome:
+                raise Exception("500 Internal Server Error (fake)")
+            if name not in self.rpcs:
+                raise APIError({"message": f"Could not find the function public.{name} in the schema cache",
+                                "code": "PGRST202", "hint": None, "details": None})
+            return SimpleNamespace(data=self.rpcs[name](self, params or {}), count=None)
+        return _Call(run)
+
+
+# --- Gemini / OpenAI --------------------------------------------------------
+
+def _vision_json(rng):
+    acao = random_sentence(rng)
+    return {"acao": acao, "emocao": rng.choice(EMOCOES),
+            "descricao": f"{acao}, {', '.join(rng.sample(ELEMENTOS, 3))}",
+            "elementos_visuais": rng.sample(ELEMENTOS, 3)}
+
+
+def _storyboard_json(prompt, rng):
+    script = re.search(r"ROTEIRO:(.*?)Retorne APENAS JSON", prompt, re.DOTALL)
+    fragments = [s.strip() for s in re.split(r"[.!?\n]+", script.group(1) if script else "") if s.strip()] or ["..."]
+    return {"storyboard": [{
+        "timestamp": f"{(i * 8) // 60:02d}:{(i * 8) % 60:02d}", "script_fragment": frag,
+        "sugestao_visual_literal": rng.choice(ACOES), "elementos_chave": rng.sample(ELEMENTOS, 2),
+        "emocao_alvo": rng.choice(EMOCOES)} for i, frag in enumerate(fragments)]}
+
+
+class _Stream(list):
+    """Streamed response: iterate the chunks; `usage_metadata` like the real SDK."""
+
+
+def _chunks(text, size=40):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _prompt_text(inputs):
+    if isinstance(inputs, str):
+        return inputs
+    return " ".join(x for x in inputs if isinstance(x, str))
+
+
+class FakeGeminiModel:
+    model_name = "models/fake-gemini"
+
+    def __init__(self, faults):
+        self.faults = faults
+        self._rng = random.Random(faults.config.seed + 1)
+
+    def generate_content(self, inputs, **kwargs):
+        outcome = self.faults.check("gemini")
+        if outcome == "429":
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+        if outcome == "fail":
+            raise Exception("500 An internal error has occurred.")
+        text = _prompt_text(inputs)
+        images = [x for x in (inputs if isinstance(inputs, list) else []) if isinstance(x, Image.Image)]
+        if images and self.faults.blocked():
+            return SimpleNamespace(candidates=[], text="", usage_metadata=None)
+        if images:
+            body = json.dumps(_vision_json(self._rng), ensure_ascii=False)
+        elif '"storyboard"' in text:
+            body = json.dumps(_storyboard_json(text, self._rng), ensure_ascii=False)
+        else:
+            body = json.dumps(self._rng.sample(ELEMENTOS, 5), ensure_ascii=False)
+        usage = SimpleNamespace(prompt_token_count=len(text) // 4 + 258 * len(images),
+                                candidates_token_count=len(body) // 4, total_token_count=0)
+        usage.total_token_count = usage.prompt_token_count + usage.candidates_token_count
+        if kwargs.get("stream"):
+            stream = _Stream(SimpleNamespace(text=piece) for piece in _chunks(f"```json\n{body}\n```"))
+            stream.usage_metadata = usage
+            return stream
+        return SimpleNamespace(text=f"```json\n{body}\n```",
+                               candidates=[SimpleNamespace(content=SimpleNamespace(parts=[body]))],
+                               usage_metadata=usage)
+
+
+class FakeGeminiFiles:
+    def __init__(self, faults):
+        self.faults = faults
+        self._ready_at = {}
+
+    def upload_file(self, path=None, **kwargs):
+        self.faults.wait("gemini_upload", scale=max(1.0, os.path.getsize(path) / 5_000_000))
+        name = f"files/fake-{len(self._ready_at)}"
+        self._ready_at[name] = time.time() + self.faults.config.latency_s.get("gemini_processing", 0)
+        return self.get_file(name)
+
+    def get_file(self, name):
+        state = "PROCESSING" if time.time() < self._ready_at.get(name, 0) else "ACTIVE"
+        return SimpleNamespace(name=name, state=SimpleNamespace(name=state))
+
+    def delete_file(self, name):
+        self._ready_at.pop(name, None)
+
+
+class _Completions:
+    def __init__(self, faults):
+        self.faults = faults
+        self._rng = random.Random(faults.config.seed + 2)
+
+    def create(self, model=None, messages=None, response_format=None, **kwargs):
+        outcome = self.faults.check("openai")
+        if outcome == "429":
+            raise Exception("Error code: 429 - {'error': {'code': 'rate_limit_exceeded'}}")
+        if outcome == "fail":
+            raise Exception("Error code: 500 - {'error': {'message': 'fake server error'}}")
+        content = messages[-1]["content"]
+        if isinstance(content, list):
+            images = sum(1 for c in content if c.get("type") == "image_url")
+            text = " ".join(c.get("text", "") for c in content if c.get("type") == "text")
+            body = _vision_json(self._rng)
+        else:
+            images, text = 0, content
+            body = _storyboard_json(text, self._rng) if '"storyboard"' in text else {"keywords": self._rng.sample(ELEMENTOS, 5)}
+        body = json.dumps(body, ensure_ascii=False)
+        usage = SimpleNamespace(prompt_tokens=len(text) // 4 + 765 * images, completion_tokens=len(body) // 4, total_tokens=0)
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        if kwargs.get("stream"):
+            chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None, model=model)
+                      for piece in _chunks(body)]
+            if (kwargs.get("stream_options") or {}).get("include_usage"):
+                chunks.append(SimpleNamespace(choices=[], usage=usage, model=model))
+            return iter(chunks)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=body))], usage=usage, model=model)
+
+
+class FakeOpenAI:
+    def __init__(self, faults):
+        self.chat = SimpleNamespace(completions=_Completions(faults))
+
+
+def install(config=None, frames=None):
+    """Registers every fake in `backends` and returns them.
+
+    `frames` defaults to the real ffmpeg extractor when ffmpeg is installed and
+    to `stub_frames` otherwise.
+    """
+    config = config or FakeConfig()
+    faults = Faults(config)
+    rng = random.Random(config.seed)
+    indexed = [r for r in make_library(config.clips, seed=config.seed) if rng.random() < config.indexed_fraction]
+    fakes = SimpleNamespace(
+        config=config, faults=faults,
+        drive=FakeDrive(config, faults),
+        supabase=FakeSupabase(config, faults),
+        gemini=FakeGeminiModel(faults), gemini_files=FakeGeminiFiles(faults), openai=FakeOpenAI(faults),
+    )
+    # Pre-indexed rows point at real fake Drive ids so sync sees them as known;
+    # every other one still lacks specs, like rows indexed before the clip-specs migration.
+    # Hashes come in "shoots" of three near-identical clips; every fifth clip has none yet
+    for i, (row, fid) in enumerate(zip(indexed, fakes.drive.files_by_id)):
+        row['file_id'] = fid
+        row.update(clip_specs(fakes.drive.files_by_id[fid]) if i % 2 else dict.fromkeys(SPEC_COLUMNS))
+        shoot = random.Random(f"shoot-{i // 3}").getrandbits(128)
+        row['phash'] = None if i % 5 == 4 else f"{shoot ^ (1 << rng.randrange(128)):032x}"
+        fakes.supabase.tables["video_library"][fid] = row
+    backends.clear()
+    for name in ("drive", "supabase", "gemini", "gemini_files", "openai"):
+        backends.install(name, getattr(fakes, name))
+    if frames is None and not shutil.which("ffmpeg"):
+        frames = stub_frames
+    if frames is not None:
+        backends.install("frames", frames)
+    return fakes
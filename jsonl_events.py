@@ -0,0 +1,16 @@
+"""JSON-lines progress output shared by the headless tools (`sync_cli.py`, `storyboard_batch.py`).
+
+Each event is one object per line on stdout, `{"event": ..., **fields, "ts": ...}`.
+Worker threads emit too, so lines are printed under a lock and never interleave.
+"""
+import json
+import threading
+import time
+
+_out_lock = threading.Lock()
+
+
+def emit(event, **fields):
+    line = json.dumps({"event": event, **fields, "ts": round(time.time(), 3)}, ensure_ascii=False, default=str)
+    with _out_lock:
+        print(line, flush=True)
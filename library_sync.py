@@ -0,0 +1,535 @@
+"""Drive → Supabase library sync: listing, grouping and per-clip processing.
+
+Runs without Streamlit. Callers receive progress through two callbacks:
+`log(message)` for user-facing lines and `on_progress(done, total)`.
+Used by the queue worker (`sync_worker.py`) and the headless CLI (`sync_cli.py`).
+"""
+import contextvars
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import MISSING_COLUMN, error_code
+from media import SPEC_COLUMNS, clip_specs, download_frames
+import drive_batch
+import engine_router
+import engines
+import llm_costs
+import metrics
+import phash
+import proxy_cache
+import sync_shards
+
+MAX_FAILURES = 5
+# Pause after each vision call to stay under the provider rate limits
+ENGINE_PAUSE_S = {"OpenAI": 1, "Gemini": 2}
+# New clips are renamed and written to the DB in groups of this size
+RENAME_BATCH_SIZE = 25
+FOLDER_MIME = "application/vnd.google-apps.folder"
+# Folders listed by one query (`'a' in parents or 'b' in parents ...`)
+PARENTS_PER_QUERY = 40
+# Columns added by later migrations, written only while they exist (message shown when missing)
+OPTIONAL_COLUMNS = {
+    SPEC_COLUMNS: "ℹ️ Colunas técnicas (duração, resolução) ausentes no banco; gravando sem elas.",
+    ("phash",): "ℹ️ Coluna phash ausente no banco; gravando sem o hash perceptual.",
+}
+
+
+def list_drive_files(service, folder_id, recursive=False):
+    """Lists every video in one folder or a list of folders, following pagination.
+
+    With `recursive`, subfolders are walked level by level, several folders per
+    query. Shared drives are included. Each file gets `source_folder`, the
+    configured folder it was found under (used by `sync_shards`); a file
+    reachable from several folders is listed once.
+    """
+    roots = [folder_id] if isinstance(folder_id, str) else list(dict.fromkeys(folder_id))
+    kinds = f"mimeType contains 'video/' or mimeType = '{FOLDER_MIME}'" if recursive else "mimeType contains 'video/'"
+    drive_files, seen, visited = [], set(), set(roots)
+    level = [(fid, fid) for fid in roots]
+    while level:
+        next_level = []
+        for start in range(0, len(level), PARENTS_PER_QUERY):
+            root_of = dict(level[start:start + PARENTS_PER_QUERY])
+            parents = " or ".join(f"'{fid}' in parents" for fid in root_of)
+            query = f"({parents}) and trashed = false and ({kinds})"
+            page_token = None
+            while True:
+                results = service.files().list(q=query, fields=f"nextPageToken, files({drive_batch.FILE_FIELDS}, parents, mimeType)",
+                                               pageSize=1000, pageToken=page_token,
+                                               supportsAllDrives=True, includeItemsFromAllDrives=True).execute()
+                for f in results.get('files', []):
+                    root = next((root_of[p] for p in f.get('parents') or [] if p in root_of), next(iter(root_of.values())))
+                    if f.get('mimeType') == FOLDER_MIME:
+                        if f['id'] not in visited:
+                            visited.add(f['id'])
+                            next_level.append((f['id'], root))
+                    elif f['id'] not in seen:
+                        seen.add(f['id'])
+                        drive_files.append({**f, "source_folder": root})
+                page_token = results.get('nextPageToken')
+                if not page_token: break
+        level = next_level
+    return drive_files
+
+
+def needs_ai(row):
+    """Upgrade IA (Group 2): missing action/emotion."""
+    return not row.get('acao') or row.get('acao') == 'None' or not row.get('emocao') or row.get('emocao') == 'None'
+
+
+def needs_specs(row, drive_item=None):
+    """Clip specs never captured (only once the clip-specs columns exist) that Drive can now provide.
+
+    Files without `videoMediaMetadata` are skipped until Drive reports it, instead of rewriting empty specs each sync.
+    """
+    return 'duration_s' in row and row['duration_s'] is None and bool((drive_item or {}).get('videoMediaMetadata'))
+
+
+def classify(drive_files, db_files):
+    """Splits work into new clips (1), AI upgrades (2) and thumbnail/spec refreshes (3) in one pass each."""
+    db_ids = {f['file_id'] for f in db_files}
+    drive_info_map = {f['id']: f for f in drive_files}
+    group_1 = [f for f in drive_files if f['id'] not in db_ids]
+    group_2, group_3 = [], []
+    for f in db_files:
+        if needs_ai(f):
+            group_2.append(f)
+        elif not f.get('thumbnail_link') or needs_specs(f, drive_info_map.get(f['file_id'])):
+            # Update Thumbnails Only (Group 3): Has IA but missing thumbnail or specs (read from Drive, no download)
+            group_3.append(f)
+    return group_1, group_2, group_3
+
+
+def last_sequence_number(db_files):
+    """Highest numeric file name (`0042.mp4` -> 42) already in the library."""
+    return max((int(stem) for stem in ((f.get('file_name') or '').split('.')[0] for f in db_files) if stem.isdigit()), default=0)
+
+
+# Rough per-clip costs used by the dry-run estimate
+FRAMES_PER_CLIP = 2
+VISION_COSTS = {
+    # image tokens per frame, prompt/output tokens, call latency and the pauses around each call (s):
+    # the sync's own after it, plus the one OpenAI calls wait before they start
+    "Gemini": {"image_tokens": llm_costs.IMAGE_TOKENS["Gemini"], "prompt_tokens": 220, "output_tokens": 180, "latency_s": 4.0,
+               "pause_s": ENGINE_PAUSE_S["Gemini"]},
+    "OpenAI": {"image_tokens": llm_costs.IMAGE_TOKENS["OpenAI"], "prompt_tokens": 220, "output_tokens": 180, "latency_s": 6.0,
+               "pause_s": ENGINE_PAUSE_S["OpenAI"] + engines.OPENAI_CALL_PAUSE_S},
+}
+DOWNLOAD_BYTES_PER_S = 20 * 1024 * 1024
+FFMPEG_S_PER_FRAME = 0.4
+DB_WRITE_S = 0.15
+
+
+def build_plan(drive_files, db_files, vision_engine="Gemini"):
+    """Diffs Drive against the library and estimates what a sync would cost."""
+    group_1, group_2, group_3 = classify(drive_files, db_files)
+    drive_info_map = {f['id']: f for f in drive_files}
+
+    sizes = [int(f['size']) for f in drive_files if f.get('size')]
+    avg_size = sum(sizes) / len(sizes) if sizes else 0
+    download_bytes = sum(int(f.get('size') or avg_size) for f in group_1)
+    download_bytes += sum(int((drive_info_map.get(f['file_id']) or {}).get('size') or avg_size) for f in group_2)
+
+    costs = VISION_COSTS.get(vision_engine, VISION_COSTS["Gemini"])
+    vision_calls = len(group_1) + len(group_2)
+    input_tokens = vision_calls * (costs['prompt_tokens'] + FRAMES_PER_CLIP * costs['image_tokens'])
+    output_tokens = vision_calls * costs['output_tokens']
+    seconds = (download_bytes / DOWNLOAD_BYTES_PER_S
+               + vision_calls * (FRAMES_PER_CLIP * FFMPEG_S_PER_FRAME + costs['latency_s'] + costs['pause_s'])
+               + (len(group_2) + len(group_3)) * DB_WRITE_S
+               + -(-len(group_1) // RENAME_BATCH_SIZE) * 2 * DB_WRITE_S)
+
+    return {
+        "engine": vision_engine,
+        "group_1": group_1, "group_2": group_2, "group_3": group_3,
+        "drive_info_map": drive_info_map,
+        "last_num": last_sequence_number(db_files),
+        "drive_count": len(drive_files), "db_count": len(db_files),
+        "total": len(group_1) + len(group_2) + len(group_3),
+        "download_bytes": int(download_bytes),
+        "vision_calls": vision_calls,
+        "input_tokens": input_tokens, "output_tokens": output_tokens,
+        "estimated_cost_usd": round(llm_costs.cost(llm_costs.ENGINE_MODELS.get(vision_engine), input_tokens, output_tokens, vision_engine), 4),
+        "estimated_seconds": round(seconds, 1),
+    }
+
+
+def plan_summary(plan):
+    """JSON-friendly view of a plan (counts and estimates only)."""
+    summary = {k: v for k, v in plan.items() if not k.startswith("group_") and k != "drive_info_map"}
+    summary.update({f"{g}_count": len(plan[g]) for g in ("group_1", "group_2", "group_3")})
+    return summary
+
+
+def load_plan(service, supabase, folder_id, vision_engine="Gemini", recursive=False, shard=None, shard_by="file"):
+    """Lists Drive (one folder id or a list) and the DB and builds the plan; spends no vision quota.
+
+    With `shard`, the plan covers only that slice (see `sync_shards.select`).
+    """
+    with metrics.span("drive.list"):
+        drive_files = list_drive_files(service, folder_id, recursive)
+    with metrics.span("supabase.read"):
+        db_files = supabase.table("video_library").select("*").execute().data or []
+    plan = build_plan(*sync_shards.select(drive_files, db_files, shard, shard_by), vision_engine)
+    # Names continue after the whole library, not just this shard
+    plan['last_num'] = last_sequence_number(db_files)
+    return plan
+
+
+def _cleanup(paths):
+    for p in paths:
+        if os.path.exists(p): os.unlink(p)
+
+
+def _clip_frames(service, file_id, proxies, source_md5):
+    """`(frames, probe)`: the probe of the original comes from the same download."""
+    if not proxies:
+        return download_frames(service, file_id)
+    cached = proxy_cache.cached_frames(file_id, source_md5)
+    if cached and cached[0]:
+        metrics.incr("proxy.hits")
+        return cached
+    return proxy_cache.ingest(service, file_id, source_md5)
+
+
+def _analyze_clip(service, file_id, vision_engine, log, frames_error, proxies=False, source_md5=None, pause_scale=1.0):
+    """Vision metadata and ffprobe info for one clip: `(meta, probe)`; raises with the reason shown in the report.
+
+    With `proxies`, frames come from the cached proxy when there is one, and the
+    original is otherwise downloaded once to build it. `pause_scale` multiplies
+    the pause after the vision call and the engine's rate-limit waits.
+    """
+    frame_paths, probe = _clip_frames(service, file_id, proxies, source_md5)
+    if not frame_paths:
+        raise Exception(frames_error)
+    try:
+        # Falls over to the other engine when this one is out of quota or blocks the frames
+        meta, used_engine = engine_router.analyze_vision(frame_paths, engine=vision_engine, log=log, pause_scale=pause_scale)
+        meta = {**meta, "phash": phash.clip_hash(frame_paths)}
+    finally:
+        _cleanup(frame_paths)
+    with metrics.span("rate_limit.pause"):
+        time.sleep(ENGINE_PAUSE_S.get(used_engine, 2) * pause_scale)
+    return meta, probe
+
+
+def _analyze_in_order(files, analyze, concurrency, on_start, stopped=lambda: False):
+    """Yields `(file, analyze(file), error)` in input order with up to `concurrency` clips in flight.
+
+    Each worker keeps its own pause after a vision call, so the request rate
+    scales with `concurrency`. Once `stopped()` is true no new clip starts:
+    clips still queued are cancelled, and the ones already running are yielded
+    so their results (already paid for) can be saved.
+    """
+    if concurrency <= 1:
+        for f in files:
+            if stopped(): return
+            on_start(f)
+            try:
+                yield f, analyze(f), None
+            except Exception as e:
+                yield f, None, e
+        return
+
+    def outcome(f, future):
+        try:
+            return f, future.result(), None
+        except Exception as e:
+            return f, None, e
+
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sync")
+    window = deque()
+    try:
+        for f in files:
+            if stopped(): break
+            on_start(f)
+            # Each clip runs in a copy of this context, so its LLM calls land in the run's tally
+            window.append((f, pool.submit(contextvars.copy_context().run, analyze, f)))
+            if len(window) >= 2 * concurrency:
+                yield outcome(*window.popleft())
+        while window:
+            f, future = window.popleft()
+            if stopped() and future.cancel(): continue
+            yield outcome(f, future)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_sync(service, supabase, folder_id, vision_engine="Gemini", log=print, on_progress=None,
+             concurrency=1, batch_size=RENAME_BATCH_SIZE, limit=None, proxies=False,
+             recursive=False, shard=None, shard_by="file", worker=None, run_ref=None, on_costs=None,
+             max_failures=MAX_FAILURES, pause_scale=1.0):
+    """Runs a full library sync and returns the list of failed items.
+
+    `concurrency` clips are analyzed at once, new clips are renamed and written
+    `batch_size` at a time, and `limit` caps the clips sent to the vision
+    engine (new first, then upgrades) in this run. No new clip starts once
+    `max_failures` clips failed. `proxies` caches a 360p proxy and poster per
+    analyzed clip (see `proxy_cache`). `pause_scale` multiplies the pauses
+    between vision calls and the waits after a 429.
+
+    `folder_id` may be a list, walked into subfolders with `recursive`.
+    `shard=(index, count)` keeps one slice of the work (see `sync_shards`);
+    clips are leased to `worker` before analysis either way.
+
+    Tokens and cost of the run's vision calls are logged at the end, written to
+    `llm_usage` under `run_ref` (see `llm_costs`) and passed to `on_costs(summary)`,
+    also when the run stops on an error.
+    """
+    with llm_costs.track("sync", ref=run_ref or worker) as tally:
+        try:
+            return _run_sync(service, supabase, folder_id, vision_engine, log, on_progress, concurrency,
+                             batch_size, limit, proxies, recursive, shard, shard_by, worker, max_failures, pause_scale)
+        finally:
+            summary = tally.summary()
+            if summary['calls']:
+                log(f"💰 Custo de IA desta sincronização: {llm_costs.format_summary(summary)}")
+                if not llm_costs.persist(supabase, tally):
+                    log("ℹ️ Tabela llm_usage ausente no banco; custos não foram gravados.")
+            if on_costs: on_costs(summary)
+
+
+def _run_sync(service, supabase, folder_id, vision_engine, log, on_progress, concurrency,
+              batch_size, limit, proxies, recursive, shard, shard_by, worker, max_failures, pause_scale):
+    on_progress = on_progress or (lambda done, total: None)
+
+    plan = load_plan(service, supabase, folder_id, vision_engine, recursive, shard, shard_by)
+    group_1, group_2, group_3 = plan['group_1'], plan['group_2'], plan['group_3']
+    if limit is not None:
+        group_1 = group_1[:limit]
+        group_2 = group_2[:max(0, limit - len(group_1))]
+    total = len(group_1) + len(group_2) + len(group_3)
+    log(f"📊 **Resumo da Varredura:** ({vision_engine})")
+    log(f"- Arquivos no Drive: {plan['drive_count']}")
+    log(f"- Arquivos no Banco: {plan['db_count']}")
+    if shard:
+        log(f"- 🧩 Parte {shard[0] + 1} de {shard[1]} (por {'pasta' if shard_by == 'folder' else 'arquivo'})")
+    log(f"- 🆕 Novos para indexar (Grupo 1): {len(group_1)}")
+    log(f"- 🆙 Para upgrade de IA (Grupo 2): {len(group_2)}")
+    log(f"- 🖼️ Para atualizar miniaturas (Grupo 3): {len(group_3)}")
+    if limit is not None and total < plan['total']:
+        log(f"- ✂️ Limitado a {limit} clipes com IA nesta execução ({plan['total'] - total} ficam para a próxima)")
+    on_progress(0, total)
+
+    if total == 0:
+        log(f"Biblioteca já está 100% atualizada com metadados de {vision_engine}.")
+        return []
+
+    # Map drive info for easy access (used for thumbnails)
+    drive_info_map = plan['drive_info_map']
+    # Sequential naming help
+    last_num = plan['last_num']
+
+    log(f"🚀 Iniciando processamento de {total} itens via {vision_engine}...")
+    idx = 0
+    failed_items = []
+    dropped = set()
+
+    def write(op, data):
+        """Runs `op(data)`; columns of a migration not deployed yet are dropped (for the rest of the run too)."""
+        while True:
+            strip = lambda row: {k: v for k, v in row.items() if k not in dropped}
+            rows = [strip(r) for r in data] if isinstance(data, list) else strip(data)
+            if not rows: return None
+            try:
+                return op(rows)
+            except Exception as e:
+                if error_code(e) != MISSING_COLUMN: raise
+                # PGRST204 names the unknown column: "Could not find the 'phash' column of ..."
+                missing = next((cols for cols in OPTIONAL_COLUMNS if any(f"'{c}'" in str(e) for c in cols)), None)
+                if missing is None or dropped.issuperset(missing): raise
+                dropped.update(missing)
+                log(OPTIONAL_COLUMNS[missing])
+
+    # Process Group 1 (New): analyzed clips wait in `pending` and are then renamed
+    # on Drive with one batch request and upserted together
+    pending = []
+
+    def flush_new():
+        nonlocal last_num
+        if not pending: return
+        # Numbers come from a shared sequence so concurrent workers never pick the same name
+        numbers = sync_shards.reserve_numbers(supabase, len(pending), last_num)
+        last_num = max(last_num, numbers[-1])
+        new_names = {f['id']: f"{num:04d}.mp4" for (f, _), num in zip(pending, numbers)}
+        renamed, rename_errors = drive_batch.rename_files(service, new_names)
+        rows = []
+        for f, (meta, probe) in pending:
+            if f['id'] not in renamed:
+                failed_items.append({"file": f['name'], "error": f"Renomear: {rename_errors.get(f['id'], 'sem resposta')}"})
+                log(f"⚠️ Falha ao renomear {f['name']}: {rename_errors.get(f['id'])}")
+                continue
+            log(f"🆕 Indexado: {f['name']} -> {new_names[f['id']]}")
+            rows.append({
+                "file_id": f['id'], "file_name": new_names[f['id']], "drive_link": f['webViewLink'],
+                "acao": meta.get('acao'), "emocao": meta.get('emocao'), "descricao": meta.get('descricao'),
+                "tags": [meta.get('acao'), meta.get('emocao')],
+                "thumbnail_link": f.get('thumbnailLink'),
+                "phash": meta.get('phash'),
+                **clip_specs(f, probe)
+            })
+        if rows:
+            try:
+                with metrics.span("supabase.write"):
+                    write(lambda data: supabase.table("video_library").upsert(data).execute(), rows)
+            except Exception as e:
+                failed_items.extend({"file": r['file_name'], "error": f"Banco: {e}"} for r in rows)
+                log(f"⚠️ Falha ao gravar {len(rows)} clipes no banco: {e}")
+        pending.clear()
+
+    started = 0
+
+    def announce(f):
+        nonlocal started
+        started += 1
+        if 'file_id' in f:
+            log(f"🆙 Fazendo Upgrade [{started}/{total}]: {f['file_name']} ({vision_engine})")
+        else:
+            log(f"🆕 Analisando [{started}/{total}]: {f['name']}")
+
+    def analyze_new(f):
+        return _analyze_clip(service, f['id'], vision_engine, log, "FFmpeg: Não foi possível extrair os quadros.",
+                             proxies, f.get('md5Checksum'), pause_scale)
+
+    def analyze_upgrade(f):
+        return _analyze_clip(service, f['file_id'], vision_engine, log, "FFmpeg: Falha ao ler vídeo",
+                             proxies, (drive_info_map.get(f['file_id']) or {}).get('md5Checksum'), pause_scale)
+
+    # Clips leased by another worker are skipped (they count as done for the progress bar). Held
+    # leases are renewed as clips finish; on a crash they simply expire after `sync_shards.LEASE_TTL_S`
+    leases = sync_shards.Leases(supabase, worker)
+    skipped = []
+
+    def skip(f):
+        nonlocal idx
+        idx += 1
+        skipped.append(f)
+        on_progress(idx, total)
+
+    # Past the failure limit no new clip starts; clips already analyzing finish and are saved
+    limit_hit = lambda: len(failed_items) >= max_failures
+    try:
+        new_clips = _analyze_in_order(leases.filter(group_1, lambda f: f['id'], skip), analyze_new, concurrency, announce, limit_hit)
+        for f, result, error in new_clips:
+            idx += 1
+            if error is None:
+                pending.append((f, result))
+            else:
+                failed_items.append({"file": f['name'], "error": str(error)})
+                log(f"⚠️ Falha em {f['name']}: {error}")
+                if len(failed_items) == max_failures:
+                    log(f"🚨 Limite de {max_failures} falhas atingido. O processo foi interrompido para economizar seus tokens e permitir revisão.")
+
+            if len(pending) >= batch_size: flush_new()
+            on_progress(idx, total)
+            leases.renew()
+        flush_new()
+
+        # Process Group 2 (Upgrade)
+        upgrades = _analyze_in_order(leases.filter(group_2 if not limit_hit() else [], lambda f: f['file_id'], skip),
+                                     analyze_upgrade, concurrency, announce, limit_hit)
+        for f, result, error in upgrades:
+            idx += 1
+            try:
+                if error is not None:
+                    raise error
+                meta, probe = result
+                # Fetch latest drive info to get thumbnailLink if missing
+                drive_item = drive_info_map.get(f['file_id'])
+                thumb = drive_item.get('thumbnailLink') if drive_item else None
+
+                data = {
+                    "acao": meta.get('acao'), "emocao": meta.get('emocao'), "descricao": meta.get('descricao'),
+                    "tags": list(set((f.get('tags') or []) + [meta.get('acao'), meta.get('emocao')])),
+                    "thumbnail_link": thumb or f.get('thumbnail_link'),
+                    "phash": meta.get('phash'),
+                    **clip_specs(drive_item, probe)
+                }
+                with metrics.span("supabase.write"):
+                    write(lambda data: supabase.table("video_library").update(data).eq("file_id", f['file_id']).execute(), data)
+            except Exception as e:
+                failed_items.append({"file": f['file_name'], "error": str(e)})
+                log(f"⚠️ Falha em {f['file_name']}: {e}")
+            on_progress(idx, total)
+            leases.renew()
+
+        # Process Group 3 (Thumbnails + specs from Drive metadata): clips no longer in the
+        # listing are fetched by id in one batch instead of re-listing the folder
+        missing = [f['file_id'] for f in group_3 if not (drive_info_map.get(f['file_id']) or {}).get('thumbnailLink')]
+        fetch_errors = {}
+        if missing:
+            fetched, fetch_errors = drive_batch.get_files_metadata(service, missing)
+            drive_info_map.update(fetched)
+
+        for f in group_3:
+            idx += 1
+            try:
+                log(f"🖼️ Atualizando Miniatura [{idx}/{total}]: {f['file_name']}")
+                drive_item = drive_info_map.get(f['file_id'])
+                if f['file_id'] in fetch_errors:
+                    raise Exception(fetch_errors[f['file_id']])
+                data = {}
+                if drive_item and drive_item.get('thumbnailLink'):
+                    data["thumbnail_link"] = drive_item['thumbnailLink']
+                elif not f.get('thumbnail_link'):
+                    log(f"⚠️ Drive não forneceu miniatura para {f['file_name']}")
+                if needs_specs(f, drive_item):
+                    data.update(clip_specs(drive_item))
+                if data:
+                    with metrics.span("supabase.write"):
+                        write(lambda data: supabase.table("video_library").update(data).eq("file_id", f['file_id']).execute(), data)
+            except Exception as e:
+                failed_items.append({"file": f['file_name'], "error": str(e)})
+                log(f"⚠️ Falha ao atualizar miniatura: {e}")
+            on_progress(idx, total)
+    finally:
+        # Also on errors, so other workers don't wait for the leases to expire
+        leases.release_all()
+    if skipped:
+        log(f"⏭️ {len(skipped)} clipes já estavam com outro worker e foram pulados.")
+    return failed_items
+
+
+def backfill_hashes(service, supabase, log=print, on_progress=None, concurrency=1, limit=None):
+    """Computes perceptual hashes for clips indexed before they existed; returns the failed items.
+
+    No vision calls: frames come from the cached proxy when there is one,
+    else from a download of the clip.
+    """
+    on_progress = on_progress or (lambda done, total: None)
+    with metrics.span("supabase.read"):
+        rows = supabase.table("video_library").select("*").execute().data or []
+    if rows and 'phash' not in rows[0]:
+        log("ℹ️ Coluna phash ausente no banco; aplique a migração antes do backfill.")
+        return []
+    # Missing or unusable (e.g. stored from a single frame) hashes are recomputed
+    todo = [r for r in rows if phash.parse(r['phash']) is None][:limit]
+    log(f"🧬 Calculando hash perceptual de {len(todo)} clipes...")
+
+    def frames_hash(r):
+        frame_paths, _ = proxy_cache.cached_frames(r['file_id']) or ([], {})
+        if not frame_paths:
+            # No proxy, or one ffmpeg can't read: frames come from the original
+            frame_paths, _ = download_frames(service, r['file_id'])
+        try:
+            h = phash.clip_hash(frame_paths)
+        finally:
+            _cleanup(frame_paths)
+        if not h:
+            raise Exception("FFmpeg: Falha ao ler vídeo")
+        return h
+
+    failed_items = []
+    for done, (r, h, error) in enumerate(_analyze_in_order(todo, frames_hash, concurrency, lambda r: None), 1):
+        try:
+            if error is not None:
+                raise error
+            with metrics.span("supabase.write"):
+                supabase.table("video_library").update({"phash": h}).eq("file_id", r['file_id']).execute()
+        except Exception as e:
+            failed_items.append({"file": r['file_name'], "error": str(e)})
+            log(f"⚠️ Falha em {r['file_name']}: {e}")
+        on_progress(done, len(todo))
+    return failed_items
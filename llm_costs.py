@@ -0,0 +1,173 @@
+"""Token, latency and cost accounting for every Gemini / OpenAI call.
+
+    with llm_costs.track("sync", ref=job_id) as tally:
+        run_sync(...)                    # every call inside adds to `tally`
+    tally.summary()                      # {"calls": ..., "prompt_tokens": ..., "cost_usd": ...}
+    llm_costs.persist(supabase, tally)   # one `llm_usage` row per stage/engine/model/prompt
+
+`engines` reports each response with `record()`. The active tally is a context
+variable, so threads only report into it when started with a copy of the
+caller's context (`contextvars.copy_context().run`, as `library_sync` does).
+Totals also go to `metrics` counters (`llm.<stage>.prompt_tokens`, ...), which
+the load test and the Prometheus export see without a tally.
+
+Prices are USD per million tokens (input, output), matched by model name
+prefix; LLM_PRICES overrides them as JSON: {"gemini-2.0-flash": [0.1, 0.4]}.
+"""
+import contextvars
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+
+import metrics
+from clients import not_deployed
+from settings import get_setting
+
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+# Unknown models are priced like the engine's default one
+ENGINE_MODELS = {"Gemini": "gemini-1.5-flash", "OpenAI": "gpt-4o"}
+# Tokens one image costs (Gemini: flat per image; GPT-4o: 512px tiles in high detail)
+IMAGE_TOKENS = {"Gemini": 258, "OpenAI": 765}
+
+SUM_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "image_tokens", "latency_s", "cost_usd")
+
+_current = contextvars.ContextVar("llm_costs_tally", default=None)
+
+
+def _prices():
+    custom = get_setting("LLM_PRICES")
+    if isinstance(custom, str): custom = json.loads(custom)
+    return {**PRICES, **{k: tuple(v) for k, v in (custom or {}).items()}}
+
+
+def price(model, engine=None):
+    """(input, output) USD per million tokens; the longest matching prefix wins."""
+    prices = _prices()
+    name = (model or "").split("/")[-1]
+    match = max((p for p in prices if name.startswith(p)), key=len, default=None)
+    return prices[match or ENGINE_MODELS.get(engine, "gpt-4o")]
+
+
+def cost(model, prompt_tokens, completion_tokens, engine=None):
+    input_price, output_price = price(model, engine)
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def prompt_version(template):
+    """Short hash of a prompt template, to tell which prompt change moved the cost."""
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:8]
+
+
+class Tally:
+    """Totals for one sync run or storyboard, per (stage, engine, model, prompt) (thread-safe)."""
+
+    def __init__(self, kind, ref=None):
+        self.kind, self.ref = kind, ref
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, call):
+        with self._lock:
+            group = self._groups.setdefault(key, dict.fromkeys(SUM_FIELDS, 0))
+            for field in SUM_FIELDS:
+                group[field] += call[field]
+
+    def rows(self):
+        """One dict per group, shaped like the `llm_usage` table."""
+        with self._lock:
+            return [{"run_kind": self.kind, "run_ref": None if self.ref is None else str(self.ref),
+                     "stage": stage, "engine": engine, "model": model, "prompt_version": version,
+                     **{k: round(v, 6) if k in ("latency_s", "cost_usd") else v for k, v in group.items()}}
+                    for (stage, engine, model, version), group in self._groups.items()]
+
+    def summary(self):
+        """Totals plus `by_stage`, JSON-friendly (stored in the job summary)."""
+        rows = self.rows()
+        total = {k: sum(r[k] for r in rows) for k in SUM_FIELDS}
+        by_stage = {}
+        for r in rows:
+            stage = by_stage.setdefault(r['stage'], dict.fromkeys(SUM_FIELDS, 0))
+            for k in SUM_FIELDS:
+                stage[k] += r[k]
+        return {**{k: round(v, 6) if k in ("latency_s", "cost_usd") else v for k, v in total.items()},
+                "by_stage": by_stage}
+
+
+def merge(*summaries):
+    """Sum of `Tally.summary()` dicts (a storyboard plus its block regenerations)."""
+    total = {k: 0 for k in SUM_FIELDS}
+    by_stage = {}
+    for summary in filter(None, summaries):
+        for k in SUM_FIELDS:
+            total[k] += summary.get(k, 0)
+        for name, fields in summary.get('by_stage', {}).items():
+            stage = by_stage.setdefault(name, dict.fromkeys(SUM_FIELDS, 0))
+            for k in SUM_FIELDS:
+                stage[k] += fields.get(k, 0)
+    return {**{k: round(v, 6) if k in ("latency_s", "cost_usd") else v for k, v in total.items()}, "by_stage": by_stage}
+
+
+@contextmanager
+def track(kind, ref=None):
+    """Makes a new Tally the active one for the block (nested tallies hide the outer one)."""
+    tally = Tally(kind, ref)
+    token = _current.set(tally)
+    try:
+        yield tally
+    finally:
+        _current.reset(token)
+
+
+def record(stage, engine, model, prompt_tokens, completion_tokens, latency_s, images=0, prompt=None):
+    """Accounts one response. `prompt` is the template (hashed into `prompt_version`)."""
+    prompt_tokens, completion_tokens = int(prompt_tokens or 0), int(completion_tokens or 0)
+    model = (model or ENGINE_MODELS.get(engine, "")).split("/")[-1]
+    call = {"calls": 1, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "image_tokens": images * IMAGE_TOKENS.get(engine, 0), "latency_s": latency_s,
+            "cost_usd": cost(model, prompt_tokens, completion_tokens, engine)}
+    for field in ("prompt_tokens", "completion_tokens", "image_tokens"):
+        metrics.incr(f"llm.{stage}.{field}", call[field])
+    metrics.incr(f"llm.{stage}.cost_micro_usd", round(call['cost_usd'] * 1_000_000))
+    if (tally := _current.get()) is not None:
+        tally.add((stage, engine, model, prompt and prompt_version(prompt)), call)
+    return call
+
+
+def usage_counts(response):
+    """(prompt, completion) tokens from an OpenAI or Gemini response/stream, (0, 0) without usage."""
+    if (u := getattr(response, "usage", None)) is not None:
+        return u.prompt_tokens or 0, u.completion_tokens or 0
+    if (u := getattr(response, "usage_metadata", None)) is not None:
+        return u.prompt_token_count or 0, u.candidates_token_count or 0
+    return 0, 0
+
+
+def persist(supabase, tally):
+    """Writes the tally's rows to `llm_usage`; skipped (False) when the table isn't deployed."""
+    rows = tally.rows()
+    if not rows:
+        return True
+    try:
+        with metrics.span("supabase.llm_usage"):
+            supabase.table("llm_usage").insert(rows).execute()
+    except Exception as e:
+        if not not_deployed(e): raise
+        return False
+    return True
+
+
+def format_summary(summary):
+    """One line for logs and captions: calls, tokens, seconds and cost."""
+    tokens = summary['prompt_tokens'] + summary['completion_tokens']
+    calls = summary['calls']
+    return (f"{calls} chamada{'s' if calls != 1 else ''} de IA · {tokens:,} tokens "
+            f"({summary['image_tokens']:,} de imagem) · {summary['latency_s']:.0f}s · US$ {summary['cost_usd']:.4f}")
@@ -0,0 +1,253 @@
+"""Clip scoring for storyboard matching and the search tab.
+
+Pure functions over Supabase `video_library` rows, shared by the app and the
+benchmarks in `benchmarks/`.
+"""
+import json
+import re
+
+import catalog
+import phash
+
+
+def is_indexed(v):
+    return bool(v.get('acao') and v.get('acao') != 'None' and v.get('emocao') and v.get('emocao') != 'None')
+
+
+def recent_clip_ids(videos, window=10):
+    """Ids of the `window` most recently used clips, excluded from matching."""
+    return set([v['file_id'] for v in sorted(videos, key=lambda x: x.get('last_used_at') or '', reverse=True)[:window]])
+
+
+# Score lost per unit of usage penalty (see `usage.load_candidates`)
+PENALTY_WEIGHT = 2
+# Score lost by a near-duplicate (`phash.NEAR_DUP_BITS`) of a clip already in the storyboard
+NEAR_DUP_PENALTY = 6
+# Candidates kept per block for "next best clip"
+RANK_DEPTH = 20
+# Narration pace used to estimate a block's length when the next timestamp is not known yet
+WORDS_PER_S = 2.5
+
+
+def parse_timestamp(ts):
+    """`"MM:SS"`, `"HH:MM:SS"` or `"MM:SS.s"` -> seconds (None if unparseable)."""
+    try:
+        seconds = 0.0
+        for part in str(ts).strip().split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+def block_seconds(block, next_block=None):
+    """How long a block stays on screen: the gap to `next_block`, else estimated from its words."""
+    start = parse_timestamp(block.get('timestamp'))
+    end = parse_timestamp(next_block.get('timestamp')) if next_block else None
+    if start is not None and end is not None and end > start:
+        return end - start
+    return len(str(block.get('script_fragment', '')).split()) / WORDS_PER_S
+
+
+def fits_specs(v, orientation=None, min_duration=None):
+    """Technical pre-filter; clips whose specs were never captured always pass."""
+    if orientation and v.get('orientation') and v['orientation'] != orientation:
+        return False
+    if min_duration and v.get('duration_s') is not None and v['duration_s'] < min_duration:
+        return False
+    return True
+
+
+def filter_specs(videos, orientation=None, min_duration=None):
+    if not orientation and not min_duration:
+        return videos
+    return [v for v in videos if fits_specs(v, orientation, min_duration)]
+
+
+def _base_scores(block, clips, candidates, penalties=None):
+    """Yields `(index, score)` for each candidate: literal elements > description > emotion, minus usage."""
+    target_emocao = block.get('emocao_alvo', '').lower()
+    sugestao_visual = block.get('sugestao_visual_literal', block.get('visual_theme', '')).lower()
+    elementos_chave = [elem.lower() for elem in block.get('elementos_chave', [])]
+
+    for i in candidates:
+        score = 0
+        v_acao, v_desc, v_tags = clips.acao[i], clips.descricao[i], clips.tags[i]
+
+        # 1. Keyword match from 'elementos_chave'
+        for elem in elementos_chave:
+            if elem in v_acao or elem in v_desc: score += 5
+            if v_tags is not None and elem in v_tags: score += 3
+
+        # 2. Text match in description/action
+        if sugestao_visual in v_acao or sugestao_visual in v_desc: score += 10
+
+        # 3. Emotion match
+        if target_emocao in clips.emocao[i]: score += 1
+
+        if penalties: score -= PENALTY_WEIGHT * penalties.get(clips.file_ids[i], 0)
+        yield i, score
+
+
+def _candidates(clips, excluded, min_duration=None):
+    candidates = [i for i, fid in enumerate(clips.file_ids) if fid not in excluded]
+    if min_duration:
+        candidates = [i for i in candidates if fits_specs(clips.rows[i], min_duration=min_duration)] or candidates
+    return candidates
+
+
+def plan_row(block, clip):
+    """Storyboard table row for `clip` shown over `block`."""
+    return {
+        "Tempo": block['timestamp'], "Texto": block['script_fragment'],
+        "Sugestão Visual": block.get('sugestao_visual_literal', block.get('visual_theme', '')), "ARQUIVO": f"🎬 {clip['file_name']}",
+        "file_id": clip['file_id'], "file_name": clip['file_name'], "meta": f"{clip.get('acao','')} | {clip.get('emocao','')}"
+    }
+
+
+def match_block(block, all_videos, excluded, penalties=None, min_duration=None, session_used=()):
+    """Best clip for one storyboard block, skipping `excluded` ids; returns the plan row (or None).
+
+    `all_videos` is a `catalog.Catalog` or plain rows (normalized here on every
+    call, so callers matching many blocks build the catalog once).
+    `penalties` (file_id -> decayed usage) lowers the score of recently or
+    often used clips instead of excluding them. Clips known to be shorter than
+    `min_duration` seconds are skipped unless no other clip is left.
+    Near-duplicates of the clips in `session_used` (ids already in this
+    storyboard) lose `NEAR_DUP_PENALTY`.
+    """
+    clips = catalog.of(all_videos)
+    candidates = _candidates(clips, excluded, min_duration)
+    used_hashes = [h for fid in session_used if (h := clips.phash_by_id.get(fid)) is not None]
+    best = None
+    best_score = float("-inf")
+
+    for i, score in _base_scores(block, clips, candidates, penalties):
+        # Only a new best can be displaced by the penalty, so the hash check stays off the hot path
+        if score > best_score and used_hashes and (h := clips.phash_by_id.get(clips.file_ids[i])) is not None \
+                and phash.near_any(h, used_hashes):
+            score -= NEAR_DUP_PENALTY
+
+        if score > best_score:
+            best_score = score
+            best = i
+
+    if best is None:
+        best = candidates[0] if candidates else (0 if len(clips) else None)
+    if best is None:
+        return None
+    return plan_row(block, clips.rows[best])
+
+
+def rank_block(block, all_videos, excluded, penalties=None, min_duration=None, session_used=(), depth=RANK_DEPTH):
+    """The `depth` best clips for a block, best first, scored like `match_block`: `[(score, row)]`.
+
+    Cached by the app so "next best clip" doesn't rescore the library.
+    """
+    clips = catalog.of(all_videos)
+    used_hashes = [h for fid in session_used if (h := clips.phash_by_id.get(fid)) is not None]
+    base = sorted(_base_scores(block, clips, _candidates(clips, excluded, min_duration), penalties), key=lambda pair: -pair[1])
+    ranked, clean = [], 0
+    for i, score in base:
+        if used_hashes and (h := clips.phash_by_id.get(clips.file_ids[i])) is not None and phash.near_any(h, used_hashes):
+            score -= NEAR_DUP_PENALTY
+        else:
+            clean += 1
+        ranked.append((score, i))
+        # Past the `depth`-th unpenalized clip nothing can score higher: base scores only go down from here
+        if clean >= depth: break
+    # Stable: equal scores keep library order, as in `match_block`
+    ranked.sort(key=lambda pair: -pair[0])
+    return [(score, clips.rows[i]) for score, i in ranked[:depth]]
+
+
+def next_best(ranked, plan, index, recent_ids=()):
+    """The ranked clip after plan row `index`'s current one that no other row uses and isn't recent.
+
+    Wraps around to the top of the list; None when every ranked clip is taken.
+    """
+    current = plan[index]['file_id']
+    taken = {row['file_id'] for j, row in enumerate(plan) if j != index} | set(recent_ids)
+    ids = [row['file_id'] for _, row in ranked]
+    start = ids.index(current) + 1 if current in ids else 0
+    for _, row in ranked[start:] + ranked[:start]:
+        if row['file_id'] != current and row['file_id'] not in taken:
+            return row
+    return None
+
+
+def match_storyboard(storyboard, all_videos, recent_ids, penalties=None):
+    """Picks one clip per block without reusing clips (or near-duplicates of them), long enough for the block; returns the plan rows."""
+    final_plan = []
+    excluded = set(recent_ids)
+    session_used = []
+    clips = catalog.of(all_videos)
+    for i, block in enumerate(storyboard):
+        next_block = storyboard[i + 1] if i + 1 < len(storyboard) else None
+        row = match_block(block, clips, excluded, penalties, block_seconds(block, next_block), session_used)
+        if row:
+            final_plan.append(row)
+            excluded.add(row['file_id'])
+            session_used.append(row['file_id'])
+    return final_plan
+
+
+def whatsapp_script(project_title, plan):
+    """Plain-text montage list sent to editors ("Baixar roteiro para WhatsApp")."""
+    text = f"ROTEIRO TÉCNICO: {project_title}\n" + "="*30 + "\n"
+    for item in plan:
+        text += f"[{item.get('Tempo', '00:00')}] -> {item.get('file_name', 'N/A')} ({item.get('meta', '')})\n"
+    return text
+
+
+def keyword_search(all_vids, query):
+    """"Rápido (Palavras-chave)" scorer over a `catalog.Catalog` or plain rows; returns `(row, score)` pairs sorted by score."""
+    clips = catalog.of(all_vids)
+    results = []
+    q = query.lower()
+    words = q.split()
+    for i in range(len(clips)):
+        score = 0
+        v_acao, v_desc, v_tags = clips.acao[i], clips.descricao[i], clips.tags[i]
+
+        # Matching
+        if q in v_acao: score += 10
+        if q in v_desc: score += 5
+        if q in clips.emocao[i]: score += 5
+        if v_tags is not None and q in v_tags: score += 7
+
+        # Partial match for multi-word queries
+        if len(words) > 1:
+            for word in words:
+                if word in v_acao: score += 2
+                if word in v_desc: score += 1
+
+        if score > 0:
+            results.append((clips.rows[i], score))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results
+
+
+def parse_keywords(text, fallback):
+    """Extracts the JSON keyword list from an LLM reply."""
+    json_match = re.search(r'\[.*\]', text, re.DOTALL)
+    return json.loads(json_match.group()) if json_match else [fallback]
+
+
+def semantic_search(all_vids, keywords):
+    """"Profundo (IA Semântica)" scorer over LLM-extracted keywords."""
+    results = []
+    for v in all_vids:
+        score = 0
+        v_text = f"{v.get('acao')} {v.get('descricao')} {v.get('emocao')} {' '.join(v.get('tags') or [])}".lower()
+        for kw in keywords:
+            if kw.lower() in v_text: score += 5
+        if score > 0:
+            results.append((v, score))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results
+
+
+def fallback_search(all_vids, query):
+    q = query.lower()
+    return [(v, 1) for v in all_vids if q in str(v).lower()]
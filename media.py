@@ -0,0 +1,206 @@
+"""Drive downloads and ffmpeg/ffprobe helpers."""
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+
+import backends
+import metrics
+from drive_http import DOWNLOAD_CHUNK_BYTES
+from settings import data_path
+
+logger = logging.getLogger(__name__)
+
+# Speech-grade narration for upload: mono, 16 kHz, low-bitrate Opus
+NARRATION_ARGS = ['-vn', '-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', '24k', '-application', 'voip']
+NARRATION_EXT = ".ogg"
+
+
+def download_to(service, file_id, fileobj):
+    """Streams a Drive file into `fileobj`; returns the byte count."""
+    from googleapiclient.http import MediaIoBaseDownload
+    with metrics.span("drive.download"):
+        request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
+        downloader = MediaIoBaseDownload(fileobj, request, chunksize=DOWNLOAD_CHUNK_BYTES)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+        metrics.add_bytes("drive.download", fileobj.tell())
+    return fileobj.tell()
+
+
+def frames_from_video(video_path, timestamps=['00:00:01', '00:00:04'], out_prefix=None):
+    """Writes one JPEG per timestamp (`<out_prefix>_frame_<i>.jpg`) and returns their paths."""
+    out_prefix = out_prefix or video_path
+    extracted_paths = []
+    with metrics.span("ffmpeg.frames"):
+        for i, ts in enumerate(timestamps):
+            output_path = f"{out_prefix}_frame_{i}.jpg"
+            cmd = ['ffmpeg', '-y', '-ss', ts, '-i', video_path, '-vframes', '1', output_path]
+            res = subprocess.run(cmd, capture_output=True)
+            if res.returncode == 0:
+                extracted_paths.append(output_path)
+    return extracted_paths
+
+
+def download_frames(service, file_id, timestamps=['00:00:01', '00:00:04']):
+    """Frames at the given timestamps plus the original's `probe_video` info: `(paths, info)`."""
+    if (fake := backends.get("frames")) is not None:
+        return fake(service, file_id, timestamps), {}
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_video:
+            download_to(service, file_id, tmp_video)
+            tmp_video_path = tmp_video.name
+
+        extracted_paths = frames_from_video(tmp_video_path, timestamps)
+        info = probe_video(tmp_video_path)
+        os.unlink(tmp_video_path)
+        return extracted_paths, info
+    except Exception as e:
+        logger.warning("Erro ao extrair quadros de %s: %s", file_id, e)
+        return [], {}
+
+
+def extract_frames(service, file_id, timestamps=['00:00:01', '00:00:04']):
+    """Extracts multiple frames at given timestamps and returns a list of paths."""
+    return download_frames(service, file_id, timestamps)[0]
+
+
+def encode_image(image_path):
+    with open(image_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+
+def get_audio_duration(file_path):
+    """Get duration of audio file in seconds using ffprobe."""
+    try:
+        cmd = [
+            'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1', file_path
+        ]
+        with metrics.span("ffmpeg.probe"):
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0:
+            return float(result.stdout.strip())
+    except Exception as e:
+        logger.warning("Erro ao detectar duração do áudio: %s", e)
+    return None
+
+
+def _frame_rate(rate):
+    """`"30000/1001"` -> 29.97 (None for `"0/0"` or garbage)."""
+    try:
+        num, _, den = str(rate).partition("/")
+        fps = float(num) / float(den or 1)
+        return round(fps, 3) if fps > 0 else None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def probe_video(file_path):
+    """`{"width", "height", "duration", "fps", "size"}` of the first video stream via ffprobe ({} on failure).
+
+    Width and height are as displayed: a phone clip stored landscape with a
+    90° rotation reports portrait dimensions.
+    """
+    try:
+        cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'stream=width,height,r_frame_rate:stream_tags=rotate:stream_side_data=rotation:format=duration,size',
+               '-of', 'json', file_path]
+        with metrics.span("ffmpeg.probe"):
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0:
+            info = json.loads(result.stdout)
+            stream = (info.get('streams') or [{}])[0]
+            fmt = info.get('format') or {}
+            width, height = stream.get('width'), stream.get('height')
+            rotation = (stream.get('tags') or {}).get('rotate') or next(
+                (sd['rotation'] for sd in stream.get('side_data_list') or [] if 'rotation' in sd), 0)
+            if abs(int(float(rotation))) % 180 == 90: width, height = height, width
+            return {"width": width, "height": height,
+                    "duration": float(fmt['duration']) if fmt.get('duration') else None,
+                    "fps": _frame_rate(stream.get('r_frame_rate')),
+                    "size": int(fmt['size']) if fmt.get('size') else None}
+    except Exception as e:
+        logger.warning("Erro ao ler metadados do vídeo: %s", e)
+    return {}
+
+
+# Technical columns written by sync (supabase/migrations/*_clip_specs.sql)
+SPEC_COLUMNS = ("duration_s", "width", "height", "orientation", "fps", "size_bytes")
+
+
+def orientation(width, height):
+    if not width or not height:
+        return None
+    return "vertical" if height > width else "horizontal" if width > height else "quadrado"
+
+
+def clip_specs(drive_item=None, probe=None):
+    """`video_library` technical columns from ffprobe info, falling back to Drive's `videoMediaMetadata`."""
+    drive_item = drive_item or {}
+    probe = probe or {}
+    video_meta = drive_item.get('videoMediaMetadata') or {}
+    width = probe.get('width') or video_meta.get('width')
+    height = probe.get('height') or video_meta.get('height')
+    duration = probe.get('duration')
+    if duration is None and video_meta.get('durationMillis'):
+        duration = int(video_meta['durationMillis']) / 1000
+    size = probe.get('size') or drive_item.get('size')
+    return {"duration_s": round(duration, 3) if duration is not None else None, "width": width, "height": height,
+            "orientation": orientation(width, height), "fps": probe.get('fps'),
+            "size_bytes": int(size) if size else None}
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ffmpeg_duration(stderr):
+    """Input duration from ffmpeg's own log (`Duration: 00:03:12.48`)."""
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", stderr)
+    if not match:
+        return None
+    h, m, s = match.groups()
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def prepare_narration(audio_path):
+    """Compressed copy of a narration for upload plus its duration: `(path, seconds)`.
+
+    One ffmpeg pass transcodes and reports the duration. Results are cached by
+    content hash, so regenerating a storyboard for the same audio is free. Falls
+    back to the original file (and ffprobe) if ffmpeg fails.
+    """
+    try:
+        with metrics.span("audio.hash"):
+            key = _file_hash(audio_path)
+        out_path = data_path("narration", key + NARRATION_EXT)
+        meta_path = data_path("narration", key + ".json")
+        if os.path.exists(out_path) and os.path.exists(meta_path):
+            metrics.incr("audio.cache_hits")
+            with open(meta_path) as f:
+                return out_path, json.load(f).get('duration')
+
+        tmp_path = out_path + ".part" + NARRATION_EXT
+        with metrics.span("ffmpeg.narration"):
+            res = subprocess.run(['ffmpeg', '-y', '-i', audio_path, *NARRATION_ARGS, tmp_path], capture_output=True, text=True)
+        if res.returncode != 0:
+            raise Exception(res.stderr.strip().splitlines()[-1] if res.stderr.strip() else res.returncode)
+        os.replace(tmp_path, out_path)
+        duration = _ffmpeg_duration(res.stderr)
+        with open(meta_path, "w") as f:
+            json.dump({"duration": duration, "source_bytes": os.path.getsize(audio_path)}, f)
+        metrics.add_bytes("ffmpeg.narration", os.path.getsize(out_path))
+        return out_path, duration
+    except Exception as e:
+        logger.warning("Erro ao comprimir narração, enviando o original: %s", e)
+        return audio_path, get_audio_duration(audio_path)
@@ -0,0 +1,134 @@
+"""Lightweight timing spans and counters for the hot paths.
+
+    with metrics.span("ffmpeg.frames"):
+        ...
+    metrics.add_bytes("drive.download", n)
+    metrics.incr("vision.gemini.retries")
+
+Samples live in process memory (bounded per stage). `snapshot()` gives
+p50/p95/max per stage; `to_jsonl` / `to_prometheus` export it.
+"""
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+MAX_SAMPLES = 2000
+
+_lock = threading.Lock()
+_durations = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_counts = defaultdict(int)
+_totals = defaultdict(float)
+_bytes = defaultdict(int)
+_counters = defaultdict(int)
+_started_at = time.time()
+
+
+def reset():
+    global _started_at
+    with _lock:
+        for d in (_durations, _counts, _totals, _bytes, _counters):
+            d.clear()
+        _started_at = time.time()
+
+
+def observe(stage, seconds):
+    with _lock:
+        _durations[stage].append(seconds)
+        _counts[stage] += 1
+        _totals[stage] += seconds
+
+
+@contextmanager
+def span(stage):
+    """Times the block; failed blocks are also counted under `<stage>.errors`.
+
+    Only `Exception`s count: a closed generator or a Streamlit rerun is not an error.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        incr(f"{stage}.errors")
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def add_bytes(stage, n):
+    with _lock:
+        _bytes[stage] += int(n or 0)
+
+
+def incr(counter, n=1):
+    with _lock:
+        _counters[counter] += n
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def snapshot():
+    """Per-stage summary plus counters, JSON-serializable."""
+    with _lock:
+        stages = {}
+        for stage in set(_counts) | set(_bytes):
+            values = sorted(_durations.get(stage, ()))
+            stages[stage] = {
+                "count": _counts.get(stage, 0),
+                "total_s": round(_totals.get(stage, 0.0), 4),
+                "p50_s": round(_percentile(values, 0.50), 4),
+                "p95_s": round(_percentile(values, 0.95), 4),
+                "max_s": round(values[-1], 4) if values else 0.0,
+                "bytes": _bytes.get(stage, 0),
+            }
+        return {"started_at": _started_at, "taken_at": time.time(), "stages": stages, "counters": dict(_counters)}
+
+
+def to_jsonl(snap, **labels):
+    """One JSON object per stage and one per counter."""
+    lines = []
+    for stage, values in sorted(snap["stages"].items()):
+        lines.append(json.dumps({"ts": snap["taken_at"], "kind": "stage", "stage": stage, **labels, **values}))
+    for name, value in sorted(snap["counters"].items()):
+        lines.append(json.dumps({"ts": snap["taken_at"], "kind": "counter", "name": name, **labels, "value": value}))
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def _prom_escape(value):
+    """Label value escaping of the Prometheus text format (backslash, quote, newline)."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prom_labels(labels):
+    return ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels.items())
+
+
+def to_prometheus(labeled_snapshots):
+    """Prometheus text format for `[(labels, snapshot), ...]` (summaries with 0.5/0.95 quantiles)."""
+    stage_rows = [(_prom_labels({"stage": s, **labels}), v) for labels, snap in labeled_snapshots for s, v in sorted(snap["stages"].items())]
+    counter_rows = [(_prom_labels({"name": n, **labels}), v) for labels, snap in labeled_snapshots for n, v in sorted(snap["counters"].items())]
+    out = ["# HELP soul_stage_seconds Duration of instrumented stages.", "# TYPE soul_stage_seconds summary"]
+    for base, v in stage_rows:
+        out.append(f'soul_stage_seconds{{{base},quantile="0.5"}} {v["p50_s"]}')
+        out.append(f'soul_stage_seconds{{{base},quantile="0.95"}} {v["p95_s"]}')
+        out.append(f'soul_stage_seconds_sum{{{base}}} {v["total_s"]}')
+        out.append(f'soul_stage_seconds_count{{{base}}} {v["count"]}')
+    out += ["# HELP soul_stage_max_seconds Slowest sample per stage.", "# TYPE soul_stage_max_seconds gauge"]
+    out += [f'soul_stage_max_seconds{{{base}}} {v["max_s"]}' for base, v in stage_rows]
+    out += ["# HELP soul_stage_bytes_total Bytes transferred per stage.", "# TYPE soul_stage_bytes_total counter"]
+    out += [f'soul_stage_bytes_total{{{base}}} {v["bytes"]}' for base, v in stage_rows if v["bytes"]]
+    out += ["# HELP soul_events_total Retries, rate-limit waits and errors.", "# TYPE soul_events_total counter"]
+    out += [f'soul_events_total{{{base}}} {v}' for base, v in counter_rows]
+    return "\n".join(out) + "\n"
+
+
+def export_jsonl(path, **labels):
+    """Appends the current snapshot to a JSON lines file."""
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write(to_jsonl(snapshot(), **labels))
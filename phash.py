@@ -0,0 +1,128 @@
+"""Perceptual hashes of clip frames, for "more like this" and near-duplicate suppression.
+
+Each frame the sync extracts gets a 64-bit difference hash (dHash: 9x8
+grayscale, one bit per horizontal gradient), which survives re-encoding,
+resizing and small crops. A clip's hash is its frames' hashes concatenated
+(128 bits for the two sync frames), stored as hex in `video_library.phash`.
+Two clips from the same shoot differ in a few bits; unrelated ones in about half.
+
+    NEAR_DUP_BITS   clips this close are treated as the same shot (matcher penalty, grid collapse)
+    SIMILAR_BITS    radius of the "more like this" lookup
+"""
+HASH_SIZE = 8
+# Frames per clip hash (the two sync frames); hashes of any other length are not comparable
+FRAMES = 2
+HEX_LENGTH = FRAMES * HASH_SIZE * HASH_SIZE // 4
+NEAR_DUP_BITS = 20
+SIMILAR_BITS = 40
+
+
+def frame_hash(path):
+    import numpy as np
+    from PIL import Image
+    with Image.open(path) as img:
+        px = np.asarray(img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)).ravel().tolist()
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = px[row * (HASH_SIZE + 1) + col]
+            bits = (bits << 1) | (left > px[row * (HASH_SIZE + 1) + col + 1])
+    return bits
+
+
+def clip_hash(frame_paths):
+    """Hex hash of a clip's `FRAMES` frames (in order); None when there are fewer or one can't be read."""
+    if len(frame_paths) != FRAMES:
+        return None
+    try:
+        return "".join(f"{frame_hash(p):016x}" for p in frame_paths)
+    except Exception:
+        return None
+
+
+def parse(value):
+    """`video_library.phash` -> int (None when missing, malformed or not `FRAMES` frames long)."""
+    if not isinstance(value, str) or len(value) != HEX_LENGTH:
+        return None
+    try:
+        return int(value, 16)
+    except ValueError:
+        return None
+
+
+def distance(a, b):
+    return (a ^ b).bit_count()
+
+
+def near_any(h, hashes, bits=NEAR_DUP_BITS):
+    return any((h ^ other).bit_count() <= bits for other in hashes)
+
+
+def collapse(results, hash_of, limit, bits=NEAR_DUP_BITS):
+    """First `limit` results with near-duplicates of a better-ranked one dropped: `(kept, hidden)`.
+
+    Stops scanning once `limit` results are kept; `hidden` counts the dropped ones scanned.
+    """
+    kept, kept_hashes, hidden = [], [], 0
+    for item in results:
+        h = hash_of(item)
+        if h is not None and near_any(h, kept_hashes, bits):
+            hidden += 1
+            continue
+        kept.append(item)
+        if h is not None: kept_hashes.append(h)
+        if len(kept) >= limit:
+            break
+    return kept, hidden
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance: radius lookups visit only the
+    subtrees whose edge distance is within `radius` of the query's distance to the node."""
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, h, item):
+        self._size += 1
+        if self._root is None:
+            self._root = (h, [item], {})
+            return
+        node = self._root
+        while True:
+            d = distance(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (h, [item], {})
+                return
+            node = child
+
+    def search(self, h, radius):
+        """`(distance, item)` pairs within `radius` bits, closest first."""
+        found, stack = [], [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            d = distance(h, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+def index(rows):
+    """BK-tree of `file_id`s keyed by the rows' hashes (rows without one are left out)."""
+    tree = BKTree()
+    for r in rows:
+        if (h := parse(r.get('phash'))) is not None:
+            tree.add(h, r['file_id'])
+    return tree
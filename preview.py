@@ -0,0 +1,117 @@
+"""Low-resolution rough-cut preview of a storyboard plan.
+
+Each block's clip is trimmed (looped when shorter) to the gap until the next
+block's timestamp and scaled to one small size. The segments are then joined
+with the ffmpeg concat demuxer by stream copy, and the narration is muxed on top.
+Clips with a cached proxy (`proxy_cache`) are read locally; proxies are encoded
+with the segments' filter chain and size, so a long enough one is trimmed by
+stream copy too. Narration before the first block is covered by a black segment.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import proxy_cache
+from matching import parse_timestamp
+from media import download_to, get_audio_duration
+
+PREVIEW_SIZE = proxy_cache.PROXY_SIZE
+# The last block has no next timestamp; it runs to the end of the narration or this long
+LAST_BLOCK_S = 5.0
+MIN_BLOCK_S = 0.5
+WORKERS = 4
+
+
+def _log(log, msg):
+    if log: log(msg)
+
+
+def lead_in(plan):
+    """Seconds of narration before the first block starts (shown as black, like the timeline export)."""
+    first = next((s for s in (parse_timestamp(item.get('Tempo')) for item in plan) if s is not None), None)
+    return first if first and first > 0 else 0.0
+
+
+def block_durations(plan, total_s=None):
+    """Seconds each plan row stays on screen, from consecutive `Tempo` values."""
+    starts = [parse_timestamp(item.get('Tempo')) for item in plan]
+    durations = []
+    for i, start in enumerate(starts):
+        nxt = next((s for s in starts[i + 1:] if s is not None), None)
+        if start is None:
+            duration = LAST_BLOCK_S
+        elif nxt is not None:
+            duration = nxt - start
+        else:
+            duration = total_s - start if total_s else LAST_BLOCK_S
+        durations.append(max(MIN_BLOCK_S, duration))
+    return durations
+
+
+def _run_ffmpeg(cmd, stage):
+    with metrics.span(stage):
+        res = subprocess.run(cmd, capture_output=True, text=True)
+    if res.returncode != 0:
+        raise Exception(f"FFmpeg: {res.stderr.strip().splitlines()[-1] if res.stderr.strip() else res.returncode}")
+
+
+def _segment(service, file_id, duration, out_path, workdir, size):
+    width, height = size
+    proxy = proxy_cache.lookup(file_id)
+    if proxy and proxy.get('format') == proxy_cache.PROXY_FORMAT and size == proxy_cache.PROXY_SIZE \
+            and (proxy.get('duration') or 0) >= duration:
+        # Proxies start on a keyframe and share the segment encoding, so a head trim needs no re-encode
+        _run_ffmpeg(['ffmpeg', '-y', '-i', proxy['path'], '-t', f"{duration:.3f}", '-an', '-c:v', 'copy', out_path],
+                    "preview.segment_copy")
+        return out_path
+
+    if proxy:
+        src = proxy['path']
+    else:
+        fd, src = tempfile.mkstemp(suffix=".mp4", dir=workdir)
+        with os.fdopen(fd, "wb") as f:
+            download_to(service, file_id, f)
+    vf = proxy_cache.scale_pad(width, height)
+    # Identical codec parameters for every segment so the concat step can stream copy
+    _run_ffmpeg(['ffmpeg', '-y', '-stream_loop', '-1', '-i', src, '-t', f"{duration:.3f}", '-an', '-vf', vf,
+                 *proxy_cache.X264_ARGS, out_path], "preview.segment")
+    if not proxy: os.unlink(src)
+    return out_path
+
+
+def _black(duration, out_path, size):
+    width, height = size
+    _run_ffmpeg(['ffmpeg', '-y', '-f', 'lavfi', '-i', f"color=c=black:s={width}x{height}:r={proxy_cache.PROXY_FPS}",
+                 '-t', f"{duration:.3f}", '-vf', 'setsar=1', *proxy_cache.X264_ARGS, out_path], "preview.segment")
+    return out_path
+
+
+def render_preview(service, plan, audio_path, out_path, size=PREVIEW_SIZE, log=None):
+    """Renders `plan` (rows from `match_storyboard`) over the narration into `out_path`."""
+    total_s = get_audio_duration(audio_path) if audio_path else None
+    durations = block_durations(plan, total_s)
+    workdir = tempfile.mkdtemp(prefix="soul_preview_")
+    try:
+        _log(log, f"🎞️ Preparando {len(plan)} trechos em {size[0]}x{size[1]}...")
+        jobs = [(item['file_id'], d, os.path.join(workdir, f"seg_{i:04d}.mp4")) for i, (item, d) in enumerate(zip(plan, durations))]
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            segments = list(pool.map(lambda job: _segment(service, *job, workdir, size), jobs))
+        # Clips start at the first block's timestamp, not at 0, or the whole cut plays early
+        if (lead := lead_in(plan)) >= 1 / proxy_cache.PROXY_FPS:
+            segments.insert(0, _black(lead, os.path.join(workdir, "seg_lead.mp4"), size))
+
+        list_path = os.path.join(workdir, "concat.txt")
+        with open(list_path, "w") as f:
+            f.writelines(f"file '{path}'\n" for path in segments)
+        _log(log, "🔗 Juntando trechos e narração...")
+        cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_path:
+            cmd += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'aac', '-b:a', '96k', '-shortest']
+        cmd += ['-c:v', 'copy', '-movflags', '+faststart', out_path]
+        _run_ffmpeg(cmd, "preview.concat")
+        return out_path
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
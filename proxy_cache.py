@@ -0,0 +1,108 @@
+"""Local cache of low-resolution proxies and poster frames, keyed by Drive file id.
+
+    <PROXY_DIR>/<file_id>.mp4    640x360 H.264 (letterboxed), keyframe every second, no audio
+    <PROXY_DIR>/<file_id>.jpg    poster frame
+    <PROXY_DIR>/<file_id>.json   source md5, proxy format/width/height/duration, original's probe
+
+Sync builds them when proxies are enabled, from the original it already
+downloads for frame extraction. Later re-analysis (Group 2) and previews read
+the proxy instead of pulling the original from Drive again. A proxy whose
+recorded md5 differs from the Drive file's `md5Checksum` is treated as missing.
+"""
+import json
+import logging
+import os
+import subprocess
+import tempfile
+
+import metrics
+from media import download_to, frames_from_video, probe_video
+from settings import get_setting, DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+PROXY_DIR = get_setting("SOUL_PROXY_DIR") or os.path.join(DATA_DIR, "proxies")
+PROXY_HEIGHT = 360
+PROXY_SIZE = (640, PROXY_HEIGHT)
+# Bumped when the proxy encoding changes; previews re-encode older proxies instead of copying them
+PROXY_FORMAT = 2
+PROXY_FPS = 30
+POSTER_AT = "00:00:01"
+# Shared with preview segments so proxies and segments can be joined by stream copy
+X264_ARGS = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '30', '-pix_fmt', 'yuv420p',
+             '-r', str(PROXY_FPS), '-g', str(PROXY_FPS), '-keyint_min', str(PROXY_FPS), '-sc_threshold', '0']
+
+
+def scale_pad(width, height):
+    """Fits any clip into `width`x`height` (letterboxed, square pixels); shared with preview segments."""
+    return f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+
+
+def _paths(file_id):
+    base = os.path.join(PROXY_DIR, file_id)
+    return base + ".mp4", base + ".jpg", base + ".json"
+
+
+def lookup(file_id, source_md5=None):
+    """Cached `{"path", "poster", "width", "height", "duration", "md5", "source"}`, or None."""
+    video, poster, meta = _paths(file_id)
+    if not (os.path.exists(video) and os.path.exists(meta)):
+        return None
+    with open(meta) as f:
+        info = json.load(f)
+    if source_md5 and info.get('md5') and info['md5'] != source_md5:
+        return None
+    return {**info, "path": video, "poster": poster if os.path.exists(poster) else None}
+
+
+def build(video_path, file_id, source_md5=None, source=None):
+    """Transcodes a local original into the cache; returns the `lookup` entry.
+
+    `source` is the original's `probe_video` info, kept so clip specs can be
+    re-read without downloading the original again.
+    """
+    os.makedirs(PROXY_DIR, exist_ok=True)
+    video, poster, meta = _paths(file_id)
+    tmp_video = video + ".part.mp4"
+    cmd = ['ffmpeg', '-y', '-i', video_path, '-an', '-vf', scale_pad(*PROXY_SIZE), *X264_ARGS,
+           '-movflags', '+faststart', tmp_video]
+    with metrics.span("ffmpeg.proxy"):
+        res = subprocess.run(cmd, capture_output=True, text=True)
+    if res.returncode != 0:
+        if os.path.exists(tmp_video): os.unlink(tmp_video)
+        raise Exception(f"FFmpeg (proxy): {res.stderr.strip().splitlines()[-1] if res.stderr.strip() else res.returncode}")
+    # Rename last so a half-written proxy is never served
+    os.replace(tmp_video, video)
+    metrics.add_bytes("ffmpeg.proxy", os.path.getsize(video))
+    with metrics.span("ffmpeg.frames"):
+        subprocess.run(['ffmpeg', '-y', '-ss', POSTER_AT, '-i', video, '-vframes', '1', poster], capture_output=True)
+    info = {"md5": source_md5, "format": PROXY_FORMAT, **probe_video(video), "source": source or {}}
+    with open(meta, "w") as f:
+        json.dump(info, f)
+    return lookup(file_id)
+
+
+def ingest(service, file_id, source_md5=None):
+    """Downloads the original once: returns `(frames, probe)` and caches proxy + poster."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_video:
+        download_to(service, file_id, tmp_video)
+        original = tmp_video.name
+    try:
+        frames = frames_from_video(original)
+        probe = probe_video(original)
+        try:
+            build(original, file_id, source_md5, probe)
+        except Exception as e:
+            logger.warning("Erro ao gerar proxy de %s: %s", file_id, e)
+        return frames, probe
+    finally:
+        os.unlink(original)
+
+
+def cached_frames(file_id, source_md5=None):
+    """`(frames, probe)` from the cached proxy (frames are temp files), or None without a proxy."""
+    info = lookup(file_id, source_md5)
+    if not info:
+        return None
+    frames = frames_from_video(info['path'], out_prefix=os.path.join(tempfile.gettempdir(), f"proxy_{file_id}_{os.getpid()}"))
+    return frames, info.get('source') or {}
@@ -0,0 +1,169 @@
+"""Process-wide cache for the search tab, shared by every Streamlit session.
+
+- `library_snapshot` keeps one copy of `video_library` per library version
+  (plus its `catalog.Catalog` for the scorers) instead of re-reading the table
+  on every keystroke.
+- `cached` is an LRU of normalized query -> ranked ids (and query -> LLM
+  keywords). Concurrent identical requests are coalesced: the first caller
+  computes, the others wait for its result.
+- `fts_ranked` pushes the keyword search down to Postgres (the
+  `search_video_library` RPC in supabase/migrations) and only fetches the
+  top-k rows; it returns None while the RPC is not deployed.
+
+The library version is a cheap probe of committed rows (row count + newest
+`updated_at`), re-checked at most every `VERSION_TTL_S` seconds or after
+`invalidate()`; a sync in progress only changes it when it writes clips.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import catalog
+import metrics
+from clients import MISSING_FUNCTION, error_code
+
+MAX_ENTRIES = 512
+VERSION_TTL_S = 30
+FTS_RPC = "search_video_library"
+# Postgres "undefined column": the updated_at migration isn't deployed yet
+UNDEFINED_COLUMN = "42703"
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_inflight = {}
+_generation = 0
+_version = {"value": None, "checked_at": 0.0, "updated_at": True}
+_snapshot = (None, [], {}, catalog.Catalog([]))
+_fts = {"available": None}
+
+
+def normalize_query(query):
+    return " ".join((query or "").lower().split())
+
+
+def invalidate():
+    """Forces a new version probe (call after writing to the library)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _version["checked_at"] = 0.0
+        _fts["available"] = None
+
+
+def library_version(supabase):
+    now = time.time()
+    if _version["value"] is not None and now - _version["checked_at"] < VERSION_TTL_S:
+        return _version["value"]
+    latest = None
+    with metrics.span("supabase.read"):
+        if _version["updated_at"]:
+            try:
+                res = supabase.table("video_library").select("updated_at", count="exact") \
+                    .order("updated_at", desc=True).limit(1).execute()
+                latest = res.data[0].get('updated_at') if res.data else None
+            except Exception as e:
+                if error_code(e) != UNDEFINED_COLUMN: raise
+                _version["updated_at"] = False
+        if not _version["updated_at"]:
+            # Older schema: only inserts and deletes (and `invalidate()`) are seen
+            res = supabase.table("video_library").select("file_id", count="exact").limit(1).execute()
+    value = (res.count, latest, _generation)
+    _version.update(value=value, checked_at=now)
+    return value
+
+
+def cached(key, compute):
+    """Returns the cached value for `key`, computing it once even under concurrency."""
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            metrics.incr("search_cache.hits")
+            return _entries[key]
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        metrics.incr("search_cache.coalesced")
+        return future.result()
+
+    metrics.incr("search_cache.misses")
+    try:
+        value = compute()
+    except BaseException as e:
+        with _lock:
+            _inflight.pop(key, None)
+        future.set_exception(e)
+        raise
+    with _lock:
+        _entries[key] = value
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+        _inflight.pop(key, None)
+    future.set_result(value)
+    return value
+
+
+def library_snapshot(supabase):
+    """Current `(version, rows, by_id, catalog)`; the table is read and normalized once per version."""
+    version = library_version(supabase)
+
+    def load():
+        with metrics.span("supabase.read"):
+            rows = supabase.table("video_library").select("*").execute().data or []
+        with metrics.span("search.catalog"):
+            clips = catalog.Catalog(rows)
+        return version, rows, {r['file_id']: r for r in rows}, clips
+
+    global _snapshot
+    if _snapshot[0] != version:
+        # Swapped as one tuple so concurrent sessions never see a half-updated snapshot
+        _snapshot = cached(("library", version), load)
+        with _lock:
+            for key in [k for k in _entries if k[0] == "library" and k[1] != version]:
+                del _entries[key]
+    return _snapshot
+
+
+def ranked(version, by_id, mode, query, score, filters=None):
+    """Cached `(row, score)` results; `score()` returns the scorer's `(row, score)` list.
+
+    `filters` are the spec filters `score()` already applied (part of the key).
+    """
+    key = ("ranked", version, mode, normalize_query(query), tuple(sorted((filters or {}).items())))
+    ids = cached(key, lambda: [(v['file_id'], s) for v, s in score()])
+    return [(by_id[fid], s) for fid, s in ids if fid in by_id]
+
+
+def fts_ranked(supabase, version, query, limit=24, filters=None):
+    """Top `limit` `(row, score)` ranked by Postgres and the total match count, or None.
+
+    `filters` (`orientation`, `min_duration`) are applied by the RPC before
+    ranking. None means the RPC is missing or failed; the caller falls back to
+    the in-process scorer. A missing RPC is remembered until `invalidate()`.
+    """
+    filters = filters or {}
+    if _fts["available"] is False:
+        return None
+
+    def compute():
+        with metrics.span("search.fts"):
+            hits = supabase.rpc(FTS_RPC, {"query": query, "match_count": limit, **filters}).execute().data or []
+        if not hits:
+            return [], 0
+        with metrics.span("supabase.read"):
+            rows = supabase.table("video_library").select("*").in_("file_id", [h['file_id'] for h in hits]).execute().data or []
+        by_id = {r['file_id']: r for r in rows}
+        return [(by_id[h['file_id']], h['score']) for h in hits if h['file_id'] in by_id], hits[0]['total_count']
+
+    try:
+        result = cached(("fts", version, limit, normalize_query(query), tuple(sorted(filters.items()))), compute)
+    except Exception as e:
+        # PGRST202: function (or its filtered signature) not in the schema cache
+        if error_code(e) == MISSING_FUNCTION:
+            _fts["available"] = False
+        metrics.incr("search.fts.fallback")
+        return None
+    _fts["available"] = True
+    return result
@@ -0,0 +1,75 @@
+"""Runtime settings shared by the Streamlit app and the background workers.
+
+Values come from environment variables first, then from the Streamlit app's
+`st.secrets` (handed over with `use_secrets`, which covers Streamlit Cloud),
+then from the secrets.toml files `st.secrets` reads: `~/.streamlit/secrets.toml`
+overridden by `./.streamlit/secrets.toml`. The files are checked on every
+lookup, so a long-running worker picks up edited secrets without a restart.
+"""
+import os
+import tomllib
+
+SECRETS_PATH = os.environ.get("SOUL_SECRETS_PATH")
+# Project file last so it overrides the user-wide one, as in Streamlit
+SECRETS_PATHS = [SECRETS_PATH] if SECRETS_PATH else [os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+                                                     os.path.join(".streamlit", "secrets.toml")]
+DEFAULT_FOLDER_ID = "15xna7XFA7W3liDawGjbHqpF7o4_nmo1e"
+DATA_DIR = os.environ.get("SOUL_DATA_DIR", ".soul_data")
+
+_app_secrets = {}
+# path -> (mtime_ns, parsed values); re-parsed whenever the file changes
+_files = {}
+
+
+def use_secrets(secrets):
+    """Makes the app's `st.secrets` the first source after the environment."""
+    global _app_secrets
+    _app_secrets = secrets
+
+
+def _read_secrets(path):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    cached = _files.get(path)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(path, "rb") as fh:
+                cached = (mtime, tomllib.load(fh))
+        except (OSError, tomllib.TOMLDecodeError):
+            cached = (mtime, {})
+        _files[path] = cached
+    return cached[1]
+
+
+def get_setting(name, default=None):
+    """Returns a setting from the environment, `st.secrets` or secrets.toml, else `default`."""
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        if name in _app_secrets:
+            return _app_secrets[name]
+    except FileNotFoundError:
+        # st.secrets raises when no secrets file exists at all
+        pass
+    for path in reversed(SECRETS_PATHS):
+        values = _read_secrets(path)
+        if name in values:
+            return values[name]
+    return default
+
+
+def data_path(*parts):
+    """Path inside the local data directory (queue, caches), created on demand."""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return path
+
+
+def source_folders():
+    """Drive folders to sync: `FOLDER_IDS` (list or comma-separated), else `FOLDER_ID`."""
+    value = get_setting("FOLDER_IDS")
+    if isinstance(value, str):
+        value = [part.strip() for part in value.split(",")]
+    return [fid for fid in value or [] if fid] or [get_setting("FOLDER_ID", DEFAULT_FOLDER_ID)]
@@ -0,0 +1,189 @@
+"""Batch storyboards for a folder of narrations, without the UI.
+
+    python storyboard_batch.py entradas/ --out saidas/ --engine Gemini --concurrency 3
+
+Each job is a subfolder with `script.txt` + `audio.mp3|wav`, or a top-level
+pair `<nome>.txt` + `<nome>.mp3|wav`. Storyboards are generated concurrently
+(at most `--concurrency` in flight, one provider call started every
+`--min-interval` seconds). A 429 moves the job to the other engine
+(`engine_router`); when both are out of quota the job is reported as failed.
+Matching runs one job at a time in input order against a shared set of used
+clips, so no clip appears twice across the batch. Each plan is written as
+`roteiro_<nome>.txt` in the WhatsApp export format, plus `batch.json`;
+`--timeline fcpxml|edl|otio` also writes an edit timeline per job (`timeline.py`)
+with the narration on the audio track.
+
+Progress goes to stdout as JSON lines, like `sync_cli.py`.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import catalog
+import engine_router
+import llm_costs
+import matching
+import metrics
+import timeline
+import usage
+from jsonl_events import emit
+from media import get_audio_duration
+
+AUDIO_EXTENSIONS = (".mp3", ".wav")
+
+
+def find_jobs(folder):
+    """`[{name, script_path, audio_path}]` sorted by name."""
+    jobs = []
+    for entry in sorted(os.listdir(folder)):
+        path = os.path.join(folder, entry)
+        if os.path.isdir(path):
+            audio = next((os.path.join(path, f"audio{ext}") for ext in AUDIO_EXTENSIONS
+                          if os.path.exists(os.path.join(path, f"audio{ext}"))), None)
+            if audio and os.path.exists(os.path.join(path, "script.txt")):
+                jobs.append({"name": entry, "script_path": os.path.join(path, "script.txt"), "audio_path": audio})
+        elif entry.endswith(".txt"):
+            stem = entry[:-4]
+            audio = next((os.path.join(folder, stem + ext) for ext in AUDIO_EXTENSIONS
+                          if os.path.exists(os.path.join(folder, stem + ext))), None)
+            if audio:
+                jobs.append({"name": stem, "script_path": path, "audio_path": audio})
+    return jobs
+
+
+def _pacer(min_interval_s):
+    """Blocks so provider calls start at least `min_interval_s` apart across threads."""
+    lock = threading.Lock()
+    last = [0.0]
+
+    def wait():
+        with lock:
+            delay = last[0] + min_interval_s - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            last[0] = time.monotonic()
+    return wait
+
+
+def _generate(job, engine, pace, log):
+    with open(job['script_path'], encoding="utf-8") as f:
+        script_text = f.read()
+    pace()
+    # Quota errors fail over inside the router; no extra retries on top of it
+    return engine_router.get_semantic_storyboard(job['audio_path'], script_text, engine=engine, log=log)
+
+
+def run_batch(jobs, supabase, engine="Gemini", concurrency=2, min_interval_s=1.0, on_event=emit, orientation=None):
+    """Generates and matches every job; returns `[{name, plan, error}]` in input order."""
+    # The caller's job dicts are left untouched
+    jobs = [dict(job) for job in jobs]
+    all_videos, excluded, penalties = usage.load_candidates(supabase)
+    # Normalized once for every block of every job
+    all_videos = catalog.Catalog(matching.filter_specs(all_videos, orientation=orientation))
+    if not all_videos:
+        raise Exception("NENHUM VÍDEO INDEXADO ENCONTRADO. Por favor, sincronize a biblioteca primeiro.")
+    pace = _pacer(min_interval_s)
+
+    def one(job):
+        log = lambda msg: on_event("log", job=job['name'], message=msg)
+        # One tally per storyboard, written to `llm_usage` under the job name
+        with metrics.span("storyboard.batch_job"), llm_costs.track("storyboard", ref=job['name']) as tally:
+            try:
+                return _generate(job, engine, pace, log)
+            finally:
+                job['llm'] = tally.summary()
+                # A failed write must not replace the storyboard (or the real error)
+                try:
+                    llm_costs.persist(supabase, tally)
+                except Exception as e:
+                    log(f"⚠️ Custos de IA não foram gravados: {e}")
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="storyboard") as pool:
+        futures = [pool.submit(one, job) for job in jobs]
+        for i, (job, future) in enumerate(zip(jobs, futures)):
+            try:
+                storyboard = future.result()
+                if not storyboard:
+                    raise Exception("IA recusou ou enviou resposta vazia")
+                with metrics.span("matcher"):
+                    plan = matching.match_storyboard(storyboard, all_videos, excluded, penalties)
+                # Clips used by earlier jobs of this batch are excluded like the recently used ones
+                excluded.update(row['file_id'] for row in plan)
+                results.append({"name": job['name'], "plan": plan, "error": None, "llm": job.get('llm'),
+                                "audio": job['audio_path']})
+            except Exception as e:
+                results.append({"name": job['name'], "plan": [], "error": str(e), "llm": job.get('llm'),
+                                "audio": job['audio_path']})
+                on_event("log", job=job['name'], message=f"⚠️ Falha em {job['name']}: {e}")
+            on_event("progress", done=i + 1, total=len(jobs), job=job['name'])
+    return results
+
+
+def write_outputs(results, out_dir, timeline_format=None, media_root=timeline.MEDIA_ROOT):
+    os.makedirs(out_dir, exist_ok=True)
+    for r in results:
+        if r['plan']:
+            with open(os.path.join(out_dir, f"roteiro_{r['name'].replace(' ', '_')}.txt"), "w", encoding="utf-8") as f:
+                f.write(matching.whatsapp_script(r['name'], r['plan']))
+            if timeline_format:
+                tl = timeline.build(r['plan'], r['name'], audio_name=os.path.basename(r['audio']),
+                                    total_s=get_audio_duration(r['audio']), media_root=media_root)
+                name, text, _ = timeline.export(tl, timeline_format)
+                with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+                    f.write(text)
+    with open(os.path.join(out_dir, "batch.json"), "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def register_usage(supabase, results):
+    """Same as "Confirmar Montagem": one ledger entry per matched clip, tagged with the job name."""
+    for r in results:
+        usage.record_usage(supabase, [row['file_id'] for row in r['plan']], project=r['name'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera storyboards em lote para uma pasta de roteiros e áudios.")
+    parser.add_argument("folder", help="pasta com subpastas (script.txt + audio.mp3|wav) ou pares nome.txt + nome.mp3|wav")
+    parser.add_argument("--out", default=None, help="pasta de saída (padrão: <pasta>/saida)")
+    parser.add_argument("--engine", choices=["Gemini", "OpenAI"], default="Gemini")
+    parser.add_argument("--concurrency", type=int, default=2, help="storyboards gerados ao mesmo tempo")
+    parser.add_argument("--min-interval", type=float, default=1.0, help="segundos mínimos entre chamadas ao provedor")
+    parser.add_argument("--orientation", choices=["horizontal", "vertical"], default=None, help="só clipes neste formato")
+    parser.add_argument("--timeline", choices=[ext for ext, _, _ in timeline.FORMATS.values()], default=None,
+                        help="também grava a linha do tempo de edição neste formato")
+    parser.add_argument("--media-root", default=timeline.MEDIA_ROOT, help="pasta dos clipes no computador de edição")
+    parser.add_argument("--register", action="store_true", help="registra o uso dos clipes (como 'Confirmar Montagem')")
+    args = parser.parse_args(argv)
+
+    from clients import get_supabase_client
+
+    jobs = find_jobs(args.folder)
+    if not jobs:
+        emit("summary", state="failed", error=f"Nenhum par roteiro + áudio encontrado em {args.folder}")
+        return 2
+    emit("log", message=f"🎬 {len(jobs)} roteiros encontrados. Gerando com {args.engine}...")
+    supabase = get_supabase_client()
+    try:
+        results = run_batch(jobs, supabase, engine=args.engine, concurrency=args.concurrency,
+                            min_interval_s=args.min_interval, orientation=args.orientation)
+    except Exception as e:
+        emit("summary", state="failed", error=str(e))
+        return 2
+    out_dir = args.out or os.path.join(args.folder, "saida")
+    write_outputs(results, out_dir, timeline_format=args.timeline, media_root=args.media_root)
+    if args.register:
+        register_usage(supabase, [r for r in results if not r['error']])
+    failed = [{"file": r['name'], "error": r['error']} for r in results if r['error']]
+    cost_usd = round(sum((r['llm'] or {}).get('cost_usd', 0) for r in results), 6)
+    emit("summary", state="done", out=out_dir, ok=len(results) - len(failed), failed=failed, cost_usd=cost_usd,
+         metrics=metrics.snapshot())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,10 @@
 import sys
+import time
 import traceback
 import streamlit as st
 
+_script_start = time.perf_counter()
+
 # 1. Page Config MUST be first
 st.set_page_config(page_title="Soul Anchored - Cérebro Editorial", page_icon="🧠", layout="wide")
 
@@ -9,19 +12,31 @@ try:
     import os
     import re
     import io
-    import time
     import json
     import tempfile
-    import subprocess
-    import pandas as pd
-    from datetime import datetime
-    from google.oauth2.credentials import Credentials
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaIoBaseDownload
-    from google.auth.transport.requests import Request
-    from supabase import create_client, Client
-    import google.generativeai as genai
-    from PIL import Image
+
+    # Settings read at import time below already see the app's secrets
+    import settings
+    settings.use_secrets(st.secrets)
+
+    # Heavy SDKs (pandas, googleapiclient, supabase, genai, PIL) are imported on first use;
+    # `python -m benchmarks.startup` checks the import budget
+    import catalog
+    import clients
+    import drive_http
+    import engine_router
+    import engines
+    import llm_costs
+    import matching
+    import media
+    import metrics
+    import phash
+    import preview
+    import search_cache
+    import sync_queue
+    import timeline
+    import usage
+    from settings import source_folders
 
     # --- UI Styling ---
     st.markdown("""
@@ -103,422 +118,163 @@ try:
     SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
     GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
     OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY")
-    FOLDER_ID = st.secrets.get("FOLDER_ID", "15xna7XFA7W3liDawGjbHqpF7o4_nmo1e")
+    # FOLDER_IDS (several folders / shared drives) or the single FOLDER_ID
+    FOLDER_IDS = source_folders()
 
-    # Setup Gemini
-    if GOOGLE_API_KEY:
-        try:
-            genai.configure(api_key=GOOGLE_API_KEY)
-            available_models = [m.name for m in genai.list_models() if "generateContent" in m.supported_generation_methods]
-            preferred = ["models/gemini-1.5-flash", "models/gemini-2.0-flash", "models/gemini-1.5-pro"]
-            selected_model = next((p for p in preferred if p in available_models), available_models[0] if available_models else None)
-            if selected_model:
-                gemini_model = genai.GenerativeModel(selected_model)
-                st.sidebar.success(f"IA Gemini Ativa: {selected_model}")
-            else:
-                gemini_model = None
-        except Exception as e:
-            st.sidebar.error(f"Erro Gemini: {e}")
-            gemini_model = None
-    else:
-        gemini_model = None
-
-    # Setup OpenAI
-    if OPENAI_API_KEY:
-        from openai import OpenAI
-        import base64
-        client_openai = OpenAI(api_key=OPENAI_API_KEY)
+    # Setup Gemini / OpenAI (models are resolved on first use, not on every cold start)
+    if GOOGLE_API_KEY and clients.gemini_configured():
+        st.sidebar.success("IA Gemini Ativa")
+    if clients.openai_configured():
         st.sidebar.success("IA OpenAI Ativa: gpt-4o")
-    else:
-        client_openai = None
 
-    # Remove cache to ensure fresh secrets are used after user updates them
-    def get_supabase_client():
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
+    get_supabase_client = clients.get_supabase_client
 
     # --- Utility Diagnostics ---
     def show_db_diagnostics():
         try:
-            temp_supabase = get_supabase_client()
-            # Changed 'id' to 'file_id' to match schema
-            count_res = temp_supabase.table("video_library").select("file_id", count="exact").limit(1).execute()
+            # Shares the search tab's cached count probe
+            count = search_cache.library_version(supabase)[0]
             st.sidebar.info(f"💾 BD Conectado: {SUPABASE_URL[:15]}...")
-            st.sidebar.info(f"📊 Arquivos no Banco: {count_res.count if count_res.count is not None else 0}")
+            st.sidebar.info(f"📊 Arquivos no Banco: {count if count is not None else 0}")
         except Exception as e:
             st.sidebar.error(f"❌ Erro de Conexão BD: {e}")
 
-    # Call diagnostics
-    show_db_diagnostics()
+    def show_perf_diagnostics():
+        """Per-stage timings of this app process and of the last sync job."""
+        import pandas as pd
+        with st.sidebar.expander("⏱️ Diagnóstico de Desempenho"):
+            snapshots = {"App": metrics.snapshot()}
+            last_job = sync_queue.latest_job()
+            if last_job and last_job['summary'].get('metrics'):
+                snapshots[f"Sync #{last_job['id']}"] = last_job['summary']['metrics']
+            for label, snap in snapshots.items():
+                st.caption(label)
+                if not snap['stages']:
+                    st.write("Sem medições ainda.")
+                    continue
+                st.dataframe(pd.DataFrame([
+                    {"etapa": stage, "n": v['count'], "p50 (s)": v['p50_s'], "p95 (s)": v['p95_s'],
+                     "máx (s)": v['max_s'], "MB": round(v['bytes'] / 1024**2, 1)}
+                    for stage, v in sorted(snap['stages'].items())
+                ]), hide_index=True, use_container_width=True)
+                if snap['counters']:
+                    st.json(snap['counters'], expanded=False)
+            export_jsonl = "".join(metrics.to_jsonl(snap, source=label) for label, snap in snapshots.items())
+            export_prom = metrics.to_prometheus([({"source": label}, snap) for label, snap in snapshots.items()])
+            st.download_button("Exportar JSONL", export_jsonl, file_name="soul_metrics.jsonl", mime="application/x-ndjson")
+            st.download_button("Exportar Prometheus", export_prom, file_name="soul_metrics.prom", mime="text/plain")
 
     # --- Google Drive Integration ---
     def get_drive_service():
-        if "GOOGLE_TOKEN" not in st.secrets:
-            # Fallback for local testing
-            token_path = 'token.json'
-            if os.path.exists(token_path):
-                creds = Credentials.from_authorized_user_file(token_path)
-                return build('drive', 'v3', credentials=creds)
+        service = clients.get_drive_service()
+        if not service:
             st.error("❌ GOOGLE_TOKEN não encontrado nos Secrets.")
-            return None
-        
-        token_info = st.secrets["GOOGLE_TOKEN"]
-        if isinstance(token_info, str): token_info = json.loads(token_info)
-        creds = Credentials.from_authorized_user_info(token_info)
-        
-        if creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        
-        return build('drive', 'v3', credentials=creds)
-
-    def extract_frames(service, file_id, timestamps=['00:00:01', '00:00:04']):
-        """Extracts multiple frames at given timestamps and returns a list of paths."""
-        extracted_paths = []
-        try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_video:
-                request = service.files().get_media(fileId=file_id)
-                downloader = MediaIoBaseDownload(tmp_video, request)
-                done = False
-                while not done:
-                    _, done = downloader.next_chunk()
-                tmp_video_path = tmp_video.name
-            
-            for i, ts in enumerate(timestamps):
-                output_path = f"{tmp_video_path}_frame_{i}.jpg"
-                cmd = ['ffmpeg', '-y', '-ss', ts, '-i', tmp_video_path, '-vframes', '1', output_path]
-                res = subprocess.run(cmd, capture_output=True)
-                if res.returncode == 0:
-                    extracted_paths.append(output_path)
-            
-            os.unlink(tmp_video_path)
-            return extracted_paths
-        except Exception as e:
-            st.error(f"Erro ao extrair quadros: {e}")
-            return []
-
-    def encode_image(image_path):
-        import base64
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-
-    def analyze_vision(image_paths, engine="Gemini", retries=1):
-        """Analyzes a sequence of images to describe action and emotion."""
-        prompt = """
-        Analise estas imagens que representam uma sequência de um vídeo de 5 segundos.
-        IMAGE 1 é o início, IMAGE 2 é o fim.
-        
-        Descreva a AÇÃO LITERAL e o MOVIMENTO (ex: 'alguém sentando', 'carro passando', 'pessoa sorrindo').
-        Identifique ELEMENTOS VISUAIS CONCRETOS.
-        
-        Retorne APENAS JSON: 
-        {"acao": "descrição do movimento/ação detectada entre os frames", 
-         "emocao": "vibe ou sentimento predominante", 
-         "descricao": "resumo detalhado dos elementos visuais", 
-         "elementos_visuais": ["lista de objetos/cenário"]}
-        """
-        
-        for attempt in range(retries + 1):
-            try:
-                if engine == "OpenAI" and client_openai:
-                    time.sleep(1)
-                    content_list = [{"type": "text", "text": prompt}]
-                    for path in image_paths:
-                        base64_img = encode_image(path)
-                        content_list.append({
-                            "type": "image_url", 
-                            "image_url": {"url": f"data:image/jpeg;base64,{base64_img}"}
-                        })
-
-                    response = client_openai.chat.completions.create(
-                        model="gpt-4o",
-                        messages=[{"role": "user", "content": content_list}],
-                        response_format={ "type": "json_object" }
-                    )
-                    content = response.choices[0].message.content
-                    return json.loads(content)
-                
-                elif engine == "Gemini" and gemini_model:
-                    input_list = [prompt]
-                    for path in image_paths:
-                        input_list.append(Image.open(path))
-                        
-                    response = gemini_model.generate_content(input_list)
-                    
-                    if not response.candidates or not response.candidates[0].content.parts:
-                        raise Exception("Gemini bloqueou a imagem por motivos de segurança.")
-                        
-                    json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-                    if not json_match:
-                        try:
-                            return json.loads(response.text.strip())
-                        except:
-                            raise Exception(f"Gemini enviou formato inválido.")
-                    return json.loads(json_match.group())
-                
-                else:
-                    raise Exception(f"Motor {engine} não configurado ou chave ausente.")
-
-            except Exception as e:
-                if "429" in str(e):
-                    if attempt < retries:
-                        st.warning(f"⏳ Limite atingido no {engine}. Aguardando 60s...")
-                        time.sleep(60)
-                        continue
-                if attempt == retries:
-                    raise e
-        return {}
-
-    def get_audio_duration(file_path):
-        """Get duration of audio file in seconds using ffprobe."""
-        try:
-            cmd = [
-                'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1', file_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                return float(result.stdout.strip())
-        except Exception as e:
-            st.error(f"Erro ao detectar duração do áudio: {e}")
-        return None
-
-    def get_semantic_storyboard(audio_path, script_text, engine="Gemini"):
-        audio_duration = get_audio_duration(audio_path)
-        duration_fmt = f"{int(audio_duration // 60):02d}:{int(audio_duration % 60):02d}" if audio_duration else "Desconhecida"
-        
-        with st.status(f"🧠 {engine} Analisando Conteúdo...", expanded=True) as status:
-            try:
-                prompt_base = f"""
-                Você é um Diretor de Montagem de Elite.
-                
-                OBJETIVO: Alinhar o ROTEIRO ao ÁUDIO com precisão técnica.
-                DURAÇÃO TOTAL DO ÁUDIO: {duration_fmt} ({audio_duration} segundos).
-                
-                INSTRUÇÕES CRÍTICAS:
-                1. NÃO use blocos fixos de tempo. Divida o roteiro em frases ou parágrafos lógicos.
-                2. Para cada bloco, IDENTIFIQUE o timestamp (MM:SS) exato em que a narração começa a dizer aquelas palavras.
-                3. Descreva a IMAGEM LITERAL (visual_theme) que deve aparecer. Evite abstrações.
-                4. O último bloco DEVE estar próximo ao final da duração total ({duration_fmt}).
-                
-                ROTEIRO: {script_text}
-                
-                Retorne APENAS JSON:
-                {{ "storyboard": [
-                    {{"timestamp": "00:00", "script_fragment": "...", "sugestao_visual_literal": "...", "elementos_chave": ["...", "..."], "emocao_alvo": "..."}},
-                    ...
-                ]}}
-                """
-
-                if engine == "Gemini" and gemini_model:
-                    st.write("📤 Enviando narração para o Gemini (Sincronia por Áudio)...")
-                    audio_file = genai.upload_file(path=audio_path)
-                    while audio_file.state.name == "PROCESSING":
-                        time.sleep(2)
-                        audio_file = genai.get_file(audio_file.name)
-                        
-                    st.write("⚡ Sincronizando conteúdo no Gemini (Escuta Ativa)...")
-                    # For Gemini, we add the audio to the prompt
-                    response = gemini_model.generate_content([audio_file, f"Escute o áudio e alinhe o roteiro com precisão milimétrica. A duração total é {duration_fmt}. {prompt_base}"])
-                    json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-                    data = json.loads(json_match.group()) if json_match else {}
-                    res = data.get('storyboard') if isinstance(data, dict) else data
-                    genai.delete_file(audio_file.name)
-                    return res if isinstance(res, list) else None
-
-                elif engine == "OpenAI" and client_openai:
-                    st.write(f"⚡ Gerando Storyboard no OpenAI (Distribuição Proporcional para {duration_fmt})...")
-                    response = client_openai.chat.completions.create(
-                        model="gpt-4o",
-                        messages=[{"role": "user", "content": prompt_base}],
-                        response_format={ "type": "json_object" }
-                    )
-                    content = response.choices[0].message.content
-                    data = json.loads(content)
-                    res = data.get('storyboard') if isinstance(data, dict) else data
-                    return res if isinstance(res, list) else None
-
-                else:
-                    st.error(f"Motor {engine} não configurado.")
-                    return None
-            except Exception as e:
-                st.error(f"Erro na análise ({engine}): {e}")
-                return None
+        return service
 
     # --- Main App Interface ---
     st.title("Soul Anchored Assembler")
     st.subheader("Editorial Brain v2.0 🧠🎙️")
 
     tab1, tab2, tab3 = st.tabs(["🚀 Produção de Roteiro", "📂 Biblioteca & Sincronia", "🔍 Busca & Descoberta"])
+    metrics.observe("app.first_paint", time.perf_counter() - _script_start)
 
     supabase = get_supabase_client()
 
     with tab2:
         st.header("Biblioteca de Vídeos")
-        
-        # PERSISTENT ERRORS DISPLAY
+
+        # PERSISTENT ERRORS DISPLAY (read from the last finished job's status records)
+        last_job = sync_queue.latest_job()
+        if last_job and last_job['state'] in ("done", "failed") and last_job['id'] != st.session_state.get("sync_report_dismissed"):
+            st.session_state.sync_errors = last_job['errors']
         if "sync_errors" in st.session_state and st.session_state.sync_errors:
             with st.expander("📉 Relatório da Última Sincronização (FALHAS)", expanded=True):
                 st.table(st.session_state.sync_errors)
                 if st.button("Limpar Relatório"):
                     st.session_state.sync_errors = []
+                    st.session_state.sync_report_dismissed = last_job['id'] if last_job else None
                     st.rerun()
 
         col_m1, col_m2 = st.columns([1, 2])
         with col_m1:
-            vision_engine = st.radio("Motor de Visão (IA)", ["Gemini", "OpenAI"], help="Se o Gemini atingir o limite de cota, use o OpenAI (GPT-4o).")
-        
+            vision_engine = st.radio("Motor de Visão (IA)", ["Gemini", "OpenAI"], help="Motor principal. Se ele atingir o limite de cota ou bloquear quadros, o outro assume automaticamente.")
+        with col_m2:
+            sync_proxies = st.checkbox("Gerar proxies 360p e pôsteres", value=False, help="Guarda uma cópia leve de cada clipe para prévias e reanálises sem baixar o original.")
+            sync_recursive = st.checkbox("Incluir subpastas", value=False, help=f"Percorre as subpastas das {len(FOLDER_IDS)} pasta(s) configuradas em FOLDER_IDS/FOLDER_ID.")
+
         col_btn1, col_btn2 = st.columns([1, 1])
         with col_btn1:
             if st.button("🔄 Sincronizar e Atualizar Biblioteca", use_container_width=True):
-                st.session_state.sync_errors = [] # Reset on new run
-                service = get_drive_service()
-                if service:
-                    with st.status("🔍 Sincronizando com Google Drive...", expanded=True) as status:
-                        # 1. Get Drive Files with Pagination
-                        drive_files = []
-                        page_token = None
-                        while True:
-                            query = f"'{FOLDER_ID}' in parents and trashed = false and mimeType contains 'video/'"
-                            results = service.files().list(q=query, fields="nextPageToken, files(id, name, webViewLink, thumbnailLink)", pageToken=page_token).execute()
-                            drive_files.extend(results.get('files', []))
-                            page_token = results.get('nextPageToken')
-                            if not page_token: break
-                        
-                        # 2. Get Supabase Files
-                        db_files = supabase.table("video_library").select("*").execute().data or []
-                        db_ids = {f['file_id'] for f in db_files}
-                        
-                        # Identify Groups
-                        group_1 = [f for f in drive_files if f['id'] not in db_ids]
-                        
-                        # Upgrade IA (Group 2): Missing action/emotion
-                        group_2 = [f for f in db_files if not f.get('acao') or f.get('acao') == 'None' or not f.get('emocao') or f.get('emocao') == 'None']
-                        
-                        # Update Thumbnails Only (Group 3): Has IA but missing thumbnail
-                        group_3 = [f for f in db_files if f['file_id'] not in [x['file_id'] for x in group_2] and not f.get('thumbnail_link')]
-                        
-                        total = len(group_1) + len(group_2) + len(group_3)
-                        st.write(f"📊 **Resumo da Varredura:** ({vision_engine})")
-                        st.write(f"- Arquivos no Drive: {len(drive_files)}")
-                        st.write(f"- Arquivos no Banco: {len(db_files)}")
-                        st.write(f"- 🆕 Novos para indexar (Grupo 1): {len(group_1)}")
-                        st.write(f"- 🆙 Para upgrade de IA (Grupo 2): {len(group_2)}")
-                        st.write(f"- 🖼️ Para atualizar miniaturas (Grupo 3): {len(group_3)}")
-
-                        if total == 0:
-                            st.info(f"Biblioteca já está 100% atualizada com metadados de {vision_engine}.")
-                        else:
-                            # Map drive info for easy access (used for thumbnails)
-                            drive_info_map = {f['id']: f for f in drive_files}
-                            
-                            # Sequential naming help
-                            existing_names = [f['file_name'] for f in db_files if f['file_name'] and f['file_name'].split('.')[0].isdigit()]
-                            last_num = max([int(n.split('.')[0]) for n in existing_names]) if existing_names else 0
-                            
-                            st.write(f"🚀 Iniciando processamento de {total} itens via {vision_engine}...")
-                            progress_bar = st.progress(0)
-                            idx = 0
-                            failed_items = []
-                            consecutive_errors = 0
-                            
-                            # Process Group 1 (New)
-                            for f in group_1:
-                                idx += 1
-                                last_num += 1
-                                new_name = f"{last_num:04d}.mp4"
-                                try:
-                                    st.write(f"🆕 Indexando [{idx}/{total}]: {f['name']} -> {new_name}")
-                                    service.files().update(fileId=f['id'], body={'name': new_name}).execute()
-                                    
-                                    frame_paths = extract_frames(service, f['id'])
-                                    if frame_paths:
-                                        meta = analyze_vision(frame_paths, engine=vision_engine)
-                                        if meta:
-                                            # Use the first frame as the permanent thumbnail if drive link fails
-                                            data = {
-                                                "file_id": f['id'], "file_name": new_name, "drive_link": f['webViewLink'],
-                                                "acao": meta.get('acao'), "emocao": meta.get('emocao'), "descricao": meta.get('descricao'),
-                                                "tags": [meta.get('acao'), meta.get('emocao')],
-                                                "thumbnail_link": f.get('thumbnailLink')
-                                            }
-                                            supabase.table("video_library").upsert(data).execute()
-                                            consecutive_errors = 0
-                                            time.sleep(1 if vision_engine == "OpenAI" else 2)
-                                        else:
-                                            raise Exception("IA recusou ou enviou resposta vazia")
-                                        
-                                        # Cleanup temp frames
-                                        for p in frame_paths: 
-                                            if os.path.exists(p): os.unlink(p)
-                                    else:
-                                        raise Exception("FFmpeg: Não foi possível extrair os quadros.")
-                                except Exception as e:
-                                    failed_items.append({"file": f['name'], "error": str(e)})
-                                    st.warning(f"⚠️ Falha em {f['name']}: {e}")
-                                
-                                progress_bar.progress(idx / total)
-                                if len(failed_items) >= 5:
-                                    st.error("🚨 Limite de 5 falhas atingido. O processo foi interrompido para economizar seus tokens e permitir revisão.")
-                                    break
-
-                            # Process Group 2 (Upgrade)
-                            for f in group_2:
-                                if len(failed_items) >= 5: break
-                                idx += 1
-                                try:
-                                    st.write(f"🆙 Fazendo Upgrade [{idx}/{total}]: {f['file_name']} ({vision_engine})")
-                                    
-                                    frame_paths = extract_frames(service, f['file_id'])
-                                    if frame_paths:
-                                        meta = analyze_vision(frame_paths, engine=vision_engine)
-                                        if meta:
-                                            # Fetch latest drive info to get thumbnailLink if missing
-                                            drive_item = drive_info_map.get(f['file_id'])
-                                            thumb = drive_item.get('thumbnailLink') if drive_item else None
-                                            
-                                            data = {
-                                                "acao": meta.get('acao'), "emocao": meta.get('emocao'), "descricao": meta.get('descricao'),
-                                                "tags": list(set((f.get('tags') or []) + [meta.get('acao'), meta.get('emocao')])),
-                                                "thumbnail_link": thumb or f.get('thumbnail_link')
-                                            }
-                                            supabase.table("video_library").update(data).eq("file_id", f['file_id']).execute()
-                                            time.sleep(1 if vision_engine == "OpenAI" else 2)
-                                        else:
-                                            raise Exception("IA recusou ou enviou resposta vazia")
-                                        
-                                        # Cleanup
-                                        for p in frame_paths: 
-                                            if os.path.exists(p): os.unlink(p)
-                                    else:
-                                        raise Exception("FFmpeg: Falha ao ler vídeo")
-                                except Exception as e:
-                                    failed_items.append({"file": f['file_name'], "error": str(e)})
-                                    st.warning(f"⚠️ Falha em {f['file_name']}: {e}")
-                                progress_bar.progress(idx / total)
-                            
-                            # Process Group 3 (Thumbnails Only)
-                            for f in group_3:
-                                idx += 1
-                                try:
-                                    st.write(f"🖼️ Atualizando Miniatura [{idx}/{total}]: {f['file_name']}")
-                                    drive_item = drive_info_map.get(f['file_id'])
-                                    if drive_item and drive_item.get('thumbnailLink'):
-                                        supabase.table("video_library").update({"thumbnail_link": drive_item['thumbnailLink']}).eq("file_id", f['file_id']).execute()
-                                    else:
-                                        st.warning(f"⚠️ Drive não forneceu miniatura para {f['file_name']}")
-                                except Exception as e:
-                                    failed_items.append({"file": f['file_name'], "error": str(e)})
-                                    st.warning(f"⚠️ Falha ao atualizar miniatura: {e}")
-                                progress_bar.progress(idx / total)
-                            
-                            st.session_state.sync_errors = failed_items
-                            if failed_items:
-                                st.error(f"Sincronização Finalizada com {len(failed_items)} falhas.")
-                            else:
-                                st.success(f"✅ Sincronização Finalizada com Sucesso!")
-
-        res = supabase.table("video_library").select("*").order("file_name", desc=False).execute()
-        if res.data:
-            df = pd.DataFrame(res.data)
+                if sync_queue.has_active_job():
+                    st.warning("⏳ Já existe uma sincronização na fila ou em andamento.")
+                else:
+                    job_id = sync_queue.enqueue_job({"engine": vision_engine, "folder_ids": FOLDER_IDS, "recursive": sync_recursive, "proxies": sync_proxies})
+                    st.session_state.sync_errors = []
+                    st.session_state.watching_sync_job = job_id
+                    st.toast(f"Sincronização #{job_id} enviada para o worker.")
+        with col_btn2:
+            if st.button("🧪 Simular Sincronização (Dry Run)", use_container_width=True, help="Mostra o plano e a estimativa de custo sem gastar cota de IA."):
+                if sync_queue.has_active_job():
+                    st.warning("⏳ Já existe uma sincronização na fila ou em andamento.")
+                else:
+                    # Listing a large Drive takes a while: the worker builds the plan, like a real sync
+                    job_id = sync_queue.enqueue_job({"dry_run": True, "engine": vision_engine, "folder_ids": FOLDER_IDS, "recursive": sync_recursive})
+                    st.session_state.watching_sync_job = job_id
+                    st.toast(f"Simulação #{job_id} enviada para o worker.")
+
+        # The plan comes from the last finished dry-run job
+        if last_job and last_job['params'].get('dry_run') and last_job['summary'].get('plan') \
+                and last_job['id'] != st.session_state.get("sync_plan_dismissed"):
+            plan = last_job['summary']['plan']
+            with st.expander(f"🧪 Plano de Sincronização ({plan['engine']})", expanded=True):
+                m1, m2, m3, m4 = st.columns(4)
+                m1.metric("🆕 Novos (Grupo 1)", plan['group_1_count'])
+                m2.metric("🆙 Upgrade IA (Grupo 2)", plan['group_2_count'])
+                m3.metric("🖼️ Miniaturas (Grupo 3)", plan['group_3_count'])
+                m4.metric("Drive / Banco", f"{plan['drive_count']} / {plan['db_count']}")
+                e1, e2, e3, e4 = st.columns(4)
+                e1.metric("Download estimado", f"{plan['download_bytes'] / 1024**3:.2f} GB")
+                e2.metric("Chamadas de visão", plan['vision_calls'])
+                e3.metric("Tokens estimados", f"{plan['input_tokens'] + plan['output_tokens']:,}", f"~US$ {plan['estimated_cost_usd']:.2f}", delta_color="off")
+                e4.metric("Tempo estimado", f"{plan['estimated_seconds'] / 60:.0f} min")
+                if st.button("Fechar Plano"):
+                    st.session_state.sync_plan_dismissed = last_job['id']
+                    st.rerun()
+
+        # Poll the job's status records only while a job is queued or running
+        @st.fragment(run_every=3 if sync_queue.has_active_job() else None)
+        def show_sync_progress():
+            job = sync_queue.latest_job()
+            if not job:
+                return
+            labels = {"queued": "⏳ Na fila (aguardando o worker)", "running": "🔍 Sincronizando com Google Drive...",
+                      "done": "✅ Sincronização Finalizada", "failed": "❌ Sincronização Interrompida"}
+            if job['params'].get('dry_run'):
+                labels.update(running="🧪 Comparando Drive e Banco...", done="🧪 Simulação Finalizada", failed="❌ Simulação Interrompida")
+            active = job['state'] in ("queued", "running")
+            with st.status(f"{labels.get(job['state'], job['state'])} — Job #{job['id']} ({job['params'].get('engine')})",
+                           expanded=active, state="running" if active else ("error" if job['state'] == "failed" else "complete")):
+                if job['total']:
+                    st.progress(job['done'] / job['total'], text=f"{job['done']}/{job['total']}")
+                for event in sync_queue.job_events(job['id'], limit=30):
+                    st.write(event['message'])
+                if job['state'] == "queued":
+                    st.caption("Inicie o worker com `python sync_worker.py` se a fila não andar.")
+                if job['summary'].get('llm', {}).get('calls'):
+                    st.caption(f"💰 {llm_costs.format_summary(job['summary']['llm'])}")
+            # Refresh the whole page once the watched job finishes so the report and table update
+            if active:
+                st.session_state.watching_sync_job = job['id']
+            elif st.session_state.pop("watching_sync_job", None) == job['id']:
+                st.rerun()
+
+        show_sync_progress()
+
+        # Same per-version snapshot the search tab uses, instead of a full read per rerun
+        library_rows = search_cache.library_snapshot(supabase)[1]
+        if library_rows:
+            import pandas as pd
+            df = pd.DataFrame(library_rows).sort_values("file_name", ignore_index=True)
             # Only show columns that exist in the DB
             display_cols = ["file_name", "acao", "emocao", "descricao", "last_used_at"]
             available_cols = [c for c in display_cols if c in df.columns]
@@ -531,98 +287,140 @@ try:
             script_text = st.text_area("Roteiro Original", height=250, placeholder="Cole o roteiro...")
         with col2:
             audio_in = st.file_uploader("Upload de Áudio", type=['mp3', 'wav'])
-            story_engine = st.radio("Motor de Geração", ["Gemini", "OpenAI"], index=0, horizontal=True, help="Use OpenAI se o Gemini estiver fora de cota.")
+            story_engine = st.radio("Motor de Geração", ["Gemini", "OpenAI"], index=0, horizontal=True, help="Motor principal. Se ele estiver fora de cota, o outro assume automaticamente.")
+            for circuit in engine_router.status():
+                if circuit['state'] != engine_router.State.CLOSED:
+                    st.caption(f"🔌 {circuit['engine']} em pausa ({circuit['state'].value}, nova tentativa em {circuit['reopens_in_s']}s): {circuit['last_error']}")
+            clip_format = st.radio("Formato dos Clipes", ["Qualquer", "Horizontal", "Vertical"], index=0, horizontal=True, help="Clipes ainda sem metadados técnicos entram em qualquer formato.")
             if audio_in: st.audio(audio_in)
 
         if st.button("🧠 Gerar Storyboard Semântico"):
             if not script_text or not audio_in:
                 st.warning("Forneça o roteiro e o áudio.")
             else:
+                # Freshest indexed clips and usage penalties (loaded first so each block is matched as soon as it arrives)
+                all_videos, excluded, penalties = usage.load_candidates(supabase)
+                all_videos = matching.filter_specs(all_videos, orientation=None if clip_format == "Qualquer" else clip_format.lower())
+                # Normalized once for every block of this storyboard
+                all_videos = catalog.Catalog(all_videos)
+                
+                if not all_videos:
+                    st.error("⚠️ NENHUM VÍDEO INDEXADO ENCONTRADO. Por favor, sincronize a biblioteca primeiro.")
+                    st.stop()
+                
                 with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio_in.name.split('.')[-1]}") as tmp:
                     tmp.write(audio_in.getvalue()); tmp_path = tmp.name
-                storyboard = get_semantic_storyboard(tmp_path, script_text, engine=story_engine)
-                os.remove(tmp_path)
                 
-                if storyboard:
-                    # Filter for indexed videos only
-                    raw_videos = supabase.table("video_library").select("*").order("last_used_at", desc=False, nullsfirst=True).execute().data or []
-                    all_videos = [v for v in raw_videos if v.get('acao') and v.get('acao') != 'None' and v.get('emocao') and v.get('emocao') != 'None']
-                    
-                    if not all_videos:
-                        st.error("⚠️ NENHUM VÍDEO INDEXADO ENCONTRADO. Por favor, sincronize a biblioteca primeiro.")
-                        st.stop()
-                    
-                    recent_ids = set([v['file_id'] for v in sorted(all_videos, key=lambda x: x.get('last_used_at') or '', reverse=True)[:10]])
-                    
-                    final_plan = []
-                    session_used = []
-                    for block in storyboard:
-                        target_emocao = block.get('emocao_alvo', '').lower()
-                        sugestao_visual = block.get('sugestao_visual_literal', block.get('visual_theme', '')).lower()
-                        elementos_chave = block.get('elementos_chave', [])
-                        
-                        # Matching priority: Score-based (Literal elements > Description > Emotion)
-                        candidates = [v for v in all_videos if v['file_id'] not in recent_ids and v['file_id'] not in session_used]
-                        best = None
-                        best_score = -1
-
-                        for v in candidates:
-                            score = 0
-                            v_acao = (v.get('acao') or '').lower()
-                            v_desc = (v.get('descricao') or '').lower()
-                            v_tags = (v.get('tags') or [])
-                            if isinstance(v_tags, str): v_tags = [v_tags] 
-                            v_tags = [str(t).lower() for t in v_tags]
-
-                            # 1. Keyword match from 'elementos_chave'
-                            for elem in elementos_chave:
-                                elem = elem.lower()
-                                if elem in v_acao or elem in v_desc: score += 5
-                                if any(elem in t for t in v_tags): score += 3
-
-                            # 2. Text match in description/action
-                            if sugestao_visual in v_acao or sugestao_visual in v_desc: score += 10
-                            
-                            # 3. Emotion match
-                            if target_emocao in str(v.get('emocao', '')).lower(): score += 1
-
-                            if score > best_score:
-                                best_score = score
-                                best = v
-                        
-                        if not best:
-                            best = candidates[0] if candidates else (all_videos[0] if all_videos else None)
-                        
-                        if best:
-                            final_plan.append({
-                                "Tempo": block['timestamp'], "Texto": block['script_fragment'],
-                                "Sugestão Visual": block.get('sugestao_visual_literal', block.get('visual_theme', '')), "ARQUIVO": f"🎬 {best['file_name']}",
-                                "file_id": best['file_id'], "file_name": best['file_name'], "meta": f"{best.get('acao','')} | {best.get('emocao','')}"
-                            })
-                            session_used.append(best['file_id'])
-                    
-                    st.session_state['last_storyboard'] = final_plan
+                import pandas as pd
+                final_plan, final_blocks = [], []
+                st.session_state.pop('last_storyboard', None)
+                st.session_state.pop('last_storyboard_cost', None)
+                st.session_state.pop('preview_video', None)
+                # Kept for per-block edits: the blocks behind each row, the clips and the constraints they were matched under
+                st.session_state.storyboard_ctx = {"blocks": final_blocks, "clips": all_videos, "recent": set(excluded),
+                                                   "penalties": penalties, "engine": story_engine, "ranks": {}}
+                # Any click reruns the script, which stops reading the stream; blocks already received are kept
+                stop_slot = st.empty()
+                stop_slot.button("⏹️ Parar Geração", key="stop_storyboard", help="Interrompe a IA e mantém os blocos já recebidos.")
+                table_slot = st.empty()
+                try:
+                    with llm_costs.track("storyboard", ref=project_title) as cost_tally, \
+                            st.status(f"🧠 {story_engine} Analisando Conteúdo...", expanded=True) as status:
+                        for block in engine_router.stream_semantic_storyboard(tmp_path, script_text, engine=story_engine, log=st.write):
+                            with metrics.span("matcher"):
+                                # The next timestamp isn't known yet: the block length is estimated from its words
+                                row = matching.match_block(block, all_videos, excluded, penalties, matching.block_seconds(block),
+                                                           [r['file_id'] for r in final_plan])
+                            if not row: continue
+                            excluded.add(row['file_id'])
+                            final_plan.append(row); final_blocks.append(block)
+                            st.session_state['last_storyboard'] = list(final_plan)
+                            table_slot.table(pd.DataFrame(final_plan)[["Tempo", "Texto", "Sugestão Visual", "meta", "ARQUIVO"]])
+                        status.update(state="complete", expanded=False)
+                except Exception as e:
+                    st.error(f"Erro na análise ({story_engine}): {e}")
+                finally:
+                    os.remove(tmp_path)
+                    st.session_state['last_storyboard_cost'] = cost_tally.summary()
+                    llm_costs.persist(supabase, cost_tally)
+                stop_slot.empty(); table_slot.empty()
+                
+                if final_plan:
                     st.success("Storyboard gerado!")
 
     if 'last_storyboard' in st.session_state:
+        import pandas as pd
         sb = st.session_state['last_storyboard']
         st.divider()
         st.header("📋 Tabela de Montagem Técnico")
         st.table(pd.DataFrame(sb)[["Tempo", "Texto", "Sugestão Visual", "meta", "ARQUIVO"]])
-        
+        if st.session_state.get('last_storyboard_cost', {}).get('calls'):
+            st.caption(f"💰 {llm_costs.format_summary(st.session_state['last_storyboard_cost'])}")
+
+        # --- Per-block edits: swap one clip or rewrite one block without regenerating the whole storyboard ---
+        ctx = st.session_state.get("storyboard_ctx")
+        if ctx and len(ctx['blocks']) == len(sb):
+            with st.expander("✏️ Ajustar um Bloco"):
+                b_idx = st.selectbox("Bloco", range(len(sb)), key="edit_block_idx",
+                                     format_func=lambda i: f"[{sb[i]['Tempo']}] {str(sb[i]['Texto'])[:60]} → {sb[i]['file_name']}")
+                b_hint = st.text_input("O que mudar (opcional)", key="edit_block_hint", placeholder="Ex.: algo mais calmo, sem pessoas...",
+                                       help="Só usado ao regenerar o bloco.")
+                block = ctx['blocks'][b_idx]
+                # No reuse: the other rows' clips and the recently used ones stay out
+                others = [row['file_id'] for j, row in enumerate(sb) if j != b_idx]
+                next_block = ctx['blocks'][b_idx + 1] if b_idx + 1 < len(sb) else None
+                min_s = matching.block_seconds(block, next_block)
+                e1, e2 = st.columns(2)
+                with e1:
+                    if st.button("⏭️ Próximo Melhor Clipe", use_container_width=True, help="Troca o clipe pelo próximo da lista já ranqueada para este bloco (sem IA)."):
+                        # The near-duplicate penalty depends on the other rows' clips: re-rank when any of them changed
+                        if ctx['ranks'].get(b_idx, (None,))[0] != tuple(others):
+                            with metrics.span("matcher.rank"):
+                                ctx['ranks'][b_idx] = (tuple(others), matching.rank_block(block, ctx['clips'], ctx['recent'],
+                                                                                          ctx['penalties'], min_s, others))
+                        clip = matching.next_best(ctx['ranks'][b_idx][1], sb, b_idx, ctx['recent'])
+                        if clip:
+                            sb[b_idx] = matching.plan_row(block, clip)
+                            st.session_state.pop('preview_video', None)
+                            st.rerun()
+                        else:
+                            st.warning("Não há outro clipe disponível para este bloco.")
+                with e2:
+                    if st.button("🔄 Regenerar Bloco", use_container_width=True, help="Envia à IA só este trecho e os vizinhos (sem reenviar o áudio)."):
+                        previous = ctx['blocks'][b_idx - 1] if b_idx else None
+                        regenerated = False
+                        try:
+                            with llm_costs.track("storyboard", ref=project_title) as cost_tally, st.status("🔄 Regenerando bloco...") as status:
+                                new_block, _ = engine_router.regenerate_block(block, previous, next_block, engine=ctx['engine'],
+                                                                              hint=b_hint, log=st.write)
+                                with metrics.span("matcher.rank"):
+                                    ranked = matching.rank_block(new_block, ctx['clips'], ctx['recent'] | set(others), ctx['penalties'],
+                                                                 min_s, others)
+                                status.update(state="complete")
+                            ctx['blocks'][b_idx] = new_block
+                            ctx['ranks'][b_idx] = (tuple(others), ranked)
+                            # With every other clip taken, the current one stays under the new text
+                            clip = ranked[0][1] if ranked else ctx['clips'].rows[ctx['clips'].file_ids.index(sb[b_idx]['file_id'])]
+                            sb[b_idx] = matching.plan_row(new_block, clip)
+                            st.session_state.pop('preview_video', None)
+                            regenerated = True
+                        except Exception as e:
+                            st.error(f"Erro ao regenerar bloco ({ctx['engine']}): {e}")
+                        finally:
+                            st.session_state['last_storyboard_cost'] = llm_costs.merge(st.session_state.get('last_storyboard_cost'), cost_tally.summary())
+                            llm_costs.persist(supabase, cost_tally)
+                        if regenerated: st.rerun()
+
         c1, c2 = st.columns(2)
         with c1:
             if st.button("✅ Confirmar Montagem e Registrar", use_container_width=True):
-                now = datetime.now().isoformat()
-                for item in sb:
-                    supabase.table("video_library").update({"last_used_at": now}).eq("file_id", item['file_id']).execute()
+                usage.record_usage(supabase, [item['file_id'] for item in sb], project=project_title)
+                search_cache.invalidate()
                 st.balloons(); st.success("Uso registrado!"); del st.session_state['last_storyboard']; st.rerun()
         with c2:
             try:
                 # Re-construct text content to ensure it's fresh and valid
-                sb_preview = f"ROTEIRO TÉCNICO: {project_title}\n" + "="*30 + "\n"
-                for item in sb: 
-                    sb_preview += f"[{item.get('Tempo', '00:00')}] -> {item.get('file_name', 'N/A')} ({item.get('meta', '')})\n"
+                sb_preview = matching.whatsapp_script(project_title, sb)
                 
                 # Use a specific key and ensure proper encoding
                 st.download_button(
@@ -644,34 +442,33 @@ try:
                         st.error("Erro ao acessar Google Drive.")
                         st.stop()
                         
+                    def fetch(file_id):
+                        data = io.BytesIO()
+                        media.download_to(service, file_id, data)
+                        return data.getvalue()
+
                     zip_buffer = io.BytesIO()
                     with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
                         # 1. Add Script
                         zip_file.writestr(f"roteiro_{project_title.replace(' ', '_')}.txt", sb_preview)
                         
-                        # 2. Add Videos
+                        # 2. Add Videos (downloaded in parallel over the pooled Drive connection, zipped in order)
                         total_vids = len(sb)
                         progress_text = st.empty()
                         progress_bar = st.progress(0)
                         
-                        for i, item in enumerate(sb):
-                            f_id = item.get('file_id')
-                            f_name = item.get('file_name', f"video_{i}.mp4")
-                            
-                            progress_text.text(f"📥 Baixando do Drive ({i+1}/{total_vids}): {f_name}")
-                            try:
-                                request = service.files().get_media(fileId=f_id)
-                                video_data = io.BytesIO()
-                                downloader = MediaIoBaseDownload(video_data, request)
-                                done = False
-                                while not done:
-                                    _, done = downloader.next_chunk()
+                        from concurrent.futures import ThreadPoolExecutor
+                        with ThreadPoolExecutor(max_workers=drive_http.DOWNLOAD_WORKERS) as pool:
+                            downloads = [pool.submit(fetch, item.get('file_id')) for item in sb]
+                            for i, (item, download) in enumerate(zip(sb, downloads)):
+                                f_name = item.get('file_name', f"video_{i}.mp4")
+                                progress_text.text(f"📥 Baixando do Drive ({i+1}/{total_vids}): {f_name}")
+                                try:
+                                    zip_file.writestr(f_name, download.result())
+                                except Exception as vid_err:
+                                    st.warning(f"⚠️ Erro ao baixar {f_name}: {vid_err}")
                                 
-                                zip_file.writestr(f_name, video_data.getvalue())
-                            except Exception as vid_err:
-                                st.warning(f"⚠️ Erro ao baixar {f_name}: {vid_err}")
-                            
-                            progress_bar.progress((i + 1) / total_vids)
+                                progress_bar.progress((i + 1) / total_vids)
                         
                         progress_text.text("✅ ZIP pronto para download!")
                         
@@ -685,53 +482,158 @@ try:
             except Exception as e:
                 st.error(f"Erro ao preparar download: {e}")
 
+        # --- Edit timeline: references the clips instead of copying them (a few KB instead of the ZIP) ---
+        with st.expander("📐 Linha do Tempo para Edição (FCPXML / EDL / OTIO)"):
+            tl_format = st.selectbox("Formato", list(timeline.FORMATS), key="timeline_format")
+            tl_root = st.text_input("Pasta dos clipes no computador de edição", value=timeline.MEDIA_ROOT,
+                                    help="Ex.: a pasta do Google Drive para computador. Vazio = só o nome do arquivo (o editor reconecta).")
+            tl_proxies = st.checkbox("Usar proxies locais quando houver", value=False,
+                                     help="Aponta para as cópias em 360p deste servidor (edição nesta máquina).")
+            try:
+                _, _, tl_clips, _ = search_cache.library_snapshot(supabase)
+                audio_s = None
+                if audio_in:
+                    # Narration length sets the last block's end and the audio track
+                    audio_key = (audio_in.name, audio_in.size)
+                    if st.session_state.get("timeline_audio", (None,))[0] != audio_key:
+                        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio_in.name.split('.')[-1]}") as tmp:
+                            tmp.write(audio_in.getvalue())
+                        try:
+                            st.session_state.timeline_audio = (audio_key, media.get_audio_duration(tmp.name))
+                        finally:
+                            os.remove(tmp.name)
+                    audio_s = st.session_state.timeline_audio[1]
+                tl = timeline.build(sb, project_title, clips_by_id=tl_clips, audio_name=audio_in.name if audio_in else None,
+                                    total_s=audio_s, media_root=tl_root, use_proxies=tl_proxies)
+                tl_name, tl_text, tl_mime = timeline.export(tl, tl_format)
+                st.download_button("📐 Baixar Linha do Tempo", tl_text, file_name=tl_name, mime=tl_mime,
+                                   key="download_timeline_btn", use_container_width=True)
+                st.caption(f"{len(tl['events'])} clipes · {tl['frames'] / tl['fps']:.1f}s a {tl['fps']} fps"
+                           + (" · com trilha de narração" if tl['narration'] else " · envie a narração para incluir a trilha de áudio"))
+            except Exception as e:
+                st.error(f"Erro ao gerar linha do tempo: {e}")
+
+        # --- Rough-cut preview: low-resolution segments + narration, no full ZIP needed ---
+        if st.button("🎞️ Renderizar Prévia", use_container_width=True, help="Monta uma prévia em baixa resolução com a narração enviada."):
+            service = get_drive_service()
+            if service:
+                audio_tmp = None
+                if audio_in:
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio_in.name.split('.')[-1]}") as tmp:
+                        tmp.write(audio_in.getvalue()); audio_tmp = tmp.name
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+                    preview_path = tmp.name
+                try:
+                    with st.status("🎞️ Renderizando prévia...", expanded=True):
+                        preview.render_preview(service, sb, audio_tmp, preview_path, log=st.write)
+                    with open(preview_path, "rb") as f:
+                        st.session_state.preview_video = f.read()
+                except Exception as e:
+                    st.error(f"Erro ao renderizar prévia: {e}")
+                finally:
+                    for path in (audio_tmp, preview_path):
+                        if path and os.path.exists(path): os.remove(path)
+        if st.session_state.get("preview_video"):
+            st.video(st.session_state.preview_video)
+
     with tab3:
         st.header("🔍 Busca Inteligente de Vídeos")
         st.markdown("---")
         
-        search_col1, search_col2 = st.columns([3, 1])
+        search_col1, search_col2, search_col3, search_col4 = st.columns([3, 1, 1, 1])
         with search_col1:
             search_query = st.text_input("O que você procura?", placeholder="Ex: 'alguém tomando café', 'clima de mistério', 'pessoa digitando'", key="video_search_input")
         with search_col2:
             search_mode = st.selectbox("Modo de Busca", ["Rápido (Palavras-chave)", "Profundo (IA Semântica)"])
+        with search_col3:
+            search_format = st.selectbox("Formato", ["Qualquer", "Horizontal", "Vertical"])
+        with search_col4:
+            min_duration = st.number_input("Duração mínima (s)", min_value=0, max_value=120, value=0, step=1)
+        # Technical filters run before scoring (in Postgres or on the snapshot)
+        spec_filters = {k: v for k, v in {"orientation": None if search_format == "Qualquer" else search_format.lower(),
+                                          "min_duration": min_duration or None}.items() if v}
+
+        def clip_card(v_data, key, note=None):
+            # Use thumbnail from DB or fallback
+            thumb = v_data.get('thumbnail_link')
+            if thumb:
+                st.image(thumb, use_container_width=True)
+            else:
+                st.markdown(f"🎬 **{v_data['file_name']}**")
+            
+            st.write(f"**{v_data['file_name']}**")
+            if note: st.caption(note)
+            with st.expander("Ver Detalhes"):
+                st.write(f"**Ação:** {v_data.get('acao')}")
+                st.write(f"**Emoção:** {v_data.get('emocao')}")
+                if v_data.get('duration_s') is not None:
+                    st.caption(f"{v_data['duration_s']:.1f}s · {v_data.get('width')}x{v_data.get('height')} · {v_data.get('orientation') or '-'}"
+                               + (f" · {v_data['fps']:g} fps" if v_data.get('fps') else ""))
+                if v_data.get('tags'):
+                    clean_tags = [str(t) for t in v_data.get('tags') if t and str(t).lower() != 'none']
+                    if clean_tags:
+                        st.caption(f"Tags: {', '.join(clean_tags)}")
+                st.link_button("Abrir no Drive 🔗", v_data.get('drive_link', ''))
+            if v_data.get('phash'):
+                st.button("🧬 Mais como este", key=f"similar_{key}", use_container_width=True,
+                          on_click=lambda: st.session_state.update(similar_to=v_data['file_id']))
+
+        # "More like this": perceptual-hash neighbours from a BK-tree built once per library version
+        if st.session_state.get("similar_to"):
+            lib_version, all_vids, vids_by_id, _ = search_cache.library_snapshot(supabase)
+            source = vids_by_id.get(st.session_state.similar_to)
+            if source is None or phash.parse(source.get('phash')) is None:
+                st.session_state.pop("similar_to")
+            else:
+                with metrics.span("search.similar"):
+                    tree = search_cache.cached(("phash_index", lib_version), lambda: phash.index(all_vids))
+                    hits = [(vids_by_id[fid], d) for d, fid in tree.search(phash.parse(source['phash']), phash.SIMILAR_BITS)
+                            if fid != source['file_id'] and matching.fits_specs(vids_by_id[fid], **spec_filters)][:12]
+                sim_col1, sim_col2 = st.columns([4, 1])
+                sim_col1.subheader(f"🧬 Parecidos com {source['file_name']}")
+                sim_col2.button("✖ Fechar", key="close_similar", on_click=lambda: st.session_state.pop("similar_to", None))
+                if not hits:
+                    st.info("Nenhum clipe visualmente parecido na biblioteca.")
+                cols_per_row = 4
+                for i in range(0, len(hits), cols_per_row):
+                    cols = st.columns(cols_per_row)
+                    for j, (v_data, dist) in enumerate(hits[i:i + cols_per_row]):
+                        with cols[j]:
+                            clip_card(v_data, f"sim_{i + j}",
+                                      "Quase idêntico" if dist <= phash.NEAR_DUP_BITS else f"Distância: {dist} bits")
+                st.markdown("---")
 
         if search_query:
-            all_vids = supabase.table("video_library").select("*").execute().data or []
+            lib_version = search_cache.library_version(supabase)
             
-            if not all_vids:
+            if not lib_version[0]:
                 st.warning("⚠️ Biblioteca vazia. Sincronize na segunda aba.")
             else:
                 with st.spinner("Buscando matches perfeitos..."):
-                    results = []
-                    q = search_query.lower()
-                    
-                    if search_mode == "Rápido (Palavras-chave)":
-                        for v in all_vids:
-                            score = 0
-                            v_acao = (v.get('acao') or '').lower()
-                            v_desc = (v.get('descricao') or '').lower()
-                            v_emocao = (v.get('emocao') or '').lower()
-                            v_tags = v.get('tags') or []
-                            if isinstance(v_tags, str): v_tags = [v_tags]
-                            v_tags = [str(t).lower() for t in v_tags]
-                            
-                            # Matching
-                            if q in v_acao: score += 10
-                            if q in v_desc: score += 5
-                            if q in v_emocao: score += 5
-                            if any(q in t for t in v_tags): score += 7
-                            
-                            # Partial match for multi-word queries
-                            words = q.split()
-                            if len(words) > 1:
-                                for word in words:
-                                    if word in v_acao: score += 2
-                                    if word in v_desc: score += 1
-                                    
-                            if score > 0:
-                                results.append((v, score))
+                    norm_query = search_cache.normalize_query(search_query)
+                    # Rápido runs in Postgres when the FTS migration is deployed; otherwise score in-process
+                    pushed = search_cache.fts_ranked(supabase, lib_version, norm_query, filters=spec_filters) if search_mode == "Rápido (Palavras-chave)" else None
+                    if pushed is None:
+                        lib_version, all_vids, vids_by_id, lib_catalog = search_cache.library_snapshot(supabase)
+                        if spec_filters:
+                            all_vids = matching.filter_specs(all_vids, **spec_filters)
+                            lib_catalog = catalog.Catalog(all_vids)
+
+                    if pushed is not None:
+                        results, total_found = pushed
+                    elif search_mode == "Rápido (Palavras-chave)":
+                        def score_keywords():
+                            with metrics.span("search.keyword"):
+                                return matching.keyword_search(lib_catalog, norm_query)
+                        results = search_cache.ranked(lib_version, vids_by_id, "keyword", norm_query, score_keywords, spec_filters)
                     
                     else: # IA Semântica
+                        results = []
+                        try:
+                            gemini_model = clients.get_gemini_model()
+                        except Exception as e:
+                            st.error(f"Erro Gemini: {e}")
+                            gemini_model = None
                         # Prompt IA to extract keywords or rank based on explanation
                         if gemini_model:
                             prompt = f"""
@@ -739,57 +641,44 @@ try:
                             Extraia os 5 conceitos ou palavras-chave mais importantes para busca visual.
                             Retorne apenas uma lista JSON: ["palavra1", "palavra2", ...]
                             """
+                            def extract_keywords():
+                                with llm_costs.track("search", ref=norm_query) as tally:
+                                    start = time.perf_counter()
+                                    with metrics.span("search.gemini_keywords"):
+                                        response = gemini_model.generate_content(prompt)
+                                    llm_costs.record("search", "Gemini", gemini_model.model_name, *llm_costs.usage_counts(response),
+                                                     time.perf_counter() - start)
+                                llm_costs.persist(supabase, tally)
+                                return matching.parse_keywords(response.text, search_query)
                             try:
-                                response = gemini_model.generate_content(prompt)
-                                json_match = re.search(r'\[.*\]', response.text, re.DOTALL)
-                                keywords = json.loads(json_match.group()) if json_match else [search_query]
-                                
-                                for v in all_vids:
-                                    score = 0
-                                    v_text = f"{v.get('acao')} {v.get('descricao')} {v.get('emocao')} {' '.join(v.get('tags') or [])}".lower()
-                                    for kw in keywords:
-                                        if kw.lower() in v_text: score += 5
-                                    if score > 0:
-                                        results.append((v, score))
+                                keywords = search_cache.cached(("keywords", norm_query), extract_keywords)
+                                results = search_cache.ranked(lib_version, vids_by_id, "semantic", norm_query,
+                                                              lambda: matching.semantic_search(all_vids, keywords), spec_filters)
                             except:
                                 # Fallback to keyword match
-                                for v in all_vids:
-                                    if q in str(v).lower(): results.append((v, 1))
-                                    
-                    # Sort by score
-                    results.sort(key=lambda x: x[1], reverse=True)
+                                results = matching.fallback_search(all_vids, search_query)
                     
+                    if pushed is None:
+                        total_found = len(results)
                     if results:
-                        st.write(f"✅ Encontramos **{len(results)}** possíveis matches:")
+                        st.write(f"✅ Encontramos **{total_found}** possíveis matches:")
                         
-                        # Display in grid
+                        # Display in grid; near-identical clips (same shoot) show once
+                        shown, hidden = phash.collapse(results, lambda pair: phash.parse(pair[0].get('phash')), 24)
                         cols_per_row = 4
-                        for i in range(0, min(len(results), 24), cols_per_row):
+                        for i in range(0, len(shown), cols_per_row):
                             cols = st.columns(cols_per_row)
-                            for j in range(cols_per_row):
-                                if i + j < len(results):
-                                    v_data, v_score = results[i + j]
-                                    with cols[j]:
-                                        # Use thumbnail from DB or fallback
-                                        thumb = v_data.get('thumbnail_link')
-                                        if thumb:
-                                            st.image(thumb, use_container_width=True)
-                                        else:
-                                            st.markdown(f"🎬 **{v_data['file_name']}**")
-                                        
-                                        st.write(f"**{v_data['file_name']}**")
-                                        with st.expander("Ver Detalhes"):
-                                            st.write(f"**Ação:** {v_data.get('acao')}")
-                                            st.write(f"**Emoção:** {v_data.get('emocao')}")
-                                            if v_data.get('tags'):
-                                                clean_tags = [str(t) for t in v_data.get('tags') if t and str(t).lower() != 'none']
-                                                if clean_tags:
-                                                    st.caption(f"Tags: {', '.join(clean_tags)}")
-                                            st.link_button("Abrir no Drive 🔗", v_data.get('drive_link', ''))
+                            for j, (v_data, v_score) in enumerate(shown[i:i + cols_per_row]):
+                                with cols[j]:
+                                    clip_card(v_data, f"result_{i + j}")
+                        if hidden:
+                            st.caption(f"🧬 {hidden} clipes quase idênticos a outros resultados foram ocultados.")
                     else:
                         st.info("🔍 Nenhum vídeo encontrado. Tente outras palavras ou use o modo 'Profundo'.")
 
     st.markdown("---")
+    show_db_diagnostics()
+    show_perf_diagnostics()
 
 except Exception as e:
     st.error("❌ ERRO CRÍTICO"); st.exception(e); st.code(traceback.format_exc())
@@ -0,0 +1,56 @@
+-- Full-text search over video_library for the "Rápido (Palavras-chave)" mode.
+-- Ranking approximates the Python scorer: acao (A) > tags (B) > descricao/emocao (C),
+-- with trigram similarity as a typo-tolerant fallback.
+-- Assumes `tags` is text[] (the app writes Python lists into it).
+
+create extension if not exists unaccent;
+create extension if not exists pg_trgm;
+
+-- unaccent() and array_to_string() are only STABLE; generated columns need IMMUTABLE wrappers
+create or replace function public.immutable_unaccent(text)
+returns text language sql immutable parallel safe strict as
+$$ select public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+create or replace function public.video_tags_text(text[])
+returns text language sql immutable parallel safe as
+$$ select coalesce(array_to_string($1, ' '), '') $$;
+
+alter table public.video_library
+    add column if not exists search_tsv tsvector generated always as (
+        setweight(to_tsvector('portuguese', public.immutable_unaccent(coalesce(acao, ''))), 'A') ||
+        setweight(to_tsvector('portuguese', public.immutable_unaccent(public.video_tags_text(tags))), 'B') ||
+        setweight(to_tsvector('portuguese', public.immutable_unaccent(coalesce(descricao, ''))), 'C') ||
+        setweight(to_tsvector('portuguese', public.immutable_unaccent(coalesce(emocao, ''))), 'C')
+    ) stored,
+    add column if not exists search_text text generated always as (
+        lower(public.immutable_unaccent(
+            coalesce(acao, '') || ' ' || coalesce(descricao, '') || ' ' ||
+            coalesce(emocao, '') || ' ' || public.video_tags_text(tags)))
+    ) stored;
+
+create index if not exists video_library_search_tsv_idx on public.video_library using gin (search_tsv);
+create index if not exists video_library_search_trgm_idx on public.video_library using gin (search_text gin_trgm_ops);
+
+-- Top-k ids with scores on the same scale as the Python scorer (exact acao hit ~ 10).
+-- Words are OR-ed like the scorer's partial matches; total_count is the number of matches.
+create or replace function public.search_video_library(query text, match_count int default 24)
+returns table (file_id text, score real, total_count bigint)
+language sql stable as
+$$
+    with q as (
+        select nullif(replace(plainto_tsquery('portuguese', public.immutable_unaccent(query))::text, '&', '|'), '')::tsquery as tsq,
+               lower(public.immutable_unaccent(query)) as plain
+    ), hits as (
+        select v.file_id,
+               (coalesce(ts_rank('{0.1, 0.5, 0.7, 1.0}', v.search_tsv, q.tsq), 0) * 10
+                + word_similarity(q.plain, v.search_text) * 5)::real as score
+        from public.video_library v, q
+        where (q.tsq is not null and v.search_tsv @@ q.tsq) or q.plain <% v.search_text
+    )
+    select hits.file_id, hits.score, count(*) over () as total_count
+    from hits
+    order by hits.score desc
+    limit match_count
+$$;
+
+grant execute on function public.search_video_library(text, int) to anon, authenticated;
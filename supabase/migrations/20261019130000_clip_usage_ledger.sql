@@ -0,0 +1,52 @@
+-- Append-only clip usage ledger with server-side freshness.
+-- One row per clip per confirmed montage; video_library.last_used_at is kept
+-- in sync for older readers but is no longer the source of truth.
+
+create table if not exists public.clip_usage (
+    id bigint generated always as identity primary key,
+    file_id text not null references public.video_library (file_id) on delete cascade,
+    used_at timestamptz not null default now(),
+    project text
+);
+
+create index if not exists clip_usage_file_id_used_at_idx on public.clip_usage (file_id, used_at desc);
+create index if not exists clip_usage_used_at_idx on public.clip_usage (used_at desc);
+
+-- Seed the ledger with the single timestamp each clip had so far
+insert into public.clip_usage (file_id, used_at)
+select v.file_id, v.last_used_at
+from public.video_library v
+where v.last_used_at is not null
+  and not exists (select 1 from public.clip_usage u where u.file_id = v.file_id);
+
+-- Penalty per clip = sum over its uses of 0.5 ^ (age / half-life): recent uses
+-- weigh ~1, old ones fade, and frequently used clips accumulate.
+create or replace function public.clip_usage_penalties(half_life_days real default 14, window_days int default 180)
+returns table (file_id text, penalty real, uses bigint, last_used_at timestamptz)
+language sql stable as
+$$
+    select u.file_id,
+           sum(power(0.5, extract(epoch from now() - u.used_at) / (half_life_days * 86400)))::real as penalty,
+           count(*) as uses,
+           max(u.used_at) as last_used_at
+    from public.clip_usage u
+    where u.used_at > now() - make_interval(days => window_days)
+    group by u.file_id
+$$;
+
+-- The `match_count` freshest indexed clips (lowest penalty first, never-used clips first of all)
+create or replace function public.fresh_clip_candidates(match_count int default 500, half_life_days real default 14)
+returns setof public.video_library
+language sql stable as
+$$
+    select v.*
+    from public.video_library v
+    left join public.clip_usage_penalties(half_life_days) p on p.file_id = v.file_id
+    where v.acao is not null and v.acao <> 'None' and v.emocao is not null and v.emocao <> 'None'
+    order by coalesce(p.penalty, 0), p.last_used_at nulls first, v.file_name
+    limit match_count
+$$;
+
+grant select, insert on public.clip_usage to anon, authenticated;
+grant execute on function public.clip_usage_penalties(real, int) to anon, authenticated;
+grant execute on function public.fresh_clip_candidates(int, real) to anon, authenticated;
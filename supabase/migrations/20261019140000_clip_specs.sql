@@ -0,0 +1,46 @@
+-- Technical clip specs captured during sync (ffprobe on the download already made for
+-- frames, or Drive's videoMediaMetadata), so matching and search can drop clips that
+-- are too short or in the wrong orientation before scoring them.
+-- Existing rows are backfilled from Drive metadata by the next sync (Group 3).
+
+alter table public.video_library
+    add column if not exists duration_s real,
+    add column if not exists width int,
+    add column if not exists height int,
+    add column if not exists orientation text check (orientation in ('horizontal', 'vertical', 'quadrado')),
+    add column if not exists fps real,
+    add column if not exists size_bytes bigint;
+
+create index if not exists video_library_orientation_duration_idx on public.video_library (orientation, duration_s);
+create index if not exists video_library_duration_idx on public.video_library (duration_s);
+
+-- Same ranking as before, with optional spec filters applied before scoring.
+-- Clips whose specs were never captured always pass, like matching.fits_specs.
+drop function if exists public.search_video_library(text, int);
+
+create or replace function public.search_video_library(
+    query text, match_count int default 24, orientation text default null, min_duration real default null)
+returns table (file_id text, score real, total_count bigint)
+language sql stable as
+$$
+    with q as (
+        select nullif(replace(plainto_tsquery('portuguese', public.immutable_unaccent(query))::text, '&', '|'), '')::tsquery as tsq,
+               lower(public.immutable_unaccent(query)) as plain
+    ), hits as (
+        select v.file_id,
+               (coalesce(ts_rank('{0.1, 0.5, 0.7, 1.0}', v.search_tsv, q.tsq), 0) * 10
+                + word_similarity(q.plain, v.search_text) * 5)::real as score
+        from public.video_library v, q
+        where ((q.tsq is not null and v.search_tsv @@ q.tsq) or q.plain <% v.search_text)
+          and (search_video_library.orientation is null or v.orientation is null
+               or v.orientation = search_video_library.orientation)
+          and (search_video_library.min_duration is null or v.duration_s is null
+               or v.duration_s >= search_video_library.min_duration)
+    )
+    select hits.file_id, hits.score, count(*) over () as total_count
+    from hits
+    order by hits.score desc
+    limit match_count
+$$;
+
+grant execute on function public.search_video_library(text, int, text, real) to anon, authenticated;
@@ -0,0 +1,58 @@
+-- Sharded sync (sync_shards.py): per-file leases so concurrent workers never index
+-- the same clip, and a shared sequence for the new clip names (0042.mp4).
+
+create table if not exists public.sync_leases (
+    file_id text primary key,
+    worker text not null,
+    expires_at timestamptz not null
+);
+
+create index if not exists sync_leases_worker_idx on public.sync_leases (worker);
+
+-- Returns the ids now leased to `worker_id`: free, expired or already its own, and not
+-- indexed yet (so a worker working from an old listing can't redo a finished clip).
+-- A concurrent claim of the same id waits on the row and then sees the other lease.
+create or replace function public.claim_sync_leases(worker_id text, file_ids text[], ttl_s int default 900)
+returns table (file_id text)
+language sql volatile as
+$$
+    insert into public.sync_leases as l (file_id, worker, expires_at)
+    select f, worker_id, now() + make_interval(secs => ttl_s)
+    from unnest(file_ids) as f
+    where not exists (
+        select 1 from public.video_library v
+        where v.file_id = f
+          and coalesce(v.acao, 'None') <> 'None' and coalesce(v.emocao, 'None') <> 'None')
+    on conflict on constraint sync_leases_pkey do update
+        set worker = excluded.worker, expires_at = excluded.expires_at
+        where l.expires_at < now() or l.worker = excluded.worker
+    returning l.file_id
+$$;
+
+create or replace function public.release_sync_leases(worker_id text, file_ids text[])
+returns void
+language sql volatile as
+$$
+    delete from public.sync_leases l where l.worker = worker_id and l.file_id = any(file_ids)
+$$;
+
+create sequence if not exists public.video_clip_number_seq;
+
+-- Continue after the highest numeric name already in the library
+select setval('public.video_clip_number_seq',
+              coalesce((select max(split_part(file_name, '.', 1)::bigint) from public.video_library
+                        where split_part(file_name, '.', 1) ~ '^[0-9]+$'), 0) + 1,
+              false);
+
+create or replace function public.reserve_clip_numbers(n int)
+returns table (clip_number bigint)
+language sql volatile as
+$$
+    select nextval('public.video_clip_number_seq') from generate_series(1, n)
+$$;
+
+grant select, insert, update, delete on public.sync_leases to anon, authenticated;
+grant usage on sequence public.video_clip_number_seq to anon, authenticated;
+grant execute on function public.claim_sync_leases(text, text[], int) to anon, authenticated;
+grant execute on function public.release_sync_leases(text, text[]) to anon, authenticated;
+grant execute on function public.reserve_clip_numbers(int) to anon, authenticated;
@@ -0,0 +1,35 @@
+-- LLM token and cost accounting (llm_costs.py): one row per sync run or storyboard and
+-- per stage/engine/model/prompt version, so spend can be budgeted and a prompt or
+-- frame-count change compared against the previous version.
+
+create table if not exists public.llm_usage (
+    id bigint generated always as identity primary key,
+    created_at timestamptz not null default now(),
+    run_kind text not null check (run_kind in ('sync', 'storyboard', 'search')),
+    run_ref text,
+    stage text not null,
+    engine text not null,
+    model text not null,
+    prompt_version text,
+    calls int not null default 0,
+    prompt_tokens bigint not null default 0,
+    completion_tokens bigint not null default 0,
+    image_tokens bigint not null default 0,
+    latency_s real not null default 0,
+    cost_usd numeric(12, 6) not null default 0
+);
+
+create index if not exists llm_usage_created_at_idx on public.llm_usage (created_at desc);
+create index if not exists llm_usage_run_idx on public.llm_usage (run_kind, run_ref);
+
+-- Daily spend per stage and model, for budgeting
+create or replace view public.llm_usage_daily as
+select date_trunc('day', created_at) as day, run_kind, stage, engine, model, prompt_version,
+       sum(calls) as calls, sum(prompt_tokens) as prompt_tokens, sum(completion_tokens) as completion_tokens,
+       sum(image_tokens) as image_tokens, sum(cost_usd) as cost_usd,
+       sum(latency_s) / nullif(sum(calls), 0) as avg_latency_s
+from public.llm_usage
+group by 1, 2, 3, 4, 5, 6;
+
+grant select, insert on public.llm_usage to anon, authenticated;
+grant select on public.llm_usage_daily to anon, authenticated;
@@ -0,0 +1,7 @@
+-- Perceptual hash of the sync frames (phash.py): dHash of each frame, concatenated,
+-- as hex. The app keeps it in an in-memory BK-tree for "more like this" and the
+-- matcher penalizes near-duplicates of clips already in the storyboard.
+-- Existing clips: python sync_cli.py --backfill-phash
+
+alter table public.video_library
+    add column if not exists phash text check (phash ~ '^[0-9a-f]+$');
@@ -0,0 +1,69 @@
+-- Candidate and penalty RPCs driven by the clip_usage(used_at) index instead of a
+-- left join over all of video_library:
+--   * clip_usage_penalties aggregates only the uses inside the window and returns
+--     the `match_count` most penalized clips;
+--   * fresh_clip_candidates walks an index of indexed clips by file_name, skips the
+--     recently used ones with an index probe, and stops at `match_count`; only when
+--     that is not enough are the least penalized recent clips appended.
+
+drop function if exists public.clip_usage_penalties(real, int);
+drop function if exists public.fresh_clip_candidates(int, real);
+
+create index if not exists video_library_indexed_name_idx on public.video_library (file_name)
+    where acao is not null and acao <> 'None' and emocao is not null and emocao <> 'None';
+
+create or replace function public.clip_usage_penalties(half_life_days real default 14, window_days int default 180,
+                                                       match_count int default 1000)
+returns table (file_id text, penalty real, uses bigint, last_used_at timestamptz)
+language sql stable as
+$$
+    select u.file_id,
+           sum(power(0.5, extract(epoch from now() - u.used_at) / (half_life_days * 86400)))::real as penalty,
+           count(*) as uses,
+           max(u.used_at) as last_used_at
+    from public.clip_usage u
+    where u.used_at > now() - make_interval(days => window_days)
+    group by u.file_id
+    order by penalty desc
+    limit match_count
+$$;
+
+create or replace function public.fresh_clip_candidates(match_count int default 500, half_life_days real default 14,
+                                                        window_days int default 180)
+returns setof public.video_library
+language plpgsql stable as
+$$
+declare
+    fresh_count int;
+begin
+    -- Clips not used inside the window, in file_name order
+    return query
+        select v.*
+        from public.video_library v
+        where v.acao is not null and v.acao <> 'None' and v.emocao is not null and v.emocao <> 'None'
+          and not exists (select 1 from public.clip_usage u
+                          where u.file_id = v.file_id and u.used_at > now() - make_interval(days => window_days))
+        order by v.file_name
+        limit match_count;
+    get diagnostics fresh_count = row_count;
+    if fresh_count >= match_count then
+        return;
+    end if;
+    -- Small libraries: fill up with the least penalized recent clips
+    return query
+        select v.*
+        from (select u.file_id,
+                     sum(power(0.5, extract(epoch from now() - u.used_at) / (half_life_days * 86400))) as penalty,
+                     max(u.used_at) as last_used_at
+              from public.clip_usage u
+              where u.used_at > now() - make_interval(days => window_days)
+              group by u.file_id) p
+        join public.video_library v on v.file_id = p.file_id
+        where v.acao is not null and v.acao <> 'None' and v.emocao is not null and v.emocao <> 'None'
+        order by p.penalty, p.last_used_at, v.file_name
+        limit match_count - fresh_count;
+end
+$$;
+
+grant execute on function public.clip_usage_penalties(real, int, int) to anon, authenticated;
+grant execute on function public.fresh_clip_candidates(int, real, int) to anon, authenticated;
@@ -0,0 +1,22 @@
+-- Last write time per clip, so readers can tell the library changed with one
+-- indexed probe (newest updated_at + row count) instead of re-reading the table.
+
+alter table public.video_library
+    add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists video_library_updated_at_idx on public.video_library (updated_at desc);
+
+create or replace function public.touch_updated_at()
+returns trigger
+language plpgsql as
+$$
+begin
+    new.updated_at := now();
+    return new;
+end
+$$;
+
+drop trigger if exists video_library_touch_updated_at on public.video_library;
+create trigger video_library_touch_updated_at
+    before update on public.video_library
+    for each row execute function public.touch_updated_at();
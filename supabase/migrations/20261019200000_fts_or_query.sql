@@ -0,0 +1,32 @@
+-- The OR query was built by rewriting plainto_tsquery's text ('&' -> '|'), which
+-- breaks on phrase operators (<->) and quoted lexemes. The lexemes are now taken
+-- from the query's tsvector and joined with '|' explicitly, each one quoted so
+-- punctuation in the search text stays literal. Ranking and filters are unchanged.
+
+create or replace function public.search_video_library(
+    query text, match_count int default 24, orientation text default null, min_duration real default null)
+returns table (file_id text, score real, total_count bigint)
+language sql stable as
+$$
+    with q as (
+        select (select nullif(string_agg('''' || replace(replace(t.lexeme, '\', '\\'), '''', '''''') || '''', ' | '), '')
+                from unnest(to_tsvector('portuguese', public.immutable_unaccent(query))) t)::tsquery as tsq,
+               lower(public.immutable_unaccent(query)) as plain
+    ), hits as (
+        select v.file_id,
+               (coalesce(ts_rank('{0.1, 0.5, 0.7, 1.0}', v.search_tsv, q.tsq), 0) * 10
+                + word_similarity(q.plain, v.search_text) * 5)::real as score
+        from public.video_library v, q
+        where ((q.tsq is not null and v.search_tsv @@ q.tsq) or q.plain <% v.search_text)
+          and (search_video_library.orientation is null or v.orientation is null
+               or v.orientation = search_video_library.orientation)
+          and (search_video_library.min_duration is null or v.duration_s is null
+               or v.duration_s >= search_video_library.min_duration)
+    )
+    select hits.file_id, hits.score, count(*) over () as total_count
+    from hits
+    order by hits.score desc
+    limit match_count
+$$;
+
+grant execute on function public.search_video_library(text, int, text, real) to anon, authenticated;
@@ -0,0 +1,14 @@
+-- Lease changes only through the RPCs: the anon key could otherwise update or
+-- delete any worker's lease directly. The functions run with their owner's
+-- rights (security definer, with a fixed search_path); clients keep read access
+-- to see who holds what.
+
+revoke insert, update, delete on public.sync_leases from anon, authenticated;
+
+alter function public.claim_sync_leases(text, text[], int) security definer set search_path = public, pg_temp;
+alter function public.release_sync_leases(text, text[]) security definer set search_path = public, pg_temp;
+
+revoke execute on function public.claim_sync_leases(text, text[], int) from public;
+revoke execute on function public.release_sync_leases(text, text[]) from public;
+grant execute on function public.claim_sync_leases(text, text[], int) to anon, authenticated;
+grant execute on function public.release_sync_leases(text, text[]) to anon, authenticated;
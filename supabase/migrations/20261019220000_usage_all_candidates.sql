@@ -0,0 +1,42 @@
+-- Every indexed clip is a candidate again. Cutting the list at `match_count` in
+-- file_name order dropped clips before the matcher knew how relevant they were;
+-- usage is now only a decayed penalty the matcher applies over the full set.
+--   * clip_usage_penalties still aggregates only the uses inside the used_at
+--     window, and returns all of them unless `match_count` is given;
+--   * fresh_clip_candidates returns all indexed clips (partial index on
+--     video_library), least penalized first, with no limit by default.
+
+drop function if exists public.clip_usage_penalties(real, int, int);
+drop function if exists public.fresh_clip_candidates(int, real, int);
+
+create or replace function public.clip_usage_penalties(half_life_days real default 14, window_days int default 180,
+                                                       match_count int default null)
+returns table (file_id text, penalty real, uses bigint, last_used_at timestamptz)
+language sql stable as
+$$
+    select u.file_id,
+           sum(power(0.5, extract(epoch from now() - u.used_at) / (half_life_days * 86400)))::real as penalty,
+           count(*) as uses,
+           max(u.used_at) as last_used_at
+    from public.clip_usage u
+    where u.used_at > now() - make_interval(days => window_days)
+    group by u.file_id
+    order by penalty desc
+    limit match_count
+$$;
+
+create or replace function public.fresh_clip_candidates(match_count int default null, half_life_days real default 14,
+                                                        window_days int default 180)
+returns setof public.video_library
+language sql stable as
+$$
+    select v.*
+    from public.video_library v
+    left join public.clip_usage_penalties(half_life_days, window_days) p on p.file_id = v.file_id
+    where v.acao is not null and v.acao <> 'None' and v.emocao is not null and v.emocao <> 'None'
+    order by coalesce(p.penalty, 0), p.last_used_at nulls first, v.file_name
+    limit match_count
+$$;
+
+grant execute on function public.clip_usage_penalties(real, int, int) to anon, authenticated;
+grant execute on function public.fresh_clip_candidates(int, real, int) to anon, authenticated;
@@ -0,0 +1,93 @@
+"""Headless library sync, for cron jobs and bigger boxes (no Streamlit, no queue).
+
+    python sync_cli.py --engine Gemini --concurrency 4 --batch-size 50
+    python sync_cli.py --limit 200 --folder-id <pasta> > sync.jsonl
+    python sync_cli.py --proxies        # also cache 360p proxies + posters
+    python sync_cli.py --folder-id A --folder-id B --recursive --shard 2/4   # one of 4 workers
+    python sync_cli.py --dry-run
+    python sync_cli.py --backfill-phash     # hashes for clips indexed before phash existed
+
+Writes one JSON object per line to stdout:
+
+    {"event": "log", "message": "...", "ts": ...}
+    {"event": "progress", "done": 12, "total": 340, "ts": ...}
+    {"event": "costs", "calls": 340, "prompt_tokens": ..., "cost_usd": ..., "by_stage": {...}, "ts": ...}
+    {"event": "summary", "state": "done", "failed": [...], "metrics": {...}, "ts": ...}
+
+Exit code: 0 without failures, 1 when some clips failed, 2 on a critical error.
+"""
+import argparse
+import sys
+import traceback
+
+import metrics
+import sync_shards
+from jsonl_events import emit
+from settings import data_path, source_folders
+
+METRICS_PATH = data_path("metrics.jsonl")
+
+
+def main(argv=None):
+    import library_sync
+
+    parser = argparse.ArgumentParser(description="Sincroniza a biblioteca sem a interface (saída em JSON lines).")
+    parser.add_argument("--engine", choices=["Gemini", "OpenAI"], default="Gemini", help="motor de visão")
+    parser.add_argument("--folder-id", action="append", default=None,
+                        help="pasta do Drive; repita para várias (padrão: FOLDER_IDS/FOLDER_ID dos Secrets)")
+    parser.add_argument("--recursive", action="store_true", help="inclui as subpastas")
+    parser.add_argument("--shard", default=None, help="N/TOTAL: processa só esta parte (um processo ou máquina por parte)")
+    parser.add_argument("--shard-by", choices=sync_shards.SHARD_BY, default="file", help="divide por arquivo ou por pasta de origem")
+    parser.add_argument("--worker", default=None, help="nome do worker nos leases (padrão: host:pid)")
+    parser.add_argument("--concurrency", type=int, default=1, help="clipes analisados ao mesmo tempo")
+    parser.add_argument("--batch-size", type=int, default=library_sync.RENAME_BATCH_SIZE,
+                        help="clipes novos renomeados e gravados por lote")
+    parser.add_argument("--limit", type=int, default=None, help="máximo de clipes enviados à IA nesta execução")
+    parser.add_argument("--max-failures", type=int, default=library_sync.MAX_FAILURES)
+    parser.add_argument("--proxies", action="store_true", help="gera proxies 360p e pôsteres no cache local")
+    parser.add_argument("--dry-run", action="store_true", help="só imprime o plano e a estimativa de custo")
+    parser.add_argument("--backfill-phash", action="store_true",
+                        help="só calcula o hash perceptual dos clipes já indexados que não têm (sem IA)")
+    args = parser.parse_args(argv)
+
+    from clients import get_drive_service, get_supabase_client
+
+    folder_ids = args.folder_id or source_folders()
+    metrics.reset()
+    try:
+        shard = sync_shards.parse_shard(args.shard) if args.shard else None
+        service = get_drive_service()
+        if not service:
+            raise Exception("GOOGLE_TOKEN não encontrado nos Secrets.")
+        supabase = get_supabase_client()
+        if args.dry_run:
+            plan = library_sync.load_plan(service, supabase, folder_ids, args.engine, args.recursive, shard, args.shard_by)
+            emit("plan", **library_sync.plan_summary(plan))
+            return 0
+        if args.backfill_phash:
+            failed_items = library_sync.backfill_hashes(
+                service, supabase, log=lambda msg: emit("log", message=msg),
+                on_progress=lambda done, total: emit("progress", done=done, total=total),
+                concurrency=args.concurrency, limit=args.limit)
+        else:
+            failed_items = library_sync.run_sync(
+                service, supabase, folder_id=folder_ids, vision_engine=args.engine,
+                log=lambda msg: emit("log", message=msg),
+                on_progress=lambda done, total: emit("progress", done=done, total=total),
+                concurrency=args.concurrency, batch_size=args.batch_size, limit=args.limit, proxies=args.proxies,
+                recursive=args.recursive, shard=shard, shard_by=args.shard_by, worker=args.worker,
+                on_costs=lambda summary: emit("costs", **summary), max_failures=args.max_failures,
+            )
+    except Exception as e:
+        traceback.print_exc(file=sys.stderr)
+        emit("summary", state="failed", failed=[{"file": "-", "error": str(e)}], metrics=metrics.snapshot())
+        metrics.export_jsonl(METRICS_PATH, source="cli")
+        return 2
+
+    emit("summary", state="done", failed=failed_items, metrics=metrics.snapshot())
+    metrics.export_jsonl(METRICS_PATH, source="cli")
+    return 1 if failed_items else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
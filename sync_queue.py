@@ -0,0 +1,148 @@
+"""Durable local queue of library sync jobs (SQLite).
+
+The app only enqueues jobs and reads their status records; `sync_worker.py`
+claims them and writes progress, log lines and the failure report back.
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from settings import data_path
+
+QUEUE_PATH = os.environ.get("SOUL_SYNC_QUEUE", "") or data_path("sync_queue.db")
+# A running job whose worker has not written a heartbeat for this long is requeued
+STALE_AFTER_S = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    heartbeat REAL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    summary TEXT,
+    errors TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS sync_job_events (
+    job_id INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_state ON sync_jobs(state, id);
+CREATE INDEX IF NOT EXISTS idx_sync_job_events_job ON sync_job_events(job_id);
+"""
+
+
+def _connect():
+    conn = sqlite3.connect(QUEUE_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['errors'] = json.loads(job['errors'])
+    job['summary'] = json.loads(job['summary']) if job['summary'] else {}
+    return job
+
+
+def enqueue_job(params):
+    """Adds a sync job and returns its id."""
+    with _db() as conn:
+        cur = conn.execute(
+            "INSERT INTO sync_jobs (params, created_at) VALUES (?, ?)",
+            (json.dumps(params), datetime.now().isoformat()))
+        return cur.lastrowid
+
+
+def claim_next_job(worker):
+    """Atomically marks the oldest queued job as running for `worker`."""
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE sync_jobs SET state = 'queued', worker = NULL WHERE state = 'running' AND heartbeat < ?",
+            (time.time() - STALE_AFTER_S,))
+        row = conn.execute("SELECT id FROM sync_jobs WHERE state = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE sync_jobs SET state = 'running', worker = ?, started_at = ?, heartbeat = ? WHERE id = ?",
+            (worker, datetime.now().isoformat(), time.time(), row['id']))
+        conn.execute("COMMIT")
+        return get_job(row['id'])
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def update_job(job_id, **fields):
+    """Writes progress fields (done, total, message, errors, summary) and a heartbeat."""
+    for key in ('errors', 'summary'):
+        if key in fields: fields[key] = json.dumps(fields[key])
+    fields['heartbeat'] = time.time()
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    with _db() as conn:
+        conn.execute(f"UPDATE sync_jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+
+def log_event(job_id, message):
+    with _db() as conn:
+        conn.execute("INSERT INTO sync_job_events (job_id, ts, message) VALUES (?, ?, ?)",
+                     (job_id, datetime.now().isoformat(), message))
+        conn.execute("UPDATE sync_jobs SET message = ?, heartbeat = ? WHERE id = ?", (message, time.time(), job_id))
+
+
+def finish_job(job_id, state, errors=None, summary=None):
+    update_job(job_id, state=state, finished_at=datetime.now().isoformat(),
+               errors=errors or [], summary=summary or {})
+
+
+def get_job(job_id):
+    with _db() as conn:
+        return _row_to_job(conn.execute("SELECT * FROM sync_jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def latest_job():
+    with _db() as conn:
+        return _row_to_job(conn.execute("SELECT * FROM sync_jobs ORDER BY id DESC LIMIT 1").fetchone())
+
+
+def job_events(job_id, limit=50):
+    """Most recent log lines of a job, oldest first."""
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT ts, message FROM sync_job_events WHERE job_id = ? ORDER BY rowid DESC LIMIT ?",
+            (job_id, limit)).fetchall()
+    return [dict(r) for r in reversed(rows)]
+
+
+def has_active_job():
+    with _db() as conn:
+        return conn.execute("SELECT 1 FROM sync_jobs WHERE state IN ('queued', 'running') LIMIT 1").fetchone() is not None
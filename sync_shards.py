@@ -0,0 +1,146 @@
+"""Splitting one library sync across worker processes or machines.
+
+    python sync_cli.py --folder-id A --folder-id B --recursive --shard 1/3    # box 1
+    python sync_cli.py --folder-id A --folder-id B --recursive --shard 2/3    # box 2 ...
+
+Every worker lists the same folders and keeps the clips whose shard key (the
+file id, or the configured folder it was found under with `--shard-by folder`)
+hashes to its shard. Before a clip is sent to the vision engine it is claimed
+in small chunks through `claim_sync_leases` (supabase/migrations; clients
+can't write the lease table directly) and renewed while it waits, so two
+workers never index the same file, even with overlapping shards, restarts or
+several unsharded runs at once. New clip numbers come from a database sequence
+instead of each worker's own count.
+
+Without the migration, shards still split the work; leases are skipped and
+numbers continue from the worker's own view of the library.
+"""
+import os
+import socket
+import time
+import zlib
+
+import metrics
+from clients import not_deployed
+
+# Held leases are renewed every third of the TTL while the sync runs; expired ones can be reclaimed
+LEASE_TTL_S = 900
+LEASE_CHUNK = 8
+SHARD_BY = ("file", "folder")
+
+_rpc = {"leases": None, "numbers": None}
+
+
+def default_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def parse_shard(text):
+    """`"2/4"` (1-based, as typed on the CLI) -> `(1, 4)`."""
+    try:
+        index, count = (int(part) for part in str(text).split("/"))
+    except ValueError:
+        raise Exception(f"Shard inválido: {text!r} (use N/TOTAL, ex.: 1/4)")
+    if not 1 <= index <= count:
+        raise Exception(f"Shard inválido: {text!r} (N deve estar entre 1 e {count})")
+    return index - 1, count
+
+
+def in_shard(key, shard):
+    """Stable across processes and machines (unlike `hash()`)."""
+    if not shard:
+        return True
+    index, count = shard
+    return zlib.crc32(str(key).encode()) % count == index
+
+
+def select(drive_files, db_files, shard, by="file"):
+    """This shard's slice of the Drive listing and of the library rows: `(drive_files, db_files)`.
+
+    With `by="folder"`, library rows go with the folder their file was listed
+    under, or by file id when it is no longer listed.
+    """
+    if not shard:
+        return drive_files, db_files
+    folder_of = {f['id']: f.get('source_folder', f['id']) for f in drive_files}
+    key = (lambda file_id: folder_of.get(file_id, file_id)) if by == "folder" else (lambda file_id: file_id)
+    return ([f for f in drive_files if in_shard(key(f['id']), shard)],
+            [r for r in db_files if in_shard(key(r['file_id']), shard)])
+
+
+def _call(supabase, kind, name, params):
+    """RPC result, or None when the shards migration is not deployed (remembered per process)."""
+    if _rpc[kind] is False:
+        return None
+    try:
+        with metrics.span("supabase.lease"):
+            data = supabase.rpc(name, params).execute().data
+    except Exception as e:
+        if not not_deployed(e): raise
+        _rpc[kind] = False
+        return None
+    _rpc[kind] = True
+    return data
+
+
+class Leases:
+    """Claims clips for one worker just before they are analyzed."""
+
+    def __init__(self, supabase, worker=None, ttl_s=LEASE_TTL_S):
+        self.supabase, self.worker, self.ttl_s = supabase, worker or default_worker(), ttl_s
+        self.held = set()
+        # When the oldest held lease was last (re)claimed
+        self.renewed_at = None
+
+    def claim(self, file_ids):
+        """Subset of `file_ids` now leased to this worker (all of them before the migration)."""
+        data = _call(self.supabase, "leases", "claim_sync_leases",
+                     {"worker_id": self.worker, "file_ids": list(file_ids), "ttl_s": self.ttl_s})
+        claimed = set(file_ids) if data is None else {r['file_id'] for r in data}
+        if claimed and self.renewed_at is None:
+            self.renewed_at = time.monotonic()
+        self.held.update(claimed)
+        if len(claimed) < len(file_ids):
+            metrics.incr("sync.lease_conflicts", len(file_ids) - len(claimed))
+        return claimed
+
+    def filter(self, files, key, on_skip):
+        """Yields the claimed files, `LEASE_CHUNK` claims at a time; `on_skip(f)` for the others."""
+        files = list(files)
+        for start in range(0, len(files), LEASE_CHUNK):
+            chunk = files[start:start + LEASE_CHUNK]
+            claimed = self.claim([key(f) for f in chunk])
+            for f in chunk:
+                if key(f) in claimed:
+                    yield f
+                else:
+                    on_skip(f)
+
+    def renew(self):
+        """Re-claims the held leases once a third of the TTL has passed since they were claimed.
+
+        Called as clips are processed, so clips analyzed long ago and still
+        waiting for their batch write don't lose their lease. Clips already
+        indexed are left out by the RPC.
+        """
+        if not self.held or not _rpc["leases"] or time.monotonic() - self.renewed_at < self.ttl_s / 3:
+            return
+        _call(self.supabase, "leases", "claim_sync_leases",
+              {"worker_id": self.worker, "file_ids": sorted(self.held), "ttl_s": self.ttl_s})
+        self.renewed_at = time.monotonic()
+        metrics.incr("sync.lease_renewals")
+
+    def release_all(self):
+        """Releases every lease; clips indexed meanwhile can't be claimed again anyway."""
+        if self.held and _rpc["leases"]:
+            _call(self.supabase, "leases", "release_sync_leases", {"worker_id": self.worker, "file_ids": sorted(self.held)})
+        self.held.clear()
+        self.renewed_at = None
+
+
+def reserve_numbers(supabase, n, last_num):
+    """`n` new sequential clip numbers from the shared sequence, or after `last_num` without it."""
+    data = _call(supabase, "numbers", "reserve_clip_numbers", {"n": n})
+    if data is None:
+        return list(range(last_num + 1, last_num + n + 1))
+    return sorted(int(r['clip_number']) for r in data)
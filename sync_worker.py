@@ -0,0 +1,95 @@
+"""Background worker that runs queued library sync jobs.
+
+Start it next to the app (same directory, same secrets):
+
+    python sync_worker.py            # keep polling the queue
+    python sync_worker.py --once     # run at most one job and exit
+
+Jobs with `"dry_run": true` only build the plan (`library_sync.load_plan`) and
+store its `plan_summary` in the job summary under "plan"; no vision calls.
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+import traceback
+
+import metrics
+import sync_queue
+from settings import data_path, source_folders
+
+METRICS_PATH = data_path("metrics.jsonl")
+
+
+def run_job(job, worker=None):
+    # Heavy clients are imported here so an idle worker stays light
+    from clients import get_drive_service, get_supabase_client
+    from library_sync import load_plan, plan_summary, run_sync
+
+    job_id = job['id']
+    params = job['params']
+    dry_run = params.get('dry_run', False)
+    sync_queue.log_event(job_id, "🧪 Comparando Drive e Banco..." if dry_run else "🔍 Sincronizando com Google Drive...")
+    metrics.reset()
+    costs = {}
+    folder_ids = params.get('folder_ids') or params.get('folder_id') or source_folders()
+    shard = tuple(params['shard']) if params.get('shard') else None
+    try:
+        service = get_drive_service()
+        if not service:
+            raise Exception("GOOGLE_TOKEN não encontrado nos Secrets.")
+        if dry_run:
+            plan = plan_summary(load_plan(service, get_supabase_client(), folder_ids, params.get('engine', "Gemini"),
+                                          params.get('recursive', False), shard, params.get('shard_by', "file")))
+            sync_queue.log_event(job_id, f"✅ Plano pronto: {plan['total']} itens, ~US$ {plan['estimated_cost_usd']:.2f}")
+            sync_queue.finish_job(job_id, "done", summary={"plan": plan, "metrics": metrics.snapshot()})
+            return
+        failed_items = run_sync(
+            service, get_supabase_client(),
+            folder_id=folder_ids,
+            vision_engine=params.get('engine', "Gemini"),
+            log=lambda msg: sync_queue.log_event(job_id, msg),
+            on_progress=lambda done, total: sync_queue.update_job(job_id, done=done, total=total),
+            concurrency=params.get('concurrency', 1), limit=params.get('limit'), proxies=params.get('proxies', False),
+            recursive=params.get('recursive', False), shard=shard,
+            shard_by=params.get('shard_by', "file"), worker=worker,
+            run_ref=f"job-{job_id}", on_costs=lambda summary: costs.update(summary),
+        )
+    except Exception as e:
+        sync_queue.log_event(job_id, f"❌ Erro crítico: {e}")
+        sync_queue.finish_job(job_id, "failed", errors=[{"file": "-", "error": str(e)}], summary={"metrics": metrics.snapshot(), "llm": costs})
+        metrics.export_jsonl(METRICS_PATH, job=job_id)
+        traceback.print_exc()
+        return
+
+    if failed_items:
+        sync_queue.log_event(job_id, f"Sincronização Finalizada com {len(failed_items)} falhas.")
+    else:
+        sync_queue.log_event(job_id, "✅ Sincronização Finalizada com Sucesso!")
+    sync_queue.finish_job(job_id, "done", errors=failed_items, summary={"metrics": metrics.snapshot(), "llm": costs})
+    metrics.export_jsonl(METRICS_PATH, job=job_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Executa os jobs de sincronização da biblioteca.")
+    parser.add_argument("--once", action="store_true", help="processa no máximo um job e sai")
+    parser.add_argument("--poll-interval", type=float, default=3.0, help="segundos entre consultas à fila")
+    args = parser.parse_args(argv)
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Worker {worker} aguardando jobs em {sync_queue.QUEUE_PATH}", flush=True)
+    while True:
+        job = sync_queue.claim_next_job(worker)
+        if job:
+            print(f"Job #{job['id']} iniciado ({job['params']})", flush=True)
+            run_job(job, worker)
+            print(f"Job #{job['id']} finalizado", flush=True)
+        if args.once:
+            return 0
+        if not job:
+            time.sleep(args.poll_interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules are flat at the repo root, like `streamlit_app.py` imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,49 @@
+import drive_batch
+import fakes
+
+
+def _drive(clips=250):
+    config = fakes.FakeConfig(clips=clips, latency_s={})
+    drive = fakes.FakeDrive(config, fakes.Faults(config))
+    batches = []
+    new_batch = drive.new_batch_http_request
+
+    def counting(callback=None):
+        batch = new_batch(callback)
+        batches.append(batch)
+        return batch
+    drive.new_batch_http_request = counting
+    return drive, batches
+
+
+def test_rename_files_in_batches_of_the_limit_with_per_file_errors():
+    drive, batches = _drive()
+    new_names = {fid: f"{n:04d}.mp4" for n, fid in enumerate(drive.files_by_id)}
+    new_names["sumiu"] = "9999.mp4"
+    renamed, errors = drive_batch.rename_files(drive, new_names)
+    assert [len(b.calls) for b in batches] == [100, 100, 51]
+    assert renamed == set(drive.files_by_id) and set(errors) == {"sumiu"}
+    assert errors["sumiu"].startswith("Drive 404")
+    assert drive.files_by_id["fake-0000007"]["name"] == "0007.mp4"
+
+
+def test_get_files_metadata_keyed_by_id():
+    drive, batches = _drive(clips=3)
+    results, errors = drive_batch.get_files_metadata(drive, ["fake-0000000", "fake-0000002", "sumiu"])
+    assert len(batches) == 1
+    assert set(results) == {"fake-0000000", "fake-0000002"} and set(errors) == {"sumiu"}
+    assert results["fake-0000002"]["md5Checksum"] == drive.files_by_id["fake-0000002"]["md5Checksum"]
+
+
+def test_failed_batch_call_fails_only_its_own_items(monkeypatch):
+    drive, batches = _drive(clips=150)
+    execute = fakes._DriveBatch.execute
+
+    def flaky(batch):
+        if len(batches) == 2:
+            raise Exception("Connection reset")
+        execute(batch)
+    monkeypatch.setattr(fakes._DriveBatch, "execute", flaky)
+    results, errors = drive_batch.get_files_metadata(drive, list(drive.files_by_id))
+    assert len(results) == 100
+    assert set(errors) == set(list(drive.files_by_id)[100:]) and set(errors.values()) == {"Connection reset"}
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import requests
+
+from drive_http import PooledHttp
+
+
+class _Credentials:
+    def __init__(self):
+        self.token, self.valid, self.refreshes, self.lock = "t0", False, 0, threading.Lock()
+
+    def refresh(self, request):
+        # Two threads refreshing at once would be caught here
+        assert self.lock.acquire(blocking=False)
+        time.sleep(0.01)
+        self.refreshes += 1
+        self.token, self.valid = f"t{self.refreshes}", True
+        self.lock.release()
+
+    def apply(self, headers):
+        headers["authorization"] = f"Bearer {self.token}"
+
+
+class _Adapter(requests.adapters.BaseAdapter):
+    """Answers 401 to `revoked` tokens and echoes the token otherwise."""
+
+    def __init__(self, revoked=()):
+        super().__init__()
+        self.revoked, self.seen = set(revoked), []
+
+    def send(self, request, **kwargs):
+        token = request.headers["authorization"].split()[-1]
+        self.seen.append(token)
+        resp = requests.Response()
+        resp.status_code, resp._content, resp.request = (401 if token in self.revoked else 200), token.encode(), request
+        return resp
+
+    def close(self):
+        pass
+
+
+def _http(adapter):
+    credentials = _Credentials()
+    http = PooledHttp(credentials)
+    http._session.mount("https://", adapter)
+    return http, credentials
+
+
+def _in_threads(http, n=16):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(http.request("https://drive.test/files")))
+               for _ in range(n)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return results
+
+
+def test_expired_token_is_refreshed_once_for_all_threads():
+    adapter = _Adapter()
+    http, credentials = _http(adapter)
+    results = _in_threads(http)
+    assert credentials.refreshes == 1
+    assert {content for _, content in results} == {b"t1"} and len(adapter.seen) == 16
+    assert {resp.status for resp, _ in results} == {200}
+
+
+def test_rejected_token_is_refreshed_once_and_retried():
+    adapter = _Adapter(revoked={"t1"})
+    http, credentials = _http(adapter)
+    http._authorize({})
+    results = _in_threads(http)
+    assert credentials.refreshes == 2
+    assert {content for _, content in results} == {b"t2"}
@@ -0,0 +1,99 @@
+import pytest
+
+import engine_router
+import engines
+from engine_router import State
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+@pytest.fixture(autouse=True)
+def circuits(monkeypatch):
+    monkeypatch.setattr(engine_router, "FAILOVER", True)
+    engine_router.reset()
+    yield engine_router._circuits
+    engine_router.reset()
+
+
+def _vision(monkeypatch, behaviour):
+    calls = []
+
+    def analyze_vision(image_paths, engine="Gemini", retries=1, log=None, pause_scale=1.0):
+        calls.append(engine)
+        return behaviour[engine]()
+    monkeypatch.setattr(engines, "analyze_vision", analyze_vision)
+    return calls
+
+
+def _raise(error):
+    def call():
+        raise error
+    return call
+
+
+def test_classify_typed_errors():
+    assert engine_router.classify(engines.EngineUnavailable("x")) == "unavailable"
+    assert engine_router.classify(engines.BlockedError("x")) == "blocked"
+    assert engine_router.classify(RateLimited("Too Many Requests")) == "quota"
+    assert engine_router.classify(Exception("429 Resource has been exhausted")) == "quota"
+    assert engine_router.classify(ValueError("JSON inválido")) == "error"
+
+
+def test_quota_errors_open_the_circuit_and_fail_over(monkeypatch, circuits):
+    calls = _vision(monkeypatch, {"Gemini": _raise(RateLimited("quota")), "OpenAI": lambda: {"acao": "andar"}})
+    for _ in range(engine_router.OPEN_AFTER):
+        assert engine_router.analyze_vision([], "Gemini") == ({"acao": "andar"}, "OpenAI")
+    assert circuits["Gemini"].state is State.OPEN
+    calls.clear()
+    engine_router.analyze_vision([], "Gemini")
+    assert calls == ["OpenAI"]
+
+
+def test_half_open_probe_closes_on_success(monkeypatch, circuits):
+    behaviour = {"Gemini": _raise(RateLimited("quota")), "OpenAI": lambda: {"acao": "andar"}}
+    _vision(monkeypatch, behaviour)
+    for _ in range(engine_router.OPEN_AFTER):
+        engine_router.analyze_vision([], "Gemini")
+    circuits["Gemini"].open_until = 0.0
+    behaviour["Gemini"] = lambda: {"acao": "correr"}
+    assert engine_router.analyze_vision([], "Gemini") == ({"acao": "correr"}, "Gemini")
+    assert circuits["Gemini"].state is State.CLOSED
+
+
+def test_failed_probe_reopens_with_longer_cooldown(monkeypatch, circuits):
+    _vision(monkeypatch, {"Gemini": _raise(RateLimited("quota")), "OpenAI": lambda: {"acao": "andar"}})
+    for _ in range(engine_router.OPEN_AFTER):
+        engine_router.analyze_vision([], "Gemini")
+    circuits["Gemini"].open_until = 0.0
+    engine_router.analyze_vision([], "Gemini")
+    assert circuits["Gemini"].state is State.OPEN
+    assert circuits["Gemini"].cooldown_s == 2 * engine_router.COOLDOWN_S
+
+
+def test_missing_key_opens_at_once_and_plain_errors_raise(monkeypatch, circuits):
+    _vision(monkeypatch, {"Gemini": _raise(engines.EngineUnavailable("sem chave")), "OpenAI": _raise(ValueError("ruim"))})
+    with pytest.raises(ValueError):
+        engine_router.analyze_vision([], "Gemini")
+    assert circuits["Gemini"].state is State.OPEN
+    assert circuits["OpenAI"].state is State.CLOSED
+
+
+def _streams(monkeypatch, blocks):
+    def stream(audio_path, script_text, engine="Gemini", log=None):
+        yield from blocks[engine]
+    monkeypatch.setattr(engines, "stream_semantic_storyboard", stream)
+
+
+def test_empty_stream_is_a_failure_and_fails_over(monkeypatch, circuits):
+    _streams(monkeypatch, {"Gemini": [], "OpenAI": [{"timestamp": "00:00"}]})
+    assert list(engine_router.stream_semantic_storyboard("a.mp3", "roteiro", "Gemini")) == [{"timestamp": "00:00"}]
+    assert list(circuits["Gemini"].results) == [False]
+    assert list(circuits["OpenAI"].results) == [True]
+
+
+def test_empty_stream_on_the_last_engine_ends_empty(monkeypatch, circuits):
+    _streams(monkeypatch, {"Gemini": [], "OpenAI": []})
+    assert engine_router.get_semantic_storyboard("a.mp3", "roteiro", "Gemini") is None
+    assert list(circuits["Gemini"].results) == list(circuits["OpenAI"].results) == [False]
@@ -0,0 +1,63 @@
+import json
+
+import engines
+import llm_costs
+from engines import StoryboardStreamParser
+
+BLOCKS = [{"timestamp": "00:00", "script_fragment": "A vida [às vezes] {parece} longa"},
+          {"timestamp": "00:08", "script_fragment": "Cada passo \"conta\"", "elementos_chave": ["estrada", "sol"]}]
+
+
+def _feed(text, size):
+    parser = StoryboardStreamParser()
+    return [b for i in range(0, len(text), size) for b in parser.feed(text[i:i + size])]
+
+
+def test_parser_streams_blocks_in_any_chunking():
+    text = json.dumps({"storyboard": BLOCKS}, ensure_ascii=False)
+    for size in (1, 3, 40, len(text)):
+        assert _feed(text, size) == BLOCKS
+
+
+def test_parser_bare_array_and_fences():
+    assert _feed("```json\n" + json.dumps(BLOCKS) + "\n```", 5) == BLOCKS
+
+
+def test_parser_skips_brackets_in_prose():
+    prose = 'Aqui está o plano [revisado] pedido (veja [1):\n'
+    text = prose + "```json\n" + json.dumps({"storyboard": BLOCKS}) + "\n```\nExemplo: [{\"timestamp\": \"00:01\"}]"
+    assert _feed(text, 7) == BLOCKS
+
+
+def test_parser_payload_after_prose_on_the_same_line():
+    for size in (1, 6, 1000):
+        assert _feed("Aqui está: " + json.dumps(BLOCKS, ensure_ascii=False), size) == BLOCKS
+        assert _feed("Claro! Segue: " + json.dumps({"storyboard": BLOCKS}) + " Bom trabalho.", size) == BLOCKS
+
+
+def test_parser_skips_a_line_without_blocks():
+    assert _feed("[nota]\n" + json.dumps(BLOCKS), 4) == BLOCKS
+
+
+def test_parser_only_takes_top_level_array_objects():
+    nested = {"storyboard": [{"timestamp": "00:00", "cortes": [{"clip": 1}]}]}
+    assert _feed(json.dumps(nested), 2) == nested["storyboard"]
+
+
+def test_stream_cost_recorded_when_consumer_stops_early():
+    read = []
+
+    def open_stream():
+        try:
+            for piece in ('{"storyboard": [', json.dumps(BLOCKS[0]), ",", json.dumps(BLOCKS[1]), "]}"):
+                read.append(piece)
+                yield piece
+        finally:
+            llm_costs.record("storyboard", "OpenAI", "gpt-4o", 100, len(read), 0.1)
+
+    with llm_costs.track("storyboard") as tally:
+        stream = engines._stream_blocks(open_stream, "storyboard.test")
+        assert next(stream) == BLOCKS[0]
+        stream.close()
+    assert tally.summary()['calls'] == 1
+    assert tally.summary()['completion_tokens'] == 2
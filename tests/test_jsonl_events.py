@@ -0,0 +1,14 @@
+import json
+import threading
+
+from jsonl_events import emit
+
+
+def test_emit_writes_whole_json_lines_from_threads(capsys):
+    threads = [threading.Thread(target=lambda i=i: [emit("log", message=f"clipe {i}-{n} ✓" * 50) for n in range(20)])
+               for i in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    lines = capsys.readouterr().out.splitlines()
+    events = [json.loads(line) for line in lines]
+    assert len(events) == 160 and {e['event'] for e in events} == {"log"} and all("ts" in e for e in events)
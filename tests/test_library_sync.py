@@ -0,0 +1,152 @@
+import threading
+import time
+
+import clients
+import engines
+import library_sync
+
+
+def _run(concurrency, stop_after):
+    calls, started, lock = [], [], threading.Lock()
+    failures = []
+
+    def analyze(f):
+        with lock:
+            calls.append(f)
+        time.sleep(0.02)
+        raise Exception(f"falha {f}")
+
+    results = []
+    for f, result, error in library_sync._analyze_in_order(range(20), analyze, concurrency, started.append,
+                                                           lambda: len(failures) >= stop_after):
+        results.append(f)
+        if error is not None: failures.append(f)
+    return calls, started, results
+
+
+def test_analyze_in_order_sequential_stops_starting_clips():
+    calls, started, results = _run(1, 3)
+    assert calls == started == results == [0, 1, 2]
+
+
+def test_analyze_in_order_stop_yields_every_clip_that_ran():
+    calls, started, results = _run(2, 3)
+    # Queued clips are cancelled; whatever reached the vision engine is handed back, in order
+    assert len(calls) < 20
+    assert results == sorted(results) and sorted(calls) == results
+    assert set(results) <= set(started)
+
+
+def test_error_code_from_api_error_and_text():
+    from postgrest.exceptions import APIError
+    e = APIError({"message": "Could not find the 'phash' column of 'video_library' in the schema cache",
+                  "code": "PGRST204", "hint": None, "details": None})
+    assert clients.error_code(e) == clients.MISSING_COLUMN
+    assert clients.error_code(Exception(str(e))) == clients.MISSING_COLUMN
+    assert clients.error_code(Exception("500 Internal Server Error")) is None
+    assert clients.not_deployed(Exception("{'code': 'PGRST202', 'message': 'x'}"))
+    assert not clients.not_deployed(e)
+
+
+def _drive(file_id, size=1000, **extra):
+    return {"id": file_id, "name": f"{file_id}.mp4", "size": str(size), "thumbnailLink": f"thumb-{file_id}", **extra}
+
+
+def _row(file_id, **extra):
+    return {"file_id": file_id, "file_name": f"{file_id}.mp4", "acao": "andar", "emocao": "calma",
+            "thumbnail_link": f"thumb-{file_id}", "duration_s": 3.0, **extra}
+
+
+def test_classify_groups():
+    drive = [_drive("new"), _drive("noai"), _drive("nothumb"), _drive("done")]
+    db = [_row("noai", acao=None), _row("nothumb", thumbnail_link=None), _row("done")]
+    group_1, group_2, group_3 = library_sync.classify(drive, db)
+    assert [f['id'] for f in group_1] == ["new"]
+    assert [f['file_id'] for f in group_2] == ["noai"]
+    assert [f['file_id'] for f in group_3] == ["nothumb"]
+
+
+def test_classify_specs_only_when_drive_has_them():
+    meta = {"videoMediaMetadata": {"width": 1920, "height": 1080, "durationMillis": "4000"}}
+    drive = [_drive("ready", **meta), _drive("processing"), _drive("other")]
+    db = [_row("ready", duration_s=None), _row("processing", duration_s=None), _row("gone", duration_s=None)]
+    _, _, group_3 = library_sync.classify(drive, db)
+    assert [f['file_id'] for f in group_3] == ["ready"]
+    # Older schemas without the specs columns never ask for them
+    row = _row("ready")
+    del row['duration_s']
+    assert not library_sync.needs_specs(row, drive[0])
+
+
+def test_build_plan_estimates():
+    drive = [_drive("a", size=100), _drive("b", size=300), _drive("c")]
+    db = [_row("b", emocao="None"), _row("c", file_name="0041.mp4")]
+    plan = library_sync.build_plan(drive, db, "Gemini")
+    assert (plan['total'], plan['vision_calls'], plan['last_num']) == (2, 2, 41)
+    assert plan['download_bytes'] == 100 + 300
+    assert plan['estimated_cost_usd'] > 0 and plan['estimated_seconds'] > 0
+    summary = library_sync.plan_summary(plan)
+    assert (summary['group_1_count'], summary['group_2_count'], summary['group_3_count']) == (1, 1, 0)
+    assert "drive_info_map" not in summary and "group_1" not in summary
+
+
+def test_classify_overlapping_and_renamed_rows():
+    # Matched by id: a clip renamed in Drive (or by the sync) is never new again
+    drive = [_drive("renamed", name="IMG_0001.mp4"), _drive("both", name="outro.mp4"), _drive("fresh")]
+    db = [_row("renamed", file_name="0007.mp4"),
+          # Missing AI and thumbnail: only the upgrade, which rewrites the thumbnail too
+          _row("both", file_name="0008.mp4", acao=None, thumbnail_link=None),
+          # Gone from Drive but still missing its AI: upgraded by id
+          _row("gone", emocao="None")]
+    group_1, group_2, group_3 = library_sync.classify(drive, db)
+    assert [f['id'] for f in group_1] == ["fresh"]
+    assert [f['file_id'] for f in group_2] == ["both", "gone"]
+    assert group_3 == []
+    plan = library_sync.build_plan(drive, db)
+    assert (plan['total'], plan['last_num']) == (3, 8)
+
+
+def test_build_plan_estimate_totals():
+    mb = 1024 * 1024
+    drive = [_drive("new1", size=40 * mb), _drive("new2", size=20 * mb), _drive("up", size=30 * mb), _drive("thumb", size=10 * mb)]
+    # "gone" has no Drive item: its download is estimated at the average Drive size
+    db = [_row("up", acao=None), _row("gone", acao=None), _row("thumb", thumbnail_link=None)]
+    for engine in ("Gemini", "OpenAI"):
+        costs = library_sync.VISION_COSTS[engine]
+        plan = library_sync.build_plan(drive, db, engine)
+        assert plan['download_bytes'] == (40 + 20 + 30 + 25) * mb
+        assert plan['vision_calls'] == 4
+        assert plan['input_tokens'] == 4 * (costs['prompt_tokens'] + library_sync.FRAMES_PER_CLIP * costs['image_tokens'])
+        assert plan['output_tokens'] == 4 * costs['output_tokens']
+        seconds = (115 * mb / library_sync.DOWNLOAD_BYTES_PER_S
+                   + 4 * (library_sync.FRAMES_PER_CLIP * library_sync.FFMPEG_S_PER_FRAME + costs['latency_s'] + costs['pause_s'])
+                   + 3 * library_sync.DB_WRITE_S + 2 * library_sync.DB_WRITE_S)
+        assert plan['estimated_seconds'] == round(seconds, 1)
+    # The estimate waits as long as a real sync does
+    assert library_sync.VISION_COSTS["Gemini"]['pause_s'] == library_sync.ENGINE_PAUSE_S["Gemini"]
+    assert library_sync.VISION_COSTS["OpenAI"]['pause_s'] == library_sync.ENGINE_PAUSE_S["OpenAI"] + engines.OPENAI_CALL_PAUSE_S
+
+
+def test_backfill_hashes_downloads_when_proxy_has_no_frames(monkeypatch, tmp_path):
+    import fakes
+    import phash
+    import proxy_cache
+    from PIL import Image
+
+    def frames(service, file_id):
+        paths = []
+        for i in range(phash.FRAMES):
+            path = str(tmp_path / f"{file_id}_{i}.jpg")
+            Image.new("RGB", (32, 18), (40 * i, 90, 160)).save(path)
+            paths.append(path)
+        return paths, {}
+
+    downloads = []
+    monkeypatch.setattr(proxy_cache, "cached_frames", lambda file_id, source_md5=None: ([], {}))
+    monkeypatch.setattr(library_sync, "download_frames", lambda service, file_id: downloads.append(file_id) or frames(service, file_id))
+    config = fakes.FakeConfig(latency_s={})
+    db = fakes.FakeSupabase(config, fakes.Faults(config), [_row("a", phash=None)])
+
+    assert library_sync.backfill_hashes(None, db, log=lambda msg: None) == []
+    assert downloads == ["a"]
+    assert phash.parse(db.tables["video_library"]["a"]["phash"]) is not None
@@ -0,0 +1,85 @@
+import contextvars
+import threading
+
+import pytest
+from postgrest.exceptions import APIError
+
+import fakes
+import llm_costs
+
+
+def test_price_by_longest_model_prefix_and_override(monkeypatch):
+    monkeypatch.delenv("LLM_PRICES", raising=False)
+    assert llm_costs.price("gpt-4o-mini-2024-07-18") == llm_costs.PRICES["gpt-4o-mini"]
+    assert llm_costs.price("models/gemini-1.5-flash-002") == llm_costs.PRICES["gemini-1.5-flash"]
+    assert llm_costs.price("modelo-novo", "Gemini") == llm_costs.PRICES[llm_costs.ENGINE_MODELS["Gemini"]]
+    monkeypatch.setenv("LLM_PRICES", '{"gemini-1.5-flash": [1, 2]}')
+    assert llm_costs.cost("gemini-1.5-flash", 1_000_000, 500_000) == 1 + 1
+
+
+def test_each_call_is_accounted_per_stage_engine_model_and_prompt(monkeypatch):
+    monkeypatch.delenv("LLM_PRICES", raising=False)
+    with llm_costs.track("sync", ref=7) as tally:
+        llm_costs.record("vision", "Gemini", "models/gemini-1.5-flash", 1000, 100, 1.5, images=2, prompt="p1")
+        llm_costs.record("vision", "Gemini", "gemini-1.5-flash", 3000, 300, 0.5, images=2, prompt="p1")
+        llm_costs.record("vision", "OpenAI", None, 2000, 0, 2.0, prompt="p1")
+        llm_costs.record("storyboard", "Gemini", "gemini-1.5-flash", 10, 20, 1.0, prompt="p2")
+    # Outside a tally, calls only reach the metrics counters
+    llm_costs.record("vision", "Gemini", "gemini-1.5-flash", 999, 999, 9.0)
+
+    rows = {(r['stage'], r['engine'], r['model']): r for r in tally.rows()}
+    assert len(rows) == 3
+    gemini = rows[("vision", "Gemini", "gemini-1.5-flash")]
+    assert (gemini['calls'], gemini['prompt_tokens'], gemini['completion_tokens']) == (2, 4000, 400)
+    assert gemini['image_tokens'] == 4 * llm_costs.IMAGE_TOKENS["Gemini"] and gemini['latency_s'] == 2.0
+    assert gemini['cost_usd'] == pytest.approx(llm_costs.cost("gemini-1.5-flash", 4000, 400))
+    assert gemini['run_kind'] == "sync" and gemini['run_ref'] == "7"
+    assert gemini['prompt_version'] == llm_costs.prompt_version("p1")
+    assert rows[("vision", "OpenAI", "gpt-4o")]['cost_usd'] == pytest.approx(2000 * 2.50 / 1_000_000)
+
+    summary = tally.summary()
+    assert (summary['calls'], summary['prompt_tokens'], summary['completion_tokens']) == (4, 6010, 420)
+    assert summary['by_stage']['vision']['calls'] == 3 and summary['by_stage']['storyboard']['calls'] == 1
+    merged = llm_costs.merge(summary, None, {"calls": 1, "cost_usd": 0.5, "by_stage": {"storyboard_block": {"calls": 1}}})
+    assert merged['calls'] == 5 and merged['cost_usd'] == pytest.approx(summary['cost_usd'] + 0.5)
+    assert merged['by_stage']['storyboard_block']['calls'] == 1
+
+
+def test_threads_report_only_with_a_copy_of_the_context():
+    with llm_costs.track("sync") as tally:
+        call = lambda: llm_costs.record("vision", "Gemini", "gemini-1.5-flash", 10, 1, 0.1)
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(call,)) for _ in range(8)]
+        threads.append(threading.Thread(target=call))
+        for t in threads: t.start()
+        for t in threads: t.join()
+        with llm_costs.track("storyboard") as inner:
+            call()
+    assert tally.summary()['calls'] == 8 and inner.summary()['calls'] == 1
+
+
+def test_persist_writes_one_row_per_group_and_skips_without_the_table():
+    config = fakes.FakeConfig(latency_s={})
+    db = fakes.FakeSupabase(config, fakes.Faults(config))
+    with llm_costs.track("storyboard", ref="Projeto") as tally:
+        llm_costs.record("storyboard", "Gemini", "gemini-1.5-flash", 10, 20, 1.0)
+        llm_costs.record("storyboard", "Gemini", "gemini-1.5-flash", 10, 20, 1.0)
+    assert llm_costs.persist(db, tally) is True
+    stored = list(db.tables["llm_usage"].values())
+    assert len(stored) == 1 and stored[0]['calls'] == 2 and stored[0]['run_ref'] == "Projeto"
+    assert llm_costs.persist(db, llm_costs.Tally("sync")) is True and len(db.tables["llm_usage"]) == 1
+
+    class Missing:
+        def __init__(self, code):
+            self.code = code
+
+        def table(self, name):
+            return self
+
+        def insert(self, rows):
+            return self
+
+        def execute(self):
+            raise APIError({"message": "x", "code": self.code, "hint": None, "details": None})
+    assert llm_costs.persist(Missing("PGRST205"), tally) is False
+    with pytest.raises(APIError):
+        llm_costs.persist(Missing("23505"), tally)
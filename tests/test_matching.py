@@ -0,0 +1,50 @@
+import catalog
+import matching
+from benchmarks.synthetic import make_library
+
+BLOCKS = [{"timestamp": f"00:{i * 5:02d}", "script_fragment": text, "sugestao_visual_literal": text,
+           "elementos_chave": text.split()[:2], "emocao_alvo": emotion}
+          for i, (text, emotion) in enumerate([("pessoa caminhando na estrada", "esperança"),
+                                               ("mãos rezando ao pôr do sol", "paz"),
+                                               ("criança sorrindo no parque", "alegria")])]
+
+
+def _library():
+    return catalog.Catalog(make_library(300, used_fraction=0))
+
+
+def test_rank_block_agrees_with_match_block():
+    clips = _library()
+    excluded = {clips.rows[0]['file_id'], clips.rows[1]['file_id']}
+    for block in BLOCKS:
+        ranked = matching.rank_block(block, clips, excluded, depth=10)
+        assert len(ranked) == 10
+        assert [s for s, _ in ranked] == sorted((s for s, _ in ranked), reverse=True)
+        assert not excluded & {row['file_id'] for _, row in ranked}
+        assert ranked[0][1]['file_id'] == matching.match_block(block, clips, excluded)['file_id']
+
+
+def test_next_best_skips_taken_and_recent_clips_and_wraps():
+    ranked = [(10 - i, {"file_id": f"c{i}", "file_name": f"{i:04d}.mp4"}) for i in range(5)]
+    plan = [{"file_id": "c1"}, {"file_id": "c2"}]
+    # Row 0 shows c1; c2 is used by row 1 and c3 is recent
+    assert matching.next_best(ranked, plan, 0, recent_ids={"c3"})['file_id'] == "c4"
+    # From the last ranked clip it wraps to the top
+    assert matching.next_best(ranked, [{"file_id": "c4"}], 0)['file_id'] == "c0"
+    # A clip outside the ranking starts from the best one
+    assert matching.next_best(ranked, [{"file_id": "zz"}], 0)['file_id'] == "c0"
+    assert matching.next_best(ranked, plan, 0, recent_ids={"c0", "c3", "c4"}) is None
+
+
+def test_rank_block_reaches_past_many_near_duplicates():
+    block = {"timestamp": "00:00", "script_fragment": "x", "sugestao_visual_literal": "pessoa caminhando na estrada",
+             "elementos_chave": ["pessoa", "estrada"], "emocao_alvo": "paz"}
+    # Near-duplicates score 24 (tag match) and fall to 18 after the penalty; the others score 21
+    dup = {"acao": "pessoa caminhando na estrada", "emocao": "paz", "tags": ["pessoa"], "phash": "0" * 32}
+    rows = [{"file_id": f"d{i}", "file_name": f"d{i}.mp4", **dup} for i in range(30)]
+    rows += [{"file_id": f"o{i}", "file_name": f"o{i}.mp4", "acao": "pessoa caminhando na estrada", "emocao": "paz"} for i in range(8)]
+    clips = catalog.Catalog(rows)
+    # Every top clip is a near-duplicate of the one already used, so the unpenalized ones rank first
+    ranked = matching.rank_block(block, clips, {"d0"}, session_used=["d0"], depth=5)
+    assert [row['file_id'] for _, row in ranked] == [f"o{i}" for i in range(5)]
+    assert matching.rank_block(block, clips, {"d0"}, session_used=["d0"], depth=40)[-1][1]['file_id'] == "d29"
@@ -0,0 +1,60 @@
+import hashlib
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import media
+import metrics
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch, tmp_path):
+    """Records ffmpeg runs; `fail` makes them exit with an error."""
+    state = SimpleNamespace(runs=[], fail=False)
+
+    def run(cmd, **kwargs):
+        state.runs.append(cmd)
+        if state.fail:
+            return SimpleNamespace(returncode=1, stderr="Unknown encoder 'libopus'\n")
+        with open(cmd[-1], "wb") as f:
+            f.write(b"ogg")
+        return SimpleNamespace(returncode=0, stderr="  Duration: 00:01:02.50, start: 0.0\n")
+
+    cache = tmp_path / "cache"
+    cache.joinpath("narration").mkdir(parents=True)
+    monkeypatch.setattr(media, "data_path", lambda *parts: str(cache.joinpath(*parts)))
+    monkeypatch.setattr(media.subprocess, "run", run)
+    monkeypatch.setattr(media, "get_audio_duration", lambda path: 61.0)
+    metrics.reset()
+    return state
+
+
+def _audio(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_narration_cached_by_content_hash(ffmpeg, tmp_path):
+    first = _audio(tmp_path, "a.mp3", b"ID3 narracao")
+    out, duration = media.prepare_narration(first)
+    key = hashlib.sha256(b"ID3 narracao").hexdigest()
+    assert os.path.basename(out) == key + media.NARRATION_EXT and duration == 62.5 and len(ffmpeg.runs) == 1
+
+    # Same bytes under another name: no new ffmpeg pass
+    assert media.prepare_narration(_audio(tmp_path, "copia.mp3", b"ID3 narracao")) == (out, 62.5)
+    assert len(ffmpeg.runs) == 1 and metrics.snapshot()['counters']['audio.cache_hits'] == 1
+
+    # Edited audio at the same path is a new entry
+    second, _ = media.prepare_narration(_audio(tmp_path, "a.mp3", b"ID3 narracao editada"))
+    assert second != out and len(ffmpeg.runs) == 2
+
+
+def test_narration_falls_back_to_the_original(ffmpeg, tmp_path):
+    ffmpeg.fail = True
+    original = _audio(tmp_path, "a.wav", b"RIFF")
+    assert media.prepare_narration(original) == (original, 61.0)
+    # Nothing half-written is left to be served as a cache hit
+    ffmpeg.fail = False
+    assert media.prepare_narration(original)[0] != original and len(ffmpeg.runs) == 2
@@ -0,0 +1,46 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_span_counts_exceptions_as_errors():
+    with pytest.raises(ValueError):
+        with metrics.span("etapa"):
+            raise ValueError("falhou")
+    snap = metrics.snapshot()
+    assert snap["counters"] == {"etapa.errors": 1}
+    assert snap["stages"]["etapa"]["count"] == 1
+
+
+def test_span_ignores_generator_exit_and_reruns():
+    class Rerun(BaseException):
+        """Like Streamlit's script control exceptions."""
+
+    def gen():
+        with metrics.span("stream"):
+            yield 1
+            yield 2
+
+    g = gen()
+    next(g)
+    g.close()
+    with pytest.raises(Rerun):
+        with metrics.span("pagina"):
+            raise Rerun()
+    snap = metrics.snapshot()
+    assert snap["counters"] == {}
+    assert snap["stages"]["stream"]["count"] == snap["stages"]["pagina"]["count"] == 1
+
+
+def test_prometheus_escapes_label_values():
+    metrics.incr('erro "429"\nc:\\tmp')
+    text = metrics.to_prometheus([({"worker": 'w"1'}, metrics.snapshot())])
+    line = next(l for l in text.splitlines() if l.startswith("soul_events_total{"))
+    assert line == 'soul_events_total{name="erro \\"429\\"\\nc:\\\\tmp",worker="w\\"1"} 1'
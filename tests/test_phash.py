@@ -0,0 +1,46 @@
+import random
+
+import phash
+
+
+def _hex(bits):
+    return f"{bits:0{phash.HEX_LENGTH}x}"
+
+
+def test_clip_hash_needs_every_frame():
+    # A short clip with a single extracted frame must not store a 64-bit hash
+    assert phash.clip_hash(["only_one.jpg"]) is None
+    assert phash.clip_hash([]) is None
+    assert phash.clip_hash(["missing_a.jpg", "missing_b.jpg"]) is None
+
+
+def test_parse_rejects_other_lengths():
+    assert phash.parse(_hex(5)) == 5
+    assert phash.parse("ab" * 8) is None
+    assert phash.parse("zz" * 16) is None
+    assert phash.parse(None) is None
+
+
+def test_collapse_drops_near_duplicates_of_better_ranked():
+    base = 0xF0F0
+    hashes = {"a": base, "b": base ^ 0b111, "c": ~base & ((1 << 128) - 1), "d": None}
+    kept, hidden = phash.collapse(["a", "b", "c", "d"], hashes.get, limit=10)
+    assert kept == ["a", "c", "d"] and hidden == 1
+
+
+def test_collapse_stops_at_limit():
+    kept, hidden = phash.collapse(["a", "b", "c"], lambda item: None, limit=2)
+    assert kept == ["a", "b"] and hidden == 0
+
+
+def test_bktree_search_matches_linear_scan():
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(128) for _ in range(300)]
+    hashes += [hashes[0] ^ (1 << rng.randrange(128)) for _ in range(20)]
+    tree = phash.index([{"file_id": f"f{i}", "phash": _hex(h)} for i, h in enumerate(hashes)] + [{"file_id": "x", "phash": None}])
+    assert len(tree) == len(hashes)
+    for query in (hashes[0], hashes[5]):
+        expected = sorted((phash.distance(query, h), f"f{i}") for i, h in enumerate(hashes) if phash.distance(query, h) <= 40)
+        found = tree.search(query, 40)
+        assert sorted(found) == expected
+        assert [d for d, _ in found] == sorted(d for d, _ in found)
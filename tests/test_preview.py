@@ -0,0 +1,32 @@
+import preview
+import proxy_cache
+
+
+def _plan(*tempos):
+    return [{"Tempo": t, "file_id": f"f{i}", "file_name": f"f{i}.mp4"} for i, t in enumerate(tempos)]
+
+
+def test_block_durations_from_consecutive_tempos():
+    assert preview.block_durations(_plan("00:02", "00:05", "00:09"), total_s=12) == [3, 4, 3]
+
+
+def test_block_durations_last_block_without_narration():
+    assert preview.block_durations(_plan("00:00", "00:04")) == [4, preview.LAST_BLOCK_S]
+
+
+def test_block_durations_floor_and_unparseable():
+    assert preview.block_durations(_plan("00:01", "00:01", "xx", "00:03"), total_s=3) == [
+        preview.MIN_BLOCK_S, 2, preview.LAST_BLOCK_S, preview.MIN_BLOCK_S]
+
+
+def test_lead_in_covers_narration_before_first_block():
+    assert preview.lead_in(_plan("00:02.5", "00:05")) == 2.5
+    assert preview.lead_in(_plan("00:00", "00:05")) == 0
+    assert preview.lead_in(_plan("xx", "00:03")) == 3
+    assert preview.lead_in([]) == 0
+
+
+def test_proxies_and_segments_share_geometry():
+    assert preview.PREVIEW_SIZE == proxy_cache.PROXY_SIZE
+    vf = proxy_cache.scale_pad(*proxy_cache.PROXY_SIZE)
+    assert vf.endswith("setsar=1") and "pad=640:360" in vf
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import library_sync
+import metrics
+import proxy_cache
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(proxy_cache, "PROXY_DIR", str(tmp_path))
+    monkeypatch.setattr(proxy_cache, "frames_from_video", lambda path, out_prefix=None: [f"{path}#1", f"{path}#2"])
+    metrics.reset()
+    return tmp_path
+
+
+def _store(cache, file_id, md5, poster=True):
+    (cache / f"{file_id}.mp4").write_bytes(b"proxy")
+    if poster:
+        (cache / f"{file_id}.jpg").write_bytes(b"jpg")
+    info = {"md5": md5, "format": proxy_cache.PROXY_FORMAT, "width": 640, "height": 360, "source": {"width": 1920}}
+    (cache / f"{file_id}.json").write_text(json.dumps(info))
+
+
+def test_lookup_hit_and_md5_invalidation(cache):
+    assert proxy_cache.lookup("a") is None
+    _store(cache, "a", "md5-1")
+    hit = proxy_cache.lookup("a", "md5-1")
+    assert hit['path'] == str(cache / "a.mp4") and hit['poster'] == str(cache / "a.jpg")
+    assert proxy_cache.lookup("a")['md5'] == "md5-1"
+    # The original changed on Drive: the proxy no longer counts
+    assert proxy_cache.lookup("a", "md5-2") is None
+    assert proxy_cache.cached_frames("a", "md5-2") is None
+
+
+def test_lookup_needs_the_metadata_and_tolerates_a_missing_poster(cache):
+    _store(cache, "a", "md5-1", poster=False)
+    assert proxy_cache.lookup("a")['poster'] is None
+    (cache / "a.json").unlink()
+    assert proxy_cache.lookup("a") is None
+
+
+def test_clip_frames_reads_the_proxy_and_downloads_only_on_a_miss(cache, monkeypatch):
+    ingested = []
+    monkeypatch.setattr(proxy_cache, "ingest", lambda service, fid, md5: ingested.append((fid, md5)) or (["novo"], {}))
+    _store(cache, "a", "md5-1")
+
+    frames, probe = library_sync._clip_frames(None, "a", True, "md5-1")
+    assert frames == [f"{cache / 'a.mp4'}#1", f"{cache / 'a.mp4'}#2"] and probe == {"width": 1920}
+    assert ingested == [] and metrics.snapshot()['counters']['proxy.hits'] == 1
+
+    assert library_sync._clip_frames(None, "a", True, "md5-2") == (["novo"], {})
+    assert ingested == [("a", "md5-2")]
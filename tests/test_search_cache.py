@@ -0,0 +1,48 @@
+import fakes
+import search_cache
+
+
+def _db(rows):
+    config = fakes.FakeConfig(latency_s={})
+    return fakes.FakeSupabase(config, fakes.Faults(config), rows)
+
+
+def _fresh(monkeypatch):
+    monkeypatch.setattr(search_cache, "_version", {"value": None, "checked_at": 0.0, "updated_at": True})
+    monkeypatch.setattr(search_cache, "VERSION_TTL_S", 0)
+
+
+def test_library_version_follows_committed_writes_only(monkeypatch):
+    _fresh(monkeypatch)
+    db = _db([{"file_id": "a"}, {"file_id": "b"}])
+    first = search_cache.library_version(db)
+    assert first[0] == 2
+    # Nothing written (e.g. a sync still analyzing): same version, the snapshot is kept
+    assert search_cache.library_version(db) == first
+
+    db.table("video_library").update({"acao": "andar"}).eq("file_id", "a").execute()
+    second = search_cache.library_version(db)
+    assert second[0] == 2 and second != first
+
+    db.table("video_library").insert({"file_id": "c"}).execute()
+    assert search_cache.library_version(db)[0] == 3
+
+
+def test_fts_missing_rpc_is_remembered_with_filters(monkeypatch):
+    monkeypatch.setattr(search_cache, "_fts", {"available": None})
+    db = _db([{"file_id": "a", "acao": "andar"}])
+    del db.rpcs[search_cache.FTS_RPC]
+    calls = []
+    rpc = db.rpc
+    monkeypatch.setattr(db, "rpc", lambda name, params=None: calls.append(name) or rpc(name, params))
+
+    assert search_cache.fts_ranked(db, ("v",), "andar", filters={"orientation": "vertical"}) is None
+    assert search_cache.fts_ranked(db, ("v",), "andar") is None
+    assert calls == [search_cache.FTS_RPC]
+
+
+def test_fts_ranked_uses_the_rpc(monkeypatch):
+    monkeypatch.setattr(search_cache, "_fts", {"available": None})
+    db = _db([{"file_id": "a", "acao": "andar", "emocao": "calma"}, {"file_id": "b", "acao": "correr", "emocao": "raiva"}])
+    hits, total = search_cache.fts_ranked(db, ("fts-test",), "andar")
+    assert [r['file_id'] for r, _ in hits] == ["a"] and total == 1
@@ -0,0 +1,30 @@
+import os
+
+import settings
+
+
+def test_get_setting_rereads_secrets_and_prefers_the_project_file(tmp_path, monkeypatch):
+    user, project = tmp_path / "user.toml", tmp_path / "project.toml"
+    user.write_text('SUPABASE_URL = "user"\nGOOGLE_API_KEY = "g"\n')
+    monkeypatch.setattr(settings, "SECRETS_PATHS", [str(user), str(project)])
+    monkeypatch.delenv("SUPABASE_URL", raising=False)
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    assert settings.get_setting("SUPABASE_URL") == "user"
+
+    project.write_text('SUPABASE_URL = "project"\n')
+    os.utime(project, ns=(1, 1))
+    assert settings.get_setting("SUPABASE_URL") == "project"
+    assert settings.get_setting("GOOGLE_API_KEY") == "g"
+    # A worker sees edits without a restart
+    project.write_text('SUPABASE_URL = "edited"\n')
+    assert settings.get_setting("SUPABASE_URL") == "edited"
+
+
+def test_get_setting_uses_app_secrets_after_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SECRETS_PATHS", [str(tmp_path / "missing.toml")])
+    monkeypatch.setattr(settings, "_app_secrets", {"SUPABASE_KEY": "cloud"})
+    monkeypatch.delenv("SUPABASE_KEY", raising=False)
+    assert settings.get_setting("SUPABASE_KEY") == "cloud"
+    assert settings.get_setting("OPENAI_API_KEY", "x") == "x"
+    monkeypatch.setenv("SUPABASE_KEY", "env")
+    assert settings.get_setting("SUPABASE_KEY") == "env"
@@ -0,0 +1,45 @@
+import engine_router
+import llm_costs
+import storyboard_batch
+import usage
+from benchmarks.synthetic import make_library
+
+BLOCKS = [{"timestamp": "00:00", "script_fragment": "Uma estrada", "sugestao_visual_literal": "carro na estrada",
+           "elementos_chave": ["estrada"], "emocao_alvo": "calma"},
+          {"timestamp": "00:05", "script_fragment": "Um sorriso", "sugestao_visual_literal": "pessoa sorrindo",
+           "elementos_chave": ["rosto"], "emocao_alvo": "alegria"}]
+
+
+def _setup(monkeypatch, tmp_path, persist):
+    videos = make_library(40, used_fraction=0)
+    monkeypatch.setattr(usage, "load_candidates", lambda supabase: (videos, set(), {}))
+    monkeypatch.setattr(engine_router, "get_semantic_storyboard", lambda audio, script, engine="Gemini", log=None: list(BLOCKS))
+    monkeypatch.setattr(llm_costs, "persist", persist)
+    jobs = []
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.txt").write_text("roteiro", encoding="utf-8")
+        (tmp_path / f"{name}.mp3").write_bytes(b"ID3")
+        jobs.append({"name": name, "script_path": str(tmp_path / f"{name}.txt"), "audio_path": str(tmp_path / f"{name}.mp3")})
+    return jobs
+
+
+def test_batch_leaves_jobs_untouched_and_never_repeats_clips(monkeypatch, tmp_path):
+    jobs = _setup(monkeypatch, tmp_path, lambda supabase, tally: True)
+    originals = [dict(job) for job in jobs]
+    results = storyboard_batch.run_batch(jobs, None, on_event=lambda *a, **k: None, min_interval_s=0)
+    assert jobs == originals
+    assert [r['error'] for r in results] == [None, None]
+    used = [row['file_id'] for r in results for row in r['plan']]
+    assert len(used) == 4 and len(set(used)) == 4
+
+
+def test_cost_write_failure_keeps_the_storyboard(monkeypatch, tmp_path):
+    def persist(supabase, tally):
+        raise Exception("500 Internal Server Error")
+
+    events = []
+    jobs = _setup(monkeypatch, tmp_path, persist)
+    results = storyboard_batch.run_batch(jobs, None, on_event=lambda event, **fields: events.append(fields), min_interval_s=0)
+    assert [r['error'] for r in results] == [None, None]
+    assert all(r['llm'] is not None for r in results)
+    assert any("Custos de IA não foram gravados" in e.get('message', '') for e in events)
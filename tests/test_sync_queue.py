@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+import sync_queue
+
+
+@pytest.fixture(autouse=True)
+def queue(monkeypatch, tmp_path):
+    monkeypatch.setattr(sync_queue, "QUEUE_PATH", str(tmp_path / "queue.db"))
+
+
+def test_job_goes_queued_running_done():
+    assert sync_queue.latest_job() is None and not sync_queue.has_active_job()
+    job_id = sync_queue.enqueue_job({"engine": "Gemini", "limit": 3})
+    job = sync_queue.get_job(job_id)
+    assert (job['state'], job['worker'], job['params']) == ("queued", None, {"engine": "Gemini", "limit": 3})
+    assert sync_queue.has_active_job()
+
+    claimed = sync_queue.claim_next_job("w1")
+    assert (claimed['id'], claimed['state'], claimed['worker']) == (job_id, "running", "w1")
+    assert claimed['started_at'] and claimed['heartbeat']
+    # Nothing else is queued
+    assert sync_queue.claim_next_job("w2") is None
+
+    sync_queue.update_job(job_id, done=2, total=3)
+    sync_queue.log_event(job_id, "⚠️ Falha em a.mp4")
+    job = sync_queue.get_job(job_id)
+    assert (job['done'], job['total'], job['message']) == (2, 3, "⚠️ Falha em a.mp4")
+
+    sync_queue.finish_job(job_id, "done", errors=[{"file": "a.mp4", "error": "x"}], summary={"metrics": {}})
+    job = sync_queue.latest_job()
+    assert (job['state'], job['errors'], job['summary']) == ("done", [{"file": "a.mp4", "error": "x"}], {"metrics": {}})
+    assert job['finished_at'] and not sync_queue.has_active_job()
+    # A finished job is never claimed again
+    assert sync_queue.claim_next_job("w2") is None
+
+
+def test_jobs_are_claimed_oldest_first_once_each():
+    ids = [sync_queue.enqueue_job({"n": n}) for n in range(3)]
+    assert [sync_queue.claim_next_job(f"w{n}")['id'] for n in range(3)] == ids
+    assert sync_queue.claim_next_job("w9") is None
+
+
+def test_stale_running_job_is_requeued_for_another_worker(monkeypatch):
+    job_id = sync_queue.enqueue_job({})
+    sync_queue.claim_next_job("w1")
+    # A live worker keeps its job
+    assert sync_queue.claim_next_job("w2") is None
+
+    monkeypatch.setattr(sync_queue, "STALE_AFTER_S", 0)
+    time.sleep(0.01)
+    job = sync_queue.claim_next_job("w2")
+    assert (job['id'], job['state'], job['worker']) == (job_id, "running", "w2")
+
+
+def test_job_events_keep_the_latest_lines_oldest_first():
+    job_id = sync_queue.enqueue_job({})
+    other = sync_queue.enqueue_job({})
+    for n in range(5):
+        sync_queue.log_event(job_id, f"linha {n}")
+    sync_queue.log_event(other, "outro job")
+    assert [e['message'] for e in sync_queue.job_events(job_id, limit=3)] == ["linha 2", "linha 3", "linha 4"]
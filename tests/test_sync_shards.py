@@ -0,0 +1,31 @@
+import fakes
+import sync_shards
+
+
+def _db():
+    config = fakes.FakeConfig(latency_s={})
+    rows = [{"file_id": "done", "file_name": "0001.mp4", "acao": "andar", "emocao": "calma"}]
+    return fakes.FakeSupabase(config, fakes.Faults(config), rows)
+
+
+def test_leases_renewed_after_a_third_of_the_ttl(monkeypatch):
+    monkeypatch.setitem(sync_shards._rpc, "leases", None)
+    db = _db()
+    leases = sync_shards.Leases(db, "w1", ttl_s=300)
+    assert leases.claim(["a", "b", "done"]) == {"a", "b"}
+    table = db.tables["sync_leases"]
+    first = {fid: lease['expires_at'] for fid, lease in table.items()}
+
+    leases.renew()
+    assert {fid: lease['expires_at'] for fid, lease in table.items()} == first
+
+    # A clip analyzed long ago is still waiting for its batch write
+    leases.renewed_at -= 101
+    db.tables["video_library"]["a"] = {"file_id": "a", "acao": "andar", "emocao": "calma"}
+    leases.renew()
+    assert table["b"]['expires_at'] > first["b"] and table["a"]['expires_at'] == first["a"]
+    # Another worker still can't take it
+    assert sync_shards.Leases(db, "w2").claim(["b"]) == set()
+
+    leases.release_all()
+    assert not table and leases.renewed_at is None
@@ -0,0 +1,32 @@
+import pytest
+
+import backends
+import fakes
+import sync_queue
+import sync_worker
+
+
+@pytest.fixture
+def queue(monkeypatch, tmp_path):
+    monkeypatch.setattr(sync_queue, "QUEUE_PATH", str(tmp_path / "queue.db"))
+    monkeypatch.setattr(sync_worker, "METRICS_PATH", str(tmp_path / "metrics.jsonl"))
+    config = fakes.FakeConfig(clips=12, indexed_fraction=0.5)
+    config.latency_s = {}
+    installed = fakes.install(config)
+    yield installed
+    backends.clear()
+
+
+def test_dry_run_job_stores_the_plan_without_vision_calls(queue):
+    library = queue.supabase.tables["video_library"]
+    before = {fid: dict(row) for fid, row in library.items()}
+    job_id = sync_queue.enqueue_job({"dry_run": True, "engine": "Gemini", "folder_ids": [fakes.FAKE_ROOT]})
+    sync_worker.run_job(sync_queue.claim_next_job("teste"), "teste")
+
+    job = sync_queue.get_job(job_id)
+    assert job['state'] == "done" and job['errors'] == []
+    plan = job['summary']['plan']
+    assert plan['drive_count'] == 12
+    assert plan['total'] == plan['group_1_count'] + plan['group_2_count'] + plan['group_3_count'] > 0
+    assert library == before
+    assert "llm" not in job['summary']
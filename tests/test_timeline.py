@@ -0,0 +1,64 @@
+import json
+import xml.etree.ElementTree as ET
+
+import timeline
+
+PLAN = [
+    {"Tempo": "00:02", "file_id": "id-a", "file_name": "0001.mp4", "Texto": "A vida & \"a estrada\""},
+    {"Tempo": "00:05", "file_id": "id-b", "file_name": "0002.mp4", "Texto": "Cada passo"},
+    {"Tempo": "00:09", "file_id": "id-a", "file_name": "0001.mp4", "Texto": "De novo"},
+]
+CLIPS = {"id-a": {"duration_s": 10, "width": 1080, "height": 1920}, "id-b": {"duration_s": 2}}
+
+
+def _tl():
+    return timeline.build(PLAN, "Projeto <1>", CLIPS, audio_name="narracao.mp3", total_s=12, media_root="/midia", fps=30)
+
+
+def test_build_places_events_at_their_times():
+    tl = _tl()
+    events = tl['events']
+    assert [(ev['record_in'], ev['record_out']) for ev in events] == [(60, 150), (150, 210), (270, 360)]
+    # The 2 s clip is cut at its end under a 4 s block, leaving a gap
+    assert events[1]['source_out'] == 60
+    assert events[0]['path'] == "/midia/0001.mp4"
+    assert tl['frames'] == 360 and tl['narration']['frames'] == 360
+
+
+def test_edl_events_and_timecodes():
+    lines = timeline.to_edl(_tl()).splitlines()
+    events = [l for l in lines if l[:3].isdigit()]
+    assert len(events) == 4
+    assert events[0].split()[-4:] == ["00:00:00:00", "00:00:03:00", "01:00:02:00", "01:00:05:00"]
+    assert events[-1].split()[2] == "A" and events[-1].split()[-1] == "01:00:12:00"
+    assert "* DRIVE: " + timeline.drive_url("id-b") in lines
+
+
+def test_fcpxml_is_valid_and_connects_clips_to_the_gap():
+    root = ET.fromstring(timeline.to_fcpxml(_tl()).split("\n", 2)[2])
+    assert root.get("version") == "1.9"
+    assets = root.findall("./resources/asset")
+    assert [a.get("uid") for a in assets if a.get("uid")] == ["id-a", "id-b"]
+    assert root.find("./resources/format").get("width") == "1080"
+    gap = root.find(".//spine/gap")
+    assert gap.get("duration") == "12s"
+    clips = gap.findall("asset-clip")
+    assert [(c.get("lane"), c.get("offset"), c.get("duration")) for c in clips] == [
+        ("1", "2s", "3s"), ("1", "5s", "2s"), ("1", "9s", "3s"), ("-1", "0s", "12s")]
+    assert root.find(".//project").get("name") == "Projeto <1>"
+
+
+def test_otio_tracks_line_up_with_the_record_times():
+    data = json.loads(timeline.to_otio(_tl()))
+    video, audio = data['tracks']['children']
+    kinds = [(c['OTIO_SCHEMA'], c['source_range']['duration']['value']) for c in video['children']]
+    assert kinds == [("Gap.1", 60.0), ("Clip.2", 90.0), ("Clip.2", 60.0), ("Gap.1", 60.0), ("Clip.2", 90.0)]
+    assert video['children'][1]['metadata']['soul']['file_id'] == "id-a"
+    assert audio['children'][0]['source_range']['duration']['value'] == 360.0
+    assert data['global_start_time']['value'] == timeline.START_TC_S * 30
+
+
+def test_export_by_label_or_extension():
+    name, text, mime = timeline.export(_tl(), "edl")
+    assert name.startswith("Timeline_Projeto_") and name.endswith(".edl") and mime == "text/plain" and text.startswith("TITLE:")
+    assert timeline.export(_tl(), "OpenTimelineIO (.otio)")[0].endswith(".otio")
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone
+
+import usage
+
+NOW = datetime(2026, 10, 19, tzinfo=timezone.utc)
+
+
+def test_decay_penalty_halves_every_half_life():
+    uses = [NOW.isoformat(), (NOW - timedelta(days=usage.HALF_LIFE_DAYS)).isoformat()]
+    assert abs(usage.decay_penalty(uses, now=NOW) - 1.5) < 1e-9
+
+
+def test_stale_candidates_only_excludes_returned_candidates():
+    videos = [{"file_id": f"c{i}"} for i in range(6)]
+    # Heavily used clips outside the candidate set must not eat the exclusion budget
+    penalties = {"x1": 9.0, "x2": 8.0, "x3": 7.0, "c1": 0.9, "c4": 0.6, "c5": 0.1}
+    assert usage.stale_candidates(videos, penalties) == {"c1", "c4"}
+
+
+def test_stale_candidates_capped_at_half_most_penalized_first():
+    videos = [{"file_id": f"c{i}"} for i in range(4)]
+    penalties = {"c0": 0.7, "c1": 2.0, "c2": 1.0, "c3": 0.8}
+    assert usage.stale_candidates(videos, penalties) == {"c1", "c2"}
+
+
+def test_load_candidates_returns_every_indexed_clip_with_penalties():
+    import fakes
+    rows = [{"file_id": f"c{i:04d}", "file_name": f"{i:04d}.mp4", "acao": "andar", "emocao": "calma"} for i in range(700)]
+    rows.append({"file_id": "raw", "file_name": "raw.mp4", "acao": None, "emocao": None})
+    config = fakes.FakeConfig(latency_s={})
+    db = fakes.FakeSupabase(config, fakes.Faults(config), rows)
+    usage.record_usage(db, ["c0699", "c0001"])
+    videos, excluded, penalties = usage.load_candidates(db)
+    # Clips late in file_name order are still candidates; relevance is the matcher's call
+    assert len(videos) == 700 and "c0699" in {v['file_id'] for v in videos}
+    assert set(penalties) == {"c0699", "c0001"} and excluded == {"c0699", "c0001"}
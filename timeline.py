@@ -0,0 +1,204 @@
+"""Edit timelines from a storyboard plan: CMX 3600 EDL, FCPXML 1.9 and OpenTimelineIO.
+
+Instead of shipping the clips (the ZIP kit), the export describes the cut:
+each plan row becomes a video event at its `Tempo`, running until the next
+block (`preview.block_durations`), and the narration sits on an audio track
+under the whole sequence. Media is referenced, not copied:
+
+    media_root    folder where the editor's machine sees the clips (Google Drive
+                  for desktop, a shared disk...); files are `<media_root>/<file_name>`
+    use_proxies   point at the local 360p proxy (`proxy_cache`) when there is one
+
+Every event also carries the clip's Drive id (EDL comment, FCPXML note, OTIO
+metadata), so it can be relinked from Drive. A clip known to be shorter than
+its block is cut at its end, leaving a gap for the editor instead of offline
+frames.
+"""
+import json
+import os
+from urllib.parse import quote
+from xml.sax.saxutils import escape, quoteattr
+
+import proxy_cache
+from matching import parse_timestamp
+from preview import block_durations
+from settings import get_setting
+
+FPS = int(get_setting("TIMELINE_FPS", 30))
+MEDIA_ROOT = get_setting("TIMELINE_MEDIA_ROOT", "")
+# EDL record timecodes and the OTIO timeline start at 01:00:00:00, as most NLEs expect
+START_TC_S = 3600
+
+
+def drive_url(file_id):
+    return f"https://drive.google.com/file/d/{file_id}/view"
+
+
+def _media_path(name, media_root):
+    return os.path.join(media_root, name) if media_root else name
+
+
+def build(plan, title, clips_by_id=None, audio_name=None, total_s=None, media_root=MEDIA_ROOT,
+          use_proxies=False, fps=FPS):
+    """Format-neutral timeline: `{"title", "fps", "frames", "events", "narration"}`, times in frames.
+
+    `clips_by_id` (library rows) adds clip lengths and specs when known.
+    """
+    clips_by_id = clips_by_id or {}
+    durations = block_durations(plan, total_s)
+    events, cursor = [], 0
+    for item, duration in zip(plan, durations):
+        start = parse_timestamp(item.get('Tempo'))
+        # Frames from absolute times, so rounding never drifts along the sequence
+        record_in = max(cursor, round(start * fps)) if start is not None else cursor
+        record_out = max(record_in + 1, round(((start if start is not None else record_in / fps) + duration) * fps))
+        clip = clips_by_id.get(item['file_id']) or {}
+        length = record_out - record_in
+        if clip.get('duration_s'):
+            length = max(1, min(length, int(clip['duration_s'] * fps)))
+        proxy = proxy_cache.lookup(item['file_id']) if use_proxies else None
+        events.append({
+            "name": item['file_name'], "file_id": item['file_id'],
+            "path": proxy['path'] if proxy else _media_path(item['file_name'], media_root),
+            "record_in": record_in, "record_out": record_in + length, "source_in": 0, "source_out": length,
+            "media_frames": int(clip['duration_s'] * fps) if clip.get('duration_s') else None,
+            "width": clip.get('width'), "height": clip.get('height'),
+            "note": item.get('Texto', ''),
+        })
+        cursor = record_out
+    frames = max(cursor, round(total_s * fps) if total_s else 0)
+    narration = {"name": audio_name, "path": _media_path(audio_name, media_root), "frames": frames} if audio_name else None
+    return {"title": title, "fps": fps, "frames": frames, "events": events, "narration": narration}
+
+
+def _tc(frames, fps, start_s=START_TC_S):
+    frames += start_s * fps
+    return f"{frames // (3600 * fps):02d}:{frames // (60 * fps) % 60:02d}:{frames // fps % 60:02d}:{frames % fps:02d}"
+
+
+def to_edl(tl):
+    """CMX 3600 EDL (non-drop frame); clip names, paths and Drive ids go in comments.
+
+    Source timecodes count from 00:00:00:00 at the clip's first frame.
+    """
+    fps = tl['fps']
+    zero = lambda frames: _tc(frames, fps, start_s=0)
+    lines = [f"TITLE: {tl['title'][:70]}", "FCM: NON-DROP FRAME", ""]
+    for n, ev in enumerate(tl['events'], 1):
+        lines.append(f"{n:03d}  AX       V     C        {zero(ev['source_in'])} {zero(ev['source_out'])} "
+                     f"{_tc(ev['record_in'], fps)} {_tc(ev['record_out'], fps)}")
+        lines += [f"* FROM CLIP NAME: {ev['name']}", f"* SOURCE FILE: {ev['path']}", f"* DRIVE: {drive_url(ev['file_id'])}"]
+        if ev['note']: lines.append(f"* COMMENT: {' '.join(str(ev['note']).split())[:200]}")
+        lines.append("")
+    if tl['narration']:
+        nar = tl['narration']
+        lines.append(f"{len(tl['events']) + 1:03d}  AX       A     C        {zero(0)} {zero(nar['frames'])} "
+                     f"{_tc(0, fps)} {_tc(nar['frames'], fps)}")
+        lines += [f"* FROM CLIP NAME: {nar['name']}", f"* SOURCE FILE: {nar['path']}", ""]
+    return "\n".join(lines)
+
+
+def _file_url(path):
+    """file:// URL for absolute paths; a bare file name stays relative (the editor relinks it)."""
+    if "://" in path:
+        return path
+    url = quote(path.replace(os.sep, "/"))
+    return "file://" + url if os.path.isabs(path) else url
+
+
+def to_fcpxml(tl):
+    """FCPXML 1.9 (Final Cut Pro, DaVinci Resolve, Premiere via importers).
+
+    The spine is one gap as long as the sequence; clips are connected to it on
+    lane 1 at their record times and the narration on lane -1.
+    """
+    fps = tl['fps']
+    t = lambda frames: f"{frames}/{fps}s" if frames % fps else f"{frames // fps}s"
+    width = next((ev['width'] for ev in tl['events'] if ev['width']), 1920)
+    height = next((ev['height'] for ev in tl['events'] if ev['height']), 1080)
+    out = ['<?xml version="1.0" encoding="UTF-8"?>', '<!DOCTYPE fcpxml>', '<fcpxml version="1.9">', '  <resources>',
+           f'    <format id="r1" frameDuration="{t(1)}" width="{width}" height="{height}"/>']
+    assets, used = {}, {}
+    for ev in tl['events']:
+        used[ev['file_id']] = max(used.get(ev['file_id'], 0), ev['source_out'])
+    for ev in tl['events']:
+        if ev['file_id'] in assets: continue
+        assets[ev['file_id']] = f"a{len(assets) + 1}"
+        length = ev['media_frames'] or used[ev['file_id']]
+        out += [f'    <asset id="{assets[ev["file_id"]]}" name={quoteattr(ev["name"])} uid={quoteattr(ev["file_id"])} '
+                f'start="0s" duration="{t(length)}" hasVideo="1" format="r1">',
+                f'      <media-rep kind="original-media" src={quoteattr(_file_url(ev["path"]))}/>',
+                '    </asset>']
+    nar = tl['narration']
+    if nar:
+        out += [f'    <asset id="narration" name={quoteattr(nar["name"])} start="0s" duration="{t(nar["frames"])}" hasAudio="1">',
+                f'      <media-rep kind="original-media" src={quoteattr(_file_url(nar["path"]))}/>',
+                '    </asset>']
+    title = quoteattr(tl['title'])
+    out += ['  </resources>', '  <library>', f'    <event name={title}>', f'      <project name={title}>',
+            f'        <sequence format="r1" duration="{t(tl["frames"])}" tcStart="0s" tcFormat="NDF">',
+            '          <spine>', f'            <gap name="Storyboard" offset="0s" start="0s" duration="{t(tl["frames"])}">']
+    for ev in tl['events']:
+        out += [f'              <asset-clip ref="{assets[ev["file_id"]]}" lane="1" name={quoteattr(ev["name"])} '
+                f'offset="{t(ev["record_in"])}" start="{t(ev["source_in"])}" duration="{t(ev["source_out"] - ev["source_in"])}">',
+                f'                <note>{escape(drive_url(ev["file_id"]))}</note>',
+                '              </asset-clip>']
+    if nar:
+        out.append(f'              <asset-clip ref="narration" lane="-1" name={quoteattr(nar["name"])} '
+                   f'offset="0s" start="0s" duration="{t(nar["frames"])}"/>')
+    out += ['            </gap>', '          </spine>', '        </sequence>', '      </project>', '    </event>',
+            '  </library>', '</fcpxml>', '']
+    return "\n".join(out)
+
+
+def to_otio(tl):
+    """OpenTimelineIO JSON (`.otio`), written directly so the library is not needed to export."""
+    fps = float(tl['fps'])
+    rt = lambda frames: {"OTIO_SCHEMA": "RationalTime.1", "rate": fps, "value": float(frames)}
+    tr = lambda start, frames: {"OTIO_SCHEMA": "TimeRange.1", "start_time": rt(start), "duration": rt(frames)}
+
+    def clip(name, path, start, frames, available, metadata):
+        return {"OTIO_SCHEMA": "Clip.2", "name": name, "metadata": metadata, "source_range": tr(start, frames),
+                "effects": [], "markers": [], "enabled": True, "active_media_reference_key": "DEFAULT_MEDIA",
+                "media_references": {"DEFAULT_MEDIA": {
+                    "OTIO_SCHEMA": "ExternalReference.1", "name": name, "metadata": {}, "target_url": _file_url(path),
+                    "available_range": tr(0, available) if available else None}}}
+
+    def gap(frames):
+        return {"OTIO_SCHEMA": "Gap.1", "name": "", "metadata": {}, "source_range": tr(0, frames),
+                "effects": [], "markers": [], "enabled": True}
+
+    def track(name, kind, children):
+        return {"OTIO_SCHEMA": "Track.1", "name": name, "kind": kind, "metadata": {}, "source_range": None,
+                "effects": [], "markers": [], "enabled": True, "children": children}
+
+    video, cursor = [], 0
+    for ev in tl['events']:
+        if ev['record_in'] > cursor:
+            video.append(gap(ev['record_in'] - cursor))
+        video.append(clip(ev['name'], ev['path'], ev['source_in'], ev['source_out'] - ev['source_in'], ev['media_frames'],
+                          {"soul": {"file_id": ev['file_id'], "drive_url": drive_url(ev['file_id']), "texto": ev['note']}}))
+        cursor = ev['record_out']
+    tracks = [track("V1", "Video", video)]
+    if tl['narration']:
+        nar = tl['narration']
+        tracks.append(track("A1", "Audio", [clip(nar['name'], nar['path'], 0, nar['frames'], nar['frames'], {})]))
+    timeline = {"OTIO_SCHEMA": "Timeline.1", "name": tl['title'], "metadata": {},
+                "global_start_time": rt(START_TC_S * fps),
+                "tracks": {"OTIO_SCHEMA": "Stack.1", "name": "tracks", "metadata": {}, "source_range": None,
+                           "effects": [], "markers": [], "enabled": True, "children": tracks}}
+    return json.dumps(timeline, ensure_ascii=False, indent=2)
+
+
+# Label -> (extension, writer, mime type)
+FORMATS = {
+    "FCPXML (Final Cut / Resolve)": ("fcpxml", to_fcpxml, "application/xml"),
+    "EDL CMX 3600 (Premiere / Resolve / Avid)": ("edl", to_edl, "text/plain"),
+    "OpenTimelineIO (.otio)": ("otio", to_otio, "application/json"),
+}
+
+
+def export(tl, fmt):
+    """`(file_name, text, mime)` for one of `FORMATS` (label or extension)."""
+    ext, writer, mime = FORMATS.get(fmt) or next(v for v in FORMATS.values() if v[0] == fmt)
+    return f"Timeline_{tl['title'].replace(' ', '_')}.{ext}", writer(tl), mime
@@ -0,0 +1,76 @@
+"""Clip freshness from the append-only `clip_usage` ledger.
+
+The ledger and its RPCs live in supabase/migrations. Each confirmed montage
+appends one row per clip; `clip_usage_penalties` turns a clip's uses into a
+decayed penalty (recency and frequency), and `fresh_clip_candidates` returns
+every indexed clip, least penalized first. The matcher scores all of them and
+applies the penalties itself, so relevance decides before freshness does.
+Until the migration is deployed, everything falls back to `last_used_at` and
+the 10-clip exclusion window.
+"""
+from datetime import datetime, timezone
+
+import matching
+import metrics
+from clients import not_deployed
+
+HALF_LIFE_DAYS = 14
+# A clip used within about one half-life is left out of matching altogether
+EXCLUDE_PENALTY = 0.5
+
+
+def decay_penalty(used_at_values, now=None, half_life_days=HALF_LIFE_DAYS):
+    """Sum of 0.5 ^ (age / half-life) over a clip's uses (same formula as the SQL)."""
+    now = now or datetime.now(timezone.utc)
+    penalty = 0.0
+    for used_at in used_at_values:
+        ts = datetime.fromisoformat(str(used_at).replace("Z", "+00:00"))
+        if ts.tzinfo is None: ts = ts.replace(tzinfo=timezone.utc)
+        penalty += 0.5 ** (max(0.0, (now - ts).total_seconds()) / (half_life_days * 86400))
+    return penalty
+
+
+def stale_candidates(videos, penalties, threshold=EXCLUDE_PENALTY):
+    """Ids of the candidates used too recently to be matched, most penalized first.
+
+    Never more than half the candidates, so small libraries still get variety.
+    """
+    stale = sorted(((penalties[v['file_id']], v['file_id']) for v in videos
+                    if penalties.get(v['file_id'], 0) >= threshold), reverse=True)
+    return {fid for _, fid in stale[:len(videos) // 2]}
+
+
+def load_candidates(supabase):
+    """`(videos, excluded_ids, penalties)` for `matching.match_block`.
+
+    With the ledger: all indexed clips, the ones above `EXCLUDE_PENALTY` as
+    exclusions (at most half of them) and the penalty of every clip used
+    inside the window for soft ranking.
+    Without it: the whole table with the 10 most recently used clips excluded.
+    """
+    try:
+        with metrics.span("supabase.read"):
+            videos = supabase.rpc("fresh_clip_candidates", {"half_life_days": HALF_LIFE_DAYS}).execute().data or []
+            rows = supabase.rpc("clip_usage_penalties", {"half_life_days": HALF_LIFE_DAYS}).execute().data or []
+        penalties = {r['file_id']: r['penalty'] for r in rows}
+        return videos, stale_candidates(videos, penalties), penalties
+    except Exception as e:
+        if not not_deployed(e): raise
+    with metrics.span("supabase.read"):
+        raw_videos = supabase.table("video_library").select("*").order("last_used_at", desc=False, nullsfirst=True).execute().data or []
+    videos = [v for v in raw_videos if matching.is_indexed(v)]
+    return videos, set(matching.recent_clip_ids(videos)), {}
+
+
+def record_usage(supabase, file_ids, project=None):
+    """Appends one ledger row per clip and mirrors `last_used_at` in a single update."""
+    file_ids = list(dict.fromkeys(file_ids))
+    if not file_ids:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    with metrics.span("supabase.write"):
+        try:
+            supabase.table("clip_usage").insert([{"file_id": fid, "used_at": now, "project": project} for fid in file_ids]).execute()
+        except Exception as e:
+            if not not_deployed(e): raise
+        supabase.table("video_library").update({"last_used_at": now}).in_("file_id", file_ids).execute()